@@ -0,0 +1,63 @@
+"""Time deep-cloning a quiz and count the queries it takes.
+
+The query count should stay the same whatever the size of the quiz.
+
+Usage: python benchmarks/bench_clone.py [--rounds 8] [--questions 50]
+"""
+import argparse
+import time
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.cloning import clone_quiz
+from core.models import QuestionBank, Quiz, QuizQuestion, Round
+
+
+def build(rounds, questions):
+    user = User.objects.create(username='bench')
+    quiz = Quiz.objects.create(title='Bench', created_by=user)
+    round_objs = Round.objects.bulk_create([
+        Round(quiz=quiz, name=f'Round {r}', type='MCQ', order=r, settings={'negative_marks': 2})
+        for r in range(rounds)
+    ])
+    bank = QuestionBank.objects.bulk_create([
+        QuestionBank(text=f'Question {i}', type='MCQ', options=['A', 'B', 'C', 'D'], answer='A', category='Bench')
+        for i in range(rounds * questions)
+    ])
+    QuizQuestion.objects.bulk_create([
+        QuizQuestion(round=round_objs[i // questions], question=q, order=i % questions, points=10)
+        for i, q in enumerate(bank)
+    ])
+    return quiz
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=8)
+    parser.add_argument('--questions', type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        for scale in (1, 10):
+            quiz = build(args.rounds, args.questions * scale) if scale == 1 else build(args.rounds * 2, args.questions * 5)
+            links = QuizQuestion.objects.filter(round__quiz=quiz).count()
+            for clone_questions in (False, True):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    copy = clone_quiz(quiz, clone_questions=clone_questions)
+                    elapsed = time.perf_counter() - start
+                copied = QuizQuestion.objects.filter(round__quiz=copy).count()
+                assert copied == links, (copied, links)
+                print(f'{links:5d} links, clone_questions={clone_questions!s:5}: '
+                      f'{elapsed * 1000:6.1f} ms, {len(queries)} queries')
+            User.objects.all().delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Mixed read/write load from simulated sockets, default vs tuned SQLite profile.
+
+"default" is what consumers got before: channels' database_sync_to_async,
+a fresh un-tuned connection per call (CONN_MAX_AGE=0, rollback journal).
+"tuned" uses core.db.database_async with WAL, busy_timeout and persistent
+connections on the bounded DB executor.
+
+Usage: python benchmarks/bench_db.py [--sockets 100] [--ops 20] [--write-ratio 0.3]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from common import setup_django, test_database
+
+setup_django()
+
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+from core import db
+from core.models import QuestionBank, Quiz, QuizQuestion, Round, Submission, Team
+
+
+def build(sockets, questions):
+    user = User.objects.create(username='bench')
+    quiz = Quiz.objects.create(title='Bench', created_by=user)
+    round_obj = Round.objects.create(quiz=quiz, name='Prelims', type='MCQ')
+    bank = QuestionBank.objects.bulk_create([
+        QuestionBank(text=f'Question {i}', type='MCQ', options=['A', 'B'], answer='A', category='Bench')
+        for i in range(questions)
+    ])
+    links = QuizQuestion.objects.bulk_create([QuizQuestion(round=round_obj, question=q) for q in bank])
+    teams = Team.objects.bulk_create([Team(quiz=quiz, name=f'Team {i}') for i in range(sockets)])
+    return quiz, round_obj, [link.pk for link in links], [team.pk for team in teams]
+
+
+def read(quiz_id, question_id):
+    list(Team.objects.filter(quiz_id=quiz_id).values_list('id', 'score'))
+    QuizQuestion.objects.filter(pk=question_id).values_list('round_id', flat=True).first()
+
+
+def write(round_id, question_id, team_id):
+    Submission.objects.bulk_create(
+        [Submission(round_id=round_id, question_id=question_id, team_id=team_id, answer='A')],
+        ignore_conflicts=True,
+    )
+
+
+async def run(wrap, sockets, ops, write_ratio, quiz, round_obj, question_ids, team_ids):
+    do_read, do_write = wrap(read), wrap(write)
+    latencies, errors = [], []
+
+    async def socket(team_id):
+        rng = random.Random(team_id)
+        for _ in range(ops):
+            question_id = rng.choice(question_ids)
+            start = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    await do_write(round_obj.pk, question_id, team_id)
+                else:
+                    await do_read(quiz.pk, question_id)
+            except Exception as e:
+                errors.append(type(e).__name__ + ': ' + str(e))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(socket(team_id) for team_id in team_ids[:sockets]))
+    return time.perf_counter() - start, latencies, errors
+
+
+def report(label, elapsed, latencies, errors):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f'{label:<8} {len(latencies) / elapsed:>8.0f} ops/s   p50 {statistics.median(latencies) * 1000:>7.1f} ms'
+          f'   p99 {p99 * 1000:>7.1f} ms   errors {len(errors)}')
+    for message in sorted(set(errors))[:3]:
+        print(f'         {message}')
+
+
+def configure(tuned):
+    db_settings = connections.settings['default']
+    if tuned:
+        db_settings['CONN_MAX_AGE'] = 600
+        connection_created.connect(db.apply_sqlite_pragmas, dispatch_uid='qzman_sqlite_pragmas')
+        journal_mode = 'WAL'
+    else:
+        db_settings['CONN_MAX_AGE'] = 0
+        connection_created.disconnect(dispatch_uid='qzman_sqlite_pragmas')
+        journal_mode = 'DELETE'
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sockets', type=int, default=100)
+    parser.add_argument('--ops', type=int, default=20)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    args = parser.parse_args()
+
+    with test_database():
+        fixtures = build(args.sockets, 50)
+        for label, tuned, wrap in (
+            ('default', False, database_sync_to_async),
+            ('tuned', True, db.database_async),
+        ):
+            configure(tuned)
+            Submission.objects.all().delete()
+            result = asyncio.run(run(wrap, args.sockets, args.ops, args.write_ratio, *fixtures))
+            report(label, *result)
+            connections.close_all()
+
+
+if __name__ == '__main__':
+    main()
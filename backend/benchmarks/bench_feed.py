@@ -0,0 +1,93 @@
+"""Hold many idle SSE subscribers on one quiz feed, then broadcast to them,
+and compare with encoding every event once per subscriber.
+
+Usage: python benchmarks/bench_feed.py [--subscribers 500] [--events 200]
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import tracemalloc
+
+from common import setup_django, test_database
+
+setup_django()
+
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+
+from core.broadcast import group_name
+from core.feed import get_feed
+from core.models import Quiz
+
+PAYLOAD = {'team_id': 17, 'status': 'submitted', 'scores': {str(i): i * 10 for i in range(20)}}
+
+
+async def run(quiz_id, subscribers, events):
+    feed = get_feed(quiz_id)
+    finished = 0
+    done = asyncio.Event()
+    # Each subscriber also gets the retry line and its opening snapshot
+    expected = events + 2
+
+    async def subscriber():
+        nonlocal finished
+        received = 0
+        async for chunk in feed.stream(keepalive=60):
+            received += chunk.count(b'\n\n')
+            if received == expected:
+                finished += 1
+                if finished == subscribers:
+                    done.set()
+
+    threads = threading.active_count()
+    tracemalloc.start()
+    tasks = [asyncio.ensure_future(subscriber()) for _ in range(subscribers)]
+    await asyncio.sleep(0.5)
+    idle_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'{subscribers} idle subscribers: {threading.active_count() - threads} extra threads, '
+          f'{idle_bytes / subscribers / 1024:.1f} KiB each')
+
+    layer = get_channel_layer()
+    start = time.perf_counter()
+    for i in range(events):
+        await layer.group_send(group_name(quiz_id), {
+            'type': 'quiz_message', 'message_type': 'SCORE_UPDATE', 'data': {**PAYLOAD, 'seq': i},
+        })
+        await asyncio.sleep(0)
+    await asyncio.wait_for(done.wait(), 60)
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    print(f'{events} events to {subscribers} subscribers in {elapsed * 1000:.0f} ms '
+          f'({events * subscribers / elapsed:.0f} deliveries/s)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--events', type=int, default=200)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for i in range(args.events):
+        for _ in range(args.subscribers):
+            json.dumps({'type': 'SCORE_UPDATE', 'data': {**PAYLOAD, 'seq': i}}).encode()
+    per_client = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(args.events):
+        json.dumps({'type': 'SCORE_UPDATE', 'data': {**PAYLOAD, 'seq': i}}).encode()
+    shared = time.perf_counter() - start
+    print(f'encoding {args.events} events: {per_client * 1000:.0f} ms once per subscriber, '
+          f'{shared * 1000:.1f} ms once per event')
+
+    with test_database():
+        quiz = Quiz.objects.create(title='Bench', created_by=User.objects.create(username='bench'))
+        asyncio.run(run(quiz.pk, args.subscribers, args.events))
+
+
+if __name__ == '__main__':
+    main()
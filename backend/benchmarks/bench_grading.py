@@ -0,0 +1,62 @@
+"""Time MCQ auto-grading of a large round.
+
+Usage: python benchmarks/bench_grading.py [--teams 500] [--questions 50]
+"""
+import argparse
+import random
+import time
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.grading import grade_mcq_round
+from core.models import QuestionBank, Quiz, QuizQuestion, Round, ScoreLog, Submission, Team
+
+OPTIONS = ['Option A', 'Option B', 'Option C', 'Option D']
+
+
+def build(teams, questions):
+    user = User.objects.create(username='bench')
+    quiz = Quiz.objects.create(title='Bench', created_by=user)
+    round_obj = Round.objects.create(quiz=quiz, name='Prelims', type='MCQ', settings={'negative_marks': 2})
+    bank = QuestionBank.objects.bulk_create([
+        QuestionBank(text=f'Question {i}', type='MCQ', options=OPTIONS,
+                     answer=random.choice(OPTIONS), category='Bench')
+        for i in range(questions)
+    ])
+    links = QuizQuestion.objects.bulk_create([
+        QuizQuestion(round=round_obj, question=q, order=i, points=10) for i, q in enumerate(bank)
+    ])
+    team_objs = Team.objects.bulk_create([Team(quiz=quiz, name=f'Team {i}') for i in range(teams)])
+    Submission.objects.bulk_create([
+        Submission(round=round_obj, question=link, team=team, answer=random.choice(OPTIONS + ['']))
+        for team in team_objs for link in links
+    ], batch_size=1000)
+    return round_obj
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type=int, default=500)
+    parser.add_argument('--questions', type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        round_obj = build(args.teams, args.questions)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            summary = grade_mcq_round(round_obj)
+            elapsed = time.perf_counter() - start
+        print(f'{args.teams} teams x {args.questions} questions: {elapsed * 1000:.0f} ms, '
+              f'{len(queries)} queries')
+        print(summary)
+        print(f'ScoreLog rows: {ScoreLog.objects.count()}')
+
+
+if __name__ == '__main__':
+    main()
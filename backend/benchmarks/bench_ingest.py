@@ -0,0 +1,86 @@
+"""Time bulk question ingestion of an archive-sized CSV or JSONL file.
+
+About 5% of the generated rows repeat an earlier question (with different
+case/spacing) and 1% are invalid. The file is ingested twice; the second
+pass must create nothing.
+
+Usage: python benchmarks/bench_ingest.py [--rows 80000] [--format csv]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import tracemalloc
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.conf import settings
+
+from core import ingestion
+from core.models import QuestionBank
+
+
+def write_archive(path, rows, fmt):
+    fields = ['text', 'type', 'options', 'answer', 'category', 'difficulty', 'tags']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields) if fmt == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for i in range(rows):
+            number = random.randrange(i) if i and random.random() < 0.05 else i
+            text = f'Question number {number} about   history?'
+            if number != i:
+                text = text.upper()
+            row = {
+                'text': text, 'type': 'MCQ', 'options': ['Alpha', 'Beta', 'Gamma', 'Delta'],
+                'answer': 'Beta', 'category': f'Category {i % 40}', 'difficulty': 'MEDIUM', 'tags': ['archive'],
+            }
+            if random.random() < 0.01:
+                row['answer'] = ''
+            if writer:
+                writer.writerow({**row, 'options': '|'.join(row['options']), 'tags': ','.join(row['tags'])})
+            else:
+                f.write(json.dumps(row) + '\n')
+
+
+def run(path, fmt):
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        return ingestion.ingest(ingestion.read_rows(stream, fmt))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=80000)
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, test_database():
+        path = os.path.join(tmp, f'archive.{args.format}')
+        write_archive(path, args.rows, args.format)
+
+        first = run(path, args.format)
+        print(f'first pass: {first.as_dict() | {"errors": len(first.errors)}}')
+        second = run(path, args.format)
+        print(f'second pass: {second.created} created, {second.duplicates} duplicates, '
+              f'{second.rows_per_second:.0f} rows/s')
+        print(f'bank size: {QuestionBank.objects.count()}')
+
+        # tracemalloc slows everything down, so memory gets its own pass;
+        # DEBUG would also keep the last 9000 INSERT statements around
+        QuestionBank.objects.all().delete()
+        settings.DEBUG = False
+        tracemalloc.start()
+        run(path, args.format)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'peak traced memory: {peak / 1024 / 1024:.1f} MiB')
+        if second.created:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
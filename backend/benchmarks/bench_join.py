@@ -0,0 +1,66 @@
+"""Doors-open burst: many teams joining one quiz at the same moment.
+
+Every team joins twice from two threads to exercise the (quiz, name)
+constraint; the run fails if any duplicate team is created.
+
+Usage: python benchmarks/bench_join.py [--teams 150]
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from rest_framework.test import APIClient
+
+from core.models import Quiz, Team
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type=int, default=150)
+    args = parser.parse_args()
+
+    with test_database():
+        user = User.objects.create(username='bench')
+        quiz = Quiz.objects.create(title='Finals', created_by=user)
+        latencies, failures = [], []
+        barrier = threading.Barrier(args.teams * 2)
+
+        def join(index):
+            client = APIClient()
+            barrier.wait()
+            start = time.perf_counter()
+            response = client.post('/api/join/', {
+                'access_code': quiz.code, 'team_name': f'Team {index}',
+            }, format='json')
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures.append(response.status_code)
+            connection.close()
+
+        threads = [threading.Thread(target=join, args=(i % args.teams,)) for i in range(args.teams * 2)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        print(f'{len(latencies)} joins in {elapsed * 1000:.0f} ms, '
+              f'p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms, '
+              f'failures {len(failures)}')
+        teams = Team.objects.filter(quiz=quiz).count()
+        print(f'teams created: {teams} (expected {args.teams})')
+        if teams != args.teams or failures:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Time live answer suggestions for a round of typed-answer questions.
+
+Submissions mix exact answers, typos, aliases and wrong answers the way a
+real room does, so many teams share the same spelling.
+
+Usage: python benchmarks/bench_matching.py [--teams 150] [--questions 20]
+"""
+import argparse
+import random
+import time
+from collections import Counter
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.matching import suggest_round
+from core.models import QuestionBank, Quiz, QuizQuestion, Round, Submission, Team
+
+ANSWERS = [
+    ('Mahatma Gandhi', ['Bapu']), ('The Eiffel Tower', []), ('World War II', ['Second World War']),
+    ('Leonardo da Vinci', []), ('Mumbai', ['Bombay']), ('Albert Einstein', []),
+    ('Nineteen forty seven', []), ('Mount Everest', ['Sagarmatha']), ('Tokyo', []),
+]
+
+
+def typo(text):
+    if len(text) < 4:
+        return text
+    index = random.randrange(1, len(text) - 1)
+    return text[:index] + text[index + 1:]
+
+
+def build(teams, questions):
+    user = User.objects.create(username='bench')
+    quiz = Quiz.objects.create(title='Bench', created_by=user)
+    round_obj = Round.objects.create(quiz=quiz, name='Finals', type='RAPID')
+    picks = [ANSWERS[i % len(ANSWERS)] for i in range(questions)]
+    bank = QuestionBank.objects.bulk_create([
+        QuestionBank(text=f'Question {i}', type='TEXT', answer=answer, aliases=aliases, category='Bench')
+        for i, (answer, aliases) in enumerate(picks)
+    ])
+    links = QuizQuestion.objects.bulk_create([
+        QuizQuestion(round=round_obj, question=q, order=i, points=10) for i, q in enumerate(bank)
+    ])
+    team_objs = Team.objects.bulk_create([Team(quiz=quiz, name=f'Team {i}') for i in range(teams)])
+    submissions = []
+    for team in team_objs:
+        for link, (answer, aliases) in zip(links, picks):
+            style = random.random()
+            if style < 0.4:
+                typed = answer.lower()
+            elif style < 0.7:
+                typed = typo(answer)
+            elif style < 0.8 and aliases:
+                typed = random.choice(aliases)
+            else:
+                typed = random.choice(ANSWERS)[0] + random.choice(['', ' ', '?'])
+            submissions.append(Submission(round=round_obj, question=link, team=team, answer=typed))
+    Submission.objects.bulk_create(submissions, batch_size=1000)
+    return round_obj
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type=int, default=150)
+    parser.add_argument('--questions', type=int, default=20)
+    args = parser.parse_args()
+
+    with test_database():
+        round_obj = build(args.teams, args.questions)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            suggestions = suggest_round(round_obj)
+            elapsed = time.perf_counter() - start
+        print(f'{args.teams} teams x {args.questions} questions: {len(suggestions)} suggestions '
+              f'in {elapsed * 1000:.0f} ms, {len(queries)} queries')
+        print(dict(Counter(suggestion['verdict'] for suggestion in suggestions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Time the values_list() readers against the nested ModelSerializers they
+replace on QuizViewSet, QuestionBankViewSet and TeamViewSet, checking that
+both render the same JSON bytes.
+
+Usage: python benchmarks/bench_readers.py [--rounds 10] [--questions 300] [--teams 200]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from core.models import MediaAsset, QuestionBank, Quiz, QuizQuestion, Round, Team
+from core.readers import question_bank_reader, quiz_reader, team_reader
+from core.serializers import QuestionBankSerializer, QuizSerializer, TeamSerializer
+
+OPTIONS = ['Option A', 'Option B', 'Option C', 'Option D']
+
+
+def build(rounds, questions, teams):
+    user = User.objects.create(username='bench')
+    quiz = Quiz.objects.create(
+        title='Bench', description='Large quiz', created_by=user,
+        scheduled_at=datetime(2026, 5, 1, 18, 30, 15, 123456, tzinfo=timezone.utc),
+    )
+    Quiz.objects.create(title='Other', created_by=user)
+    asset = MediaAsset.objects.create(sha256='ab' * 32, ext='png', content_type='image/png', size=10)
+    bank = QuestionBank.objects.bulk_create([
+        QuestionBank(
+            text=f'Question {i} "quoted" é', type='MCQ' if i % 2 else 'TEXT', options=OPTIONS if i % 2 else [],
+            answer=OPTIONS[0], aliases=['alt'] if i % 3 == 0 else [], category='Bench', tags=['x'],
+            media_url='https://example.com/a.png' if i % 5 == 0 else None, media_asset=asset if i % 7 == 0 else None,
+            fingerprint=f'{i:040x}',
+        )
+        for i in range(questions)
+    ])
+    round_objs = Round.objects.bulk_create([
+        Round(quiz=quiz, name=f'Round {r}', type='MCQ', order=r % 4, settings={'timer': 30, 'negative': r})
+        for r in range(rounds)
+    ])
+    QuizQuestion.objects.bulk_create([
+        QuizQuestion(round=round_objs[i % rounds], question=q, order=random.randrange(10), points=10)
+        for i, q in enumerate(bank)
+    ])
+    users = User.objects.bulk_create([User(username=f'team{i}') for i in range(teams // 2)])
+    Team.objects.bulk_create([
+        Team(quiz=quiz, name=f'Team {i}', members='A, B', score=i, user=users[i] if i < len(users) else None)
+        for i in range(teams)
+    ])
+    return quiz
+
+
+def timed(render, repeat):
+    best = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            body = render()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return body, best, len(queries)
+
+
+def compare(label, drf, fast, repeat):
+    renderer = JSONRenderer()
+    old, old_time, old_queries = timed(lambda: renderer.render(drf()), repeat)
+    new, new_time, new_queries = timed(lambda: renderer.render(fast()), repeat)
+    assert old == new, f'{label}: output differs'
+    print(f'{label:<28} serializer {old_time * 1000:7.1f} ms {old_queries:4} queries | '
+          f'reader {new_time * 1000:6.1f} ms {new_queries:2} queries | {old_time / new_time:4.1f}x, '
+          f'{len(new) / 1024:.0f} KiB identical')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--questions', type=int, default=300)
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with test_database():
+        quiz = build(args.rounds, args.questions, args.teams)
+        one = Quiz.objects.filter(pk=quiz.pk)
+        compare('quiz retrieve', lambda: QuizSerializer(one.get()).data,
+                lambda: quiz_reader.rows(one)[0], args.repeat)
+        compare('quiz list', lambda: QuizSerializer(Quiz.objects.all(), many=True).data,
+                lambda: quiz_reader.rows(Quiz.objects.all()), args.repeat)
+        compare('question bank list', lambda: QuestionBankSerializer(QuestionBank.objects.all(), many=True).data,
+                lambda: question_bank_reader.rows(QuestionBank.objects.all()), args.repeat)
+        compare('team list', lambda: TeamSerializer(Team.objects.all(), many=True).data,
+                lambda: team_reader.rows(Team.objects.all()), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
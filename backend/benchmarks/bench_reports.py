@@ -0,0 +1,77 @@
+"""Time the ScoreLog audit report and summary over a season-sized log.
+
+Usage: python benchmarks/bench_reports.py [--rows 300000] [--quizzes 20]
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import reports
+from core.models import Quiz, Round, ScoreLog, Team
+
+
+def build(rows, quizzes):
+    user = User.objects.create(username='bench')
+    start = timezone.now() - timedelta(days=180)
+    quiz_objs = Quiz.objects.bulk_create([Quiz(title=f'Quiz {i}', created_by=user) for i in range(quizzes)])
+    teams, rounds = {}, {}
+    for quiz in quiz_objs:
+        teams[quiz.pk] = Team.objects.bulk_create([Team(quiz=quiz, name=f'Team {i}') for i in range(30)])
+        rounds[quiz.pk] = Round.objects.bulk_create([Round(quiz=quiz, name=f'Round {i}', type='MCQ') for i in range(5)])
+    logs = []
+    for i in range(rows):
+        quiz = random.choice(quiz_objs)
+        logs.append(ScoreLog(
+            quiz=quiz, team=random.choice(teams[quiz.pk]), round=random.choice(rounds[quiz.pk]),
+            points=random.choice([10, 5, -5, 20]), reason='Bench', awarded_by=user,
+        ))
+    ScoreLog.objects.bulk_create(logs, batch_size=5000)
+    # auto_now_add stamps everything "now"; spread rows over the season instead
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE core_scorelog SET timestamp = datetime(%s, printf("+%%d seconds", id * 50))',
+            [start.strftime('%Y-%m-%d %H:%M:%S')],
+        )
+    return quiz_objs[0], teams[quiz_objs[0].pk][0]
+
+
+def timed(label, func):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - start
+    print(f'{label}: {elapsed * 1000:.0f} ms, {len(queries)} queries, {size}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--quizzes', type=int, default=20)
+    args = parser.parse_args()
+
+    with test_database():
+        quiz, team = build(args.rows, args.quizzes)
+        by_quiz = reports.filtered_logs({'quiz': quiz.pk})
+        by_team = reports.filtered_logs({'team': team.pk})
+        timed('csv, one quiz', lambda: f'{sum(map(len, reports.stream(by_quiz, "csv")))} bytes')
+        timed('jsonl, one quiz', lambda: f'{sum(map(len, reports.stream(by_quiz, "jsonl")))} bytes')
+        timed('csv, one team', lambda: f'{sum(map(len, reports.stream(by_team, "csv")))} bytes')
+        timed('summary, one quiz', lambda: f'{len(reports.summary(by_quiz)["teams"])} teams')
+        page = by_quiz.order_by('timestamp', 'id').values_list('id')[:reports.PAGE_SIZE]
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + str(page.query))
+            print('plan:', '; '.join(row[-1] for row in cursor.fetchall()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Compare per-question lookups against the database with the round cache.
+
+"Before" is what the hot paths did per question (answer submission, grading,
+snapshots): a QuizQuestion query joined to its bank question. "After" is
+RoundCache.question on a warmed round, plus the one-off cost of warming.
+
+Usage: python benchmarks/bench_roundcache.py [--questions 50] [--lookups 20000]
+"""
+import argparse
+import random
+import time
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import QuestionBank, Quiz, QuizQuestion, Round
+from core.roundcache import RoundCache
+
+
+def build(questions):
+    user = User.objects.create(username='bench')
+    quiz = Quiz.objects.create(title='Bench', created_by=user)
+    round_obj = Round.objects.create(quiz=quiz, name='Finals', type='STANDARD', settings={'negative_marks': 5})
+    bank = QuestionBank.objects.bulk_create([
+        QuestionBank(
+            text=f'Question {i}', type='MCQ' if i % 2 else 'TEXT', answer=f'Answer {i}',
+            options=[f'Answer {i}', 'Other', 'Neither', 'Both'] if i % 2 else [],
+            aliases=[f'Alias {i}'], category='Bench',
+            media_url=f'https://example.com/{i}.png' if i % 5 == 0 else None,
+        )
+        for i in range(questions)
+    ])
+    links = QuizQuestion.objects.bulk_create([
+        QuizQuestion(round=round_obj, question=q, order=i, points=10) for i, q in enumerate(bank)
+    ])
+    return round_obj, [link.pk for link in links]
+
+
+def database_lookup(link_id):
+    link = QuizQuestion.objects.select_related('question', 'round').get(pk=link_id)
+    return link.round.quiz_id, link.points, link.question.answer, link.question.options
+
+
+def cached_lookup(cache, link_id):
+    question = cache.question(link_id)
+    return question.quiz_id, question.points, question.answer, question.options
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    with test_database():
+        round_obj, link_ids = build(args.questions)
+        order = [random.choice(link_ids) for _ in range(args.lookups)]
+        cache = RoundCache()
+
+        db_lookups = min(args.lookups, 2000)
+        start = time.perf_counter()
+        expected = [database_lookup(link_id) for link_id in order[:db_lookups]]
+        before = (time.perf_counter() - start) / db_lookups
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            cache.warm(round_obj.pk)
+            warm = time.perf_counter() - start
+        start = time.perf_counter()
+        for link_id in order:
+            cached_lookup(cache, link_id)
+        after = (time.perf_counter() - start) / len(order)
+
+        got = [cached_lookup(cache, link_id) for link_id in order[:db_lookups]]
+        assert [(q, p, a, list(o)) for q, p, a, o in got] == expected, 'cache disagrees with the database'
+
+        print(f'{args.questions} questions, warmed in {warm * 1000:.1f} ms with {len(queries)} queries')
+        print(f'  database lookup: {before * 1e6:8.1f} us/question')
+        print(f'  cached lookup:   {after * 1e6:8.3f} us/question  ({before / after:,.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Drive several live quizzes at once through serve_sharded, with one worker
+and then with several, and compare broadcast latency and throughput.
+
+Each quiz gets one sending socket and --listeners receiving ones; senders
+broadcast timestamped messages at --rate per second for --seconds, and
+latency is measured from send to arrival at each listener.
+
+Usage: python benchmarks/bench_sharding.py [--quizzes 4] [--workers 1 4] [--listeners 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+
+from core.models import Quiz
+from core.replay import WebSocketClient, percentile
+
+BACKEND = os.path.join(os.path.dirname(__file__), '..')
+PORT = 8790
+WORKER_PORT = 9190
+
+
+def start(workers, db_name):
+    env = dict(os.environ, QZMAN_DB_NAME=str(db_name))
+    process = subprocess.Popen(
+        [sys.executable, 'manage.py', 'serve_sharded', '--workers', str(workers), '--port', str(PORT),
+         '--worker-port', str(WORKER_PORT)],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{PORT}/_supervisor/status', timeout=1) as response:
+                if all(worker['ready'] for worker in json.load(response)['workers']):
+                    return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    stop(process)
+    raise SystemExit('serve_sharded did not start')
+
+
+def stop(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def drive(quiz_ids, listeners, rate, seconds):
+    latencies = []
+    received = 0
+
+    def on_frame(payload, binary):
+        nonlocal received
+        message = json.loads(payload)
+        if message.get('type') == 'BENCH':
+            received += 1
+            latencies.append(time.perf_counter() - message['data']['sent'])
+
+    clients = []
+    senders = []
+    for quiz_id in quiz_ids:
+        path = f'/ws/quiz/{quiz_id}/?role=projector'
+        for _ in range(listeners):
+            clients.append(await WebSocketClient.connect('127.0.0.1', PORT, path, None, on_frame))
+        sender = await WebSocketClient.connect('127.0.0.1', PORT, path, None, lambda payload, binary: None)
+        clients.append(sender)
+        senders.append(sender)
+
+    sent = 0
+    start = time.perf_counter()
+    for tick in range(int(rate * seconds)):
+        await asyncio.sleep(max(0.0, start + tick / rate - time.perf_counter()))
+        for sender in senders:
+            sender.send(json.dumps({'type': 'BENCH', 'data': {'sent': time.perf_counter()}}).encode())
+            sent += 1
+    expected = sent * listeners
+    deadline = time.perf_counter() + 10
+    while received < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    latencies.sort()
+    return {
+        'delivered': received,
+        'expected': expected,
+        'per_second': received / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quizzes', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--listeners', type=int, default=50, help='Receiving sockets per quiz')
+    parser.add_argument('--rate', type=float, default=10, help='Broadcasts per second per quiz')
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    with test_database() as connection:
+        user = User.objects.create(username='bench')
+        quiz_ids = [Quiz.objects.create(title=f'Bench {i}', created_by=user).pk for i in range(args.quizzes)]
+        print(f'{args.quizzes} quizzes x {args.listeners} listeners, {args.rate:g} broadcasts/s each '
+              f'for {args.seconds:g}s ({os.cpu_count()} CPUs)')
+        for workers in args.workers:
+            process = start(workers, connection.settings_dict['NAME'])
+            try:
+                result = asyncio.run(drive(quiz_ids, args.listeners, args.rate, args.seconds))
+            finally:
+                stop(process)
+            print(f'{workers} worker(s): {result["delivered"]}/{result["expected"]} frames, '
+                  f'{result["per_second"]:.0f}/s, p50 {result["p50_ms"]:.1f} ms, p99 {result["p99_ms"]:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Time round standings (score-then-time ranking, per-question percentiles
+and team cards) over a round's packed response times.
+
+Usage: python benchmarks/bench_standings.py [--teams 500] [--questions 50]
+"""
+import argparse
+import random
+import time
+
+from common import setup_django, test_database
+
+setup_django()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core import timing
+from core.grading import grade_mcq_round
+from core.models import QuestionBank, Quiz, QuizQuestion, Round, RoundTimings, Submission, Team
+from core.standings import round_standings
+
+OPTIONS = ['Option A', 'Option B', 'Option C', 'Option D']
+
+
+def build(teams, questions):
+    user = User.objects.create(username='bench')
+    quiz = Quiz.objects.create(title='Bench', created_by=user)
+    round_obj = Round.objects.create(quiz=quiz, name='Prelims', type='MCQ')
+    bank = QuestionBank.objects.bulk_create([
+        QuestionBank(text=f'Question {i}', type='MCQ', options=OPTIONS, answer=OPTIONS[0], category='Bench')
+        for i in range(questions)
+    ])
+    links = QuizQuestion.objects.bulk_create([
+        QuizQuestion(round=round_obj, question=q, order=i, points=10) for i, q in enumerate(bank)
+    ])
+    team_objs = Team.objects.bulk_create([Team(quiz=quiz, name=f'Team {i}') for i in range(teams)])
+    Submission.objects.bulk_create([
+        Submission(round=round_obj, question=link, team=team, answer=random.choice(OPTIONS))
+        for team in team_objs for link in links
+    ], batch_size=1000)
+    for link in links:
+        for team in team_objs:
+            timing.record(round_obj.pk, team.pk, link.pk, random.lognormvariate(8.5, 0.6))
+    timing.flush(round_obj.pk)
+    grade_mcq_round(round_obj)
+    return round_obj
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type=int, default=500)
+    parser.add_argument('--questions', type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        round_obj = build(args.teams, args.questions)
+        stored = len(RoundTimings.objects.get(round=round_obj).data)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            standings = round_standings(round_obj.pk)
+            elapsed = time.perf_counter() - start
+        print(f'{args.teams} teams x {args.questions} questions: {args.teams * args.questions} response times '
+              f'stored in {stored / 1024:.0f} KiB')
+        print(f'standings in {elapsed * 1000:.0f} ms, {len(queries)} queries')
+        print('winner:', standings['teams'][0]['summary'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Cold-start cost of the server and management entry points.
+
+Each target runs in a fresh interpreter under -X importtime. The run fails
+when the median wall time goes over budget or when a module that should be
+imported lazily (e.g. the openai SDK) shows up at startup.
+
+Workers restart between events, so `import qzman.asgi` must stay under a
+second. `manage.py check` gets more: besides setup it loads the URLconf (all
+views and DRF) and runs the system checks, and daphne's app config installs
+the Twisted reactor on import (~300 ms) before any of our code runs.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--budget SECONDS] [--top 8]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# label -> (command, median wall time budget in seconds)
+TARGETS = {
+    'import qzman.asgi': ([sys.executable, '-X', 'importtime', '-c', 'import qzman.asgi'], 1.0),
+    'manage.py check': ([sys.executable, '-X', 'importtime', 'manage.py', 'check'], 1.5),
+}
+# Optional dependencies our code imports on first use; they must stay out of
+# startup (brotli is not listed because autobahn probes for it on import)
+LAZY_MODULES = ['openai', 'PIL', 'msgpack']
+
+
+def parse_importtime(stderr):
+    """Map of top-level module -> cumulative import time in microseconds"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, _, rest = line.partition(':')
+        _, cumulative, name = (part.strip() for part in rest.split('|'))
+        modules[name] = int(cumulative)
+    return modules
+
+
+def run(command):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='qzman.settings')
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=BACKEND, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise SystemExit(f'{" ".join(command)} failed:\n{result.stderr[-2000:]}')
+    return elapsed, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, help='Seconds allowed per target (median), overriding the defaults')
+    parser.add_argument('--top', type=int, default=8, help='Slowest top-level imports to show')
+    args = parser.parse_args()
+
+    failed = False
+    for label, (command, budget) in TARGETS.items():
+        budget = args.budget or budget
+        times, modules = [], {}
+        for _ in range(args.runs):
+            elapsed, modules = run(command)
+            times.append(elapsed)
+        median = statistics.median(times)
+        over = median > budget
+        print(f'{label}: median {median * 1000:.0f} ms, min {min(times) * 1000:.0f} ms '
+              f'({"OVER" if over else "within"} {budget * 1000:.0f} ms budget)')
+        slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, cumulative in slowest:
+            print(f'    {cumulative / 1000:7.1f} ms  {name}')
+        eager = sorted({name.split('.')[0] for name in modules} & set(LAZY_MODULES))
+        if eager:
+            print(f'    imported at startup, should be lazy: {", ".join(eager)}')
+        failed = failed or over or bool(eager)
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Compare frame sizes and encode/decode cost of the JSON and MessagePack wire formats.
+
+Usage: python benchmarks/bench_wire.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from core import wire
+
+SAMPLES = {
+    'ANSWER_SUBMISSION': {'team_id': 42, 'status': 'submitted'},
+    'SUBMIT_ANSWER': {'answer': 'Option C', 'team_id': 42, 'team_name': 'Quizzy Rascals'},
+    'TIMER_UPDATE': {'remaining': 87},
+    'PHASE_CHANGE': {
+        'phase': 'QUESTION',
+        'questionIndex': 12,
+        'question': {
+            'text': 'Which element has the chemical symbol "W"?',
+            'category': 'Science',
+            'difficulty': 'MEDIUM',
+            'type': 'MCQ',
+            'options': ['Tungsten', 'Wolfram oxide', 'Vanadium', 'Tin'],
+        },
+    },
+    'SCORE_UPDATE': {
+        'teams': [{'id': i, 'name': f'Team {i}', 'score': i * 10} for i in range(1, 81)],
+    },
+}
+
+
+def bench(codec, msg_type, data, number):
+    frame = codec.encode(msg_type, data)
+    encode = timeit.timeit(lambda: codec.encode(msg_type, data), number=number)
+    decode = timeit.timeit(lambda: codec.decode(frame), number=number)
+    return len(frame if codec.binary else frame.encode('utf-8')), encode / number * 1e6, decode / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    msgpack = wire.msgpack_codec()
+    if msgpack is None:
+        sys.exit('msgpack is not installed')
+
+    print(f"{'message':<20}{'json B':>8}{'mpk B':>8}{'ratio':>7}"
+          f"{'json enc us':>13}{'mpk enc us':>12}{'json dec us':>13}{'mpk dec us':>12}")
+    for msg_type, data in SAMPLES.items():
+        j_size, j_enc, j_dec = bench(wire.JSON, msg_type, data, args.number)
+        m_size, m_enc, m_dec = bench(msgpack, msg_type, data, args.number)
+        print(f'{msg_type:<20}{j_size:>8}{m_size:>8}{m_size / j_size:>7.2f}'
+              f'{j_enc:>13.2f}{m_enc:>12.2f}{j_dec:>13.2f}{m_dec:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
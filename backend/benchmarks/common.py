@@ -0,0 +1,25 @@
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def setup_django():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'qzman.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Run against a throwaway migrated database instead of db.sqlite3"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
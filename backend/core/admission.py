@@ -0,0 +1,123 @@
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+
+from .models import Quiz, Team
+
+
+TEAM_TOKEN_SALT = 'qzman.team'
+
+
+def team_token(quiz_id, team_id):
+    """Signed proof, handed out on join, that a device plays for this team"""
+    return signing.dumps([int(quiz_id), int(team_id)], salt=TEAM_TOKEN_SALT)
+
+
+def team_from_token(token, quiz_id):
+    """The team id a team_token was issued for, if it is valid for this quiz"""
+    if not token:
+        return None
+    try:
+        token_quiz, team_id = signing.loads(str(token), salt=TEAM_TOKEN_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return team_id if token_quiz == int(quiz_id) else None
+
+
+class JoinCodeCache:
+    """In-process map of quiz join code -> quiz id.
+
+    Misses fall through to the (unique, indexed) Quiz.code column; any quiz
+    save or delete clears the map (see core.signals).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._codes = {}
+
+    def resolve(self, code):
+        code = (code or '').strip()
+        if not code:
+            return None
+        quiz_id = self._codes.get(code)
+        if quiz_id is None:
+            quiz_id = Quiz.objects.filter(code=code).values_list('id', flat=True).first()
+            if quiz_id is not None:
+                with self._lock:
+                    self._codes[code] = quiz_id
+        return quiz_id
+
+    def invalidate(self):
+        with self._lock:
+            self._codes.clear()
+
+
+class JoinBatcher:
+    """Admit bursts of team joins with one bulk_create per batch.
+
+    Joins queue up while an insert is running; whoever takes the flush lock
+    next inserts every queued team (up to max_size) in one go and hands each
+    waiting request its result. Nobody waits for a batch to fill, so a lone
+    join costs one insert: under Daphne, sync views share one thread and a
+    timed wait there would stall every other view. Only the request that
+    created a team gets it back; a name that is already taken, by an earlier
+    join or another request in the same batch, gets None, so nobody can take
+    over a team just by knowing its name.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+
+    def admit(self, quiz_id, name):
+        """The newly created Team, or None if the quiz already has a team of that name"""
+        future = Future()
+        with self._lock:
+            self._pending.append((quiz_id, name, future))
+        with self._flush_lock:
+            # A flush that ran while we waited for the lock may have admitted us already
+            while not future.done():
+                with self._lock:
+                    batch = self._pending[:self.max_size]
+                    del self._pending[:self.max_size]
+                self._flush(batch)
+        return future.result()
+
+    def _flush(self, batch):
+        try:
+            created = self._create({(quiz_id, name) for quiz_id, name, _ in batch})
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for quiz_id, name, future in batch:
+            # The first request for a name takes the team; the rest find it taken
+            future.set_result(created.pop((quiz_id, name), None))
+
+    def _create(self, keys):
+        """Insert the teams; returns {(quiz_id, name): Team} for the rows actually created"""
+        teams = [Team(quiz_id=quiz_id, name=name) for quiz_id, name in keys]
+        try:
+            with transaction.atomic():
+                Team.objects.bulk_create(teams)
+            return {(team.quiz_id, team.name): team for team in teams}
+        except IntegrityError:
+            pass
+        # Some names are taken: insert one at a time to learn which
+        created = {}
+        for quiz_id, name in keys:
+            try:
+                with transaction.atomic():
+                    created[quiz_id, name] = Team.objects.create(quiz_id=quiz_id, name=name)
+            except IntegrityError:
+                pass
+        return created
+
+
+join_codes = JoinCodeCache()
+join_batcher = JoinBatcher(max_size=settings.QZMAN_JOIN_BATCH['MAX_SIZE'])
@@ -1,6 +1,5 @@
 import os
 import json
-from openai import OpenAI
 from django.conf import settings
 
 def generate_questions_from_topic(topic, count=5, difficulty='MEDIUM'):
@@ -23,6 +22,8 @@ def generate_questions_from_topic(topic, count=5, difficulty='MEDIUM'):
             } for i in range(count)
         ]
 
+    # The SDK takes longer to import than the rest of the app; only load it when used
+    from openai import OpenAI
     client = OpenAI(api_key=api_key)
 
     prompt = f"""
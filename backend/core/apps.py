@@ -1,5 +1,20 @@
+import os
+
 from django.apps import AppConfig
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from .db import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='qzman_sqlite_pragmas')
+        from . import signals
+        from .sharding import STATE_ENV, ChangeWatcher
+        # Worker of serve_sharded: follow content changes made by the other workers
+        if os.environ.get(STATE_ENV):
+            ChangeWatcher(
+                os.environ[STATE_ENV], signals.invalidate_all, settings.QZMAN_SHARDING['WATCH_INTERVAL'],
+            ).start()
@@ -0,0 +1,274 @@
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import re
+import time
+from email.utils import formatdate
+from pathlib import Path
+
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+# Compressed siblings, in order of preference when the client accepts both
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'application/xml')
+# collectstatic's manifest names (app.3f9a1c2e04b7.css) and Vite's build
+# output under the SPA's assets/ (index-BkL2x7Qa.js)
+MANIFEST_NAME = re.compile(r'\.[0-9a-f]{12}\.[A-Za-z0-9]+$')
+VITE_NAME = re.compile(r'-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# A miss rescans a mount's directory at most this often (see Mount.find)
+RESCAN_SECONDS = 1.0
+
+
+def compressible(path):
+    content_type = mimetypes.guess_type(str(path))[0] or ''
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_file(path, min_size=512):
+    """Write .gz (and .br when brotli is installed) next to `path`.
+
+    Variants are skipped when up to date, and removed when they would not
+    be smaller than the original. Returns the encodings written.
+    """
+    path = Path(path)
+    stat = path.stat()
+    if stat.st_size < min_size or not compressible(path):
+        return []
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    data = None
+    written = []
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        target = path.with_name(path.name + suffix)
+        if target.exists() and target.stat().st_mtime >= stat.st_mtime:
+            continue
+        if data is None:
+            data = path.read_bytes()
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=11)
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) >= len(data):
+            target.unlink(missing_ok=True)
+            continue
+        target.write_bytes(compressed)
+        written.append(encoding)
+    return written
+
+
+class StaticFile:
+    __slots__ = ('path', 'size', 'mtime_ns', 'content_type', 'etag', 'last_modified', 'cache_control', 'variants')
+
+    def __init__(self, path, relative, hashed):
+        stat = path.stat()
+        self.path = path
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.etag = '"%s"' % hashlib.md5(f'{relative}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:20]
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.cache_control = IMMUTABLE if hashed else REVALIDATE
+        self.variants = {}
+        for encoding, suffix in ENCODINGS:
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file() and variant.stat().st_mtime >= stat.st_mtime:
+                self.variants[encoding] = (variant, variant.stat().st_size)
+
+    def changed(self):
+        """Whether the file was rewritten or removed since it was indexed"""
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return True
+        return (stat.st_size, stat.st_mtime_ns) != (self.size, self.mtime_ns)
+
+    def select(self, accept_encoding):
+        """(path, size, encoding or None) for the best variant the client accepts"""
+        if self.variants and accept_encoding:
+            accepted = parse_accept_encoding(accept_encoding)
+            for encoding, _ in ENCODINGS:
+                if encoding in self.variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                    path, size = self.variants[encoding]
+                    return path, size, encoding
+        return self.path, self.size, None
+
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+
+class Mount:
+    """A URL prefix served from a directory.
+
+    The directory is indexed at startup and again when it changes on disk,
+    so a new build is served without a restart: each hit checks its file's
+    size and mtime (one stat), and a miss rescans at most every
+    RESCAN_SECONDS to pick up new files. Precompressed siblings written
+    later are only noticed on the next rescan, so run compress_assets as
+    part of the build.
+    """
+
+    def __init__(self, prefix, root, spa=False):
+        self.prefix = '/' + prefix.strip('/') + '/' if prefix.strip('/') else '/'
+        self.root = Path(root)
+        self.spa = spa
+        self.files = {}
+        self.scanned = 0.0
+        self.scan()
+
+    def scan(self):
+        self.scanned = time.monotonic()
+        files = {}
+        for path in iter_files([self.root]):
+            relative = path.relative_to(self.root).as_posix()
+            files[relative] = StaticFile(path, relative, self.is_hashed(relative))
+        self.files = files
+
+    def is_hashed(self, relative):
+        if MANIFEST_NAME.search(relative):
+            return True
+        return self.spa and relative.startswith('assets/') and bool(VITE_NAME.search(relative))
+
+    def find(self, url_path):
+        """lookup, rescanning first when the directory has changed since it was indexed"""
+        if not url_path.startswith(self.prefix):
+            return None
+        found = self.lookup(url_path)
+        if found is None:
+            stale = time.monotonic() - self.scanned >= RESCAN_SECONDS
+        else:
+            stale = found.changed()
+        if stale:
+            self.scan()
+            found = self.lookup(url_path)
+        return found
+
+    def lookup(self, url_path):
+        if not url_path.startswith(self.prefix):
+            return None
+        relative = url_path[len(self.prefix):]
+        found = self.files.get(relative)
+        if found is None and (not relative or relative.endswith('/')):
+            found = self.files.get(relative + 'index.html')
+        if found is None and self.spa and '.' not in relative.rsplit('/', 1)[-1]:
+            # Client-side routes of the single-page app all load index.html
+            found = self.files.get('index.html')
+        return found
+
+
+class StaticFilesApp:
+    """ASGI wrapper that answers GET/HEAD for files under the configured mounts
+    without entering Django, and passes everything else to `app`.
+
+    Precompressed .br/.gz siblings (see the compress_assets command) are picked
+    by Accept-Encoding; bundler-hashed names get immutable caching, the rest
+    revalidate by ETag. Bodies go out through the server's zero-copy or
+    path-send extension when offered.
+    """
+
+    def __init__(self, app, mounts=None, passthrough=None):
+        self.app = app
+        mounts = settings.QZMAN_STATIC_MOUNTS if mounts is None else mounts
+        self.mounts = [Mount(mount['PREFIX'], mount['ROOT'], mount.get('SPA', False)) for mount in mounts]
+        # Longest prefix first so /scholar/ wins over /
+        self.mounts.sort(key=lambda mount: len(mount.prefix), reverse=True)
+        self.passthrough = tuple(settings.QZMAN_STATIC_PASSTHROUGH if passthrough is None else passthrough)
+
+    def find(self, path):
+        if path.startswith(self.passthrough):
+            return None
+        for mount in self.mounts:
+            found = mount.find(path)
+            if found is not None:
+                return found
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            static_file = self.find(scope['path'])
+            if static_file is not None:
+                return await self.serve(static_file, scope, send)
+        return await self.app(scope, receive, send)
+
+    async def serve(self, static_file, scope, send):
+        headers = {}
+        for name, value in scope['headers']:
+            headers[name.decode('latin-1').lower()] = value.decode('latin-1')
+
+        response_headers = [
+            (b'etag', static_file.etag.encode()),
+            (b'last-modified', static_file.last_modified.encode()),
+            (b'cache-control', static_file.cache_control.encode()),
+            (b'vary', b'Accept-Encoding'),
+        ]
+        if_none_match = headers.get('if-none-match')
+        if if_none_match and static_file.etag in (tag.strip() for tag in if_none_match.split(',')):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        path, size, encoding = static_file.select(headers.get('accept-encoding', ''))
+        response_headers += [
+            (b'content-type', static_file.content_type.encode()),
+            (b'content-length', str(size).encode()),
+        ]
+        if encoding:
+            response_headers.append((b'content-encoding', encoding.encode()))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        extensions = scope.get('extensions') or {}
+        if 'http.response.pathsend' in extensions:
+            await send({'type': 'http.response.pathsend', 'path': str(path)})
+        elif 'http.response.zerocopysend' in extensions:
+            with open(path, 'rb') as f:
+                await send({'type': 'http.response.zerocopysend', 'file': f.fileno(), 'count': size})
+        else:
+            await self.send_chunks(path, send)
+
+    async def send_chunks(self, path, send):
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, CHUNK_SIZE)
+                more = len(chunk) == CHUNK_SIZE
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more})
+                if not more:
+                    break
+
+
+def configured_roots():
+    return [Path(mount['ROOT']) for mount in settings.QZMAN_STATIC_MOUNTS]
+
+
+def iter_files(roots):
+    for root in roots:
+        if root.is_dir():
+            for path in root.rglob('*'):
+                if path.is_file() and path.suffix not in ('.gz', '.br'):
+                    yield path
@@ -0,0 +1,40 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def group_name(quiz_id):
+    return f'quiz_{quiz_id}'
+
+
+def team_group_name(quiz_id, team_id):
+    """Sockets of one team's devices"""
+    return f'quiz_{quiz_id}_team_{team_id}'
+
+
+def broadcast(quiz_id, message_type, data):
+    """Send a quiz_message to every socket of a quiz from synchronous code"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(group_name(quiz_id), {
+        'type': 'quiz_message',
+        'message_type': message_type,
+        'data': data,
+    })
+
+
+def send_to_teams(quiz_id, message_type, data_by_team):
+    """Send each team its own quiz_message, all from one trip to the channel layer"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None or not data_by_team:
+        return
+
+    async def send_all():
+        for team_id, data in data_by_team.items():
+            await channel_layer.group_send(team_group_name(quiz_id, team_id), {
+                'type': 'quiz_message',
+                'message_type': message_type,
+                'data': data,
+            })
+
+    async_to_sync(send_all)()
@@ -0,0 +1,78 @@
+import gzip
+import hashlib
+import json
+
+from .roundcache import rounds
+
+
+class RoundBundle:
+    """A round's question content, gzip-compressed and content-hashed"""
+    __slots__ = ('round_id', 'source', 'etag', 'compressed', 'size')
+
+    def __init__(self, source, etag, compressed, size):
+        self.round_id = source.id
+        # The cached RoundData the bundle was built from; an edit replaces it
+        self.source = source
+        self.etag = etag
+        self.compressed = compressed
+        self.size = size
+
+    def decompressed(self):
+        return gzip.decompress(self.compressed)
+
+
+_bundles = {}
+
+
+def bundle_content(data):
+    """Everything a device needs to show a round's questions, minus the answers"""
+    return {
+        'round': {
+            'id': data.id,
+            'quiz': data.quiz_id,
+            'name': data.name,
+            'type': data.type,
+            'order': data.order,
+            'settings': dict(data.settings),
+        },
+        'questions': [
+            {
+                'id': question.id,
+                'order': question.order,
+                'points': question.points,
+                'text': question.text,
+                'type': question.type,
+                'options': list(question.options),
+                'category': question.category,
+                'difficulty': question.difficulty,
+                'media': question.media,
+            }
+            for question in data.questions
+        ],
+    }
+
+
+def build_bundle(data):
+    # Sorted keys and a fixed gzip mtime make the bytes, and so the ETag,
+    # identical for identical content on every worker
+    raw = json.dumps(bundle_content(data), sort_keys=True, separators=(',', ':')).encode()
+    bundle = RoundBundle(
+        data,
+        hashlib.sha256(raw).hexdigest()[:32],
+        gzip.compress(raw, compresslevel=9, mtime=0),
+        len(raw),
+    )
+    _bundles[data.id] = bundle
+    return bundle
+
+
+def get_bundle(round_id):
+    """The bundle for a round's cached content, rebuilt after an edit; None if no such round"""
+    data = rounds.get(round_id)
+    if data is None:
+        _bundles.pop(round_id, None)
+        return None
+    bundle = _bundles.get(round_id)
+    if bundle is None or bundle.source is not data:
+        bundle = build_bundle(data)
+    return bundle
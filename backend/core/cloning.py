@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models import Max
+
+from .models import QuestionBank, Quiz, QuizQuestion, Round
+
+ROUND_FIELDS = ('id', 'name', 'type', 'order', 'settings')
+LINK_FIELDS = ('round_id', 'question_id', 'order', 'points')
+QUESTION_FIELDS = (
+    'id', 'text', 'media_url', 'media_asset_id', 'type', 'options', 'answer', 'aliases',
+    'category', 'tags', 'difficulty', 'fingerprint',
+)
+
+
+def _clone_rounds(round_rows, quiz_id, clone_questions):
+    """Copy rounds (ROUND_FIELDS value dicts) and their question links into quiz_id.
+
+    One query reads the links (and one the bank questions, when
+    clone_questions) and one bulk_create writes each of rounds, bank copies
+    and links, however many there are; the backend splits only very large
+    inserts by its parameter limit.
+    Cloned rounds start inactive. Returns the new rounds.
+    """
+    if not round_rows:
+        return []
+    new_rounds = Round.objects.bulk_create([
+        Round(
+            quiz_id=quiz_id, name=row['name'], type=row['type'], order=row['order'], settings=row['settings'],
+        )
+        for row in round_rows
+    ])
+    round_map = {row['id']: new.pk for row, new in zip(round_rows, new_rounds)}
+
+    links = list(
+        QuizQuestion.objects
+        .filter(round_id__in=list(round_map))
+        .order_by('round_id', 'order', 'id')
+        .values(*LINK_FIELDS)
+    )
+    question_map = {}
+    if clone_questions and links:
+        originals = list(
+            QuestionBank.objects
+            .filter(quizquestion__round_id__in=list(round_map))
+            .distinct()
+            .order_by('id')
+            .values(*QUESTION_FIELDS)
+        )
+        # bulk_create skips save(); the copied text keeps its fingerprint
+        copies = QuestionBank.objects.bulk_create([
+            QuestionBank(**{field: row[field] for field in QUESTION_FIELDS if field != 'id'})
+            for row in originals
+        ])
+        question_map = {row['id']: copy.pk for row, copy in zip(originals, copies)}
+
+    QuizQuestion.objects.bulk_create([
+        QuizQuestion(
+            round_id=round_map[link['round_id']],
+            question_id=question_map.get(link['question_id'], link['question_id']),
+            order=link['order'],
+            points=link['points'],
+            is_cloned=clone_questions,
+        )
+        for link in links
+    ])
+    return new_rounds
+
+
+def clone_quiz(quiz, title=None, created_by=None, clone_questions=False):
+    """Copy a quiz with its rounds, settings and question links in one transaction.
+
+    The copy gets a new join code and no teams, and is not active. Bank
+    questions are shared with the original unless clone_questions, in which
+    case each one is copied and the links are marked is_cloned. The number
+    of queries does not depend on the size of the quiz.
+    """
+    with transaction.atomic():
+        copy = Quiz.objects.create(
+            title=title or f'{quiz.title} (Copy)',
+            description=quiz.description,
+            scheduled_at=quiz.scheduled_at,
+            created_by=created_by or quiz.created_by,
+        )
+        round_rows = list(Round.objects.filter(quiz=quiz).order_by('order', 'id').values(*ROUND_FIELDS))
+        _clone_rounds(round_rows, copy.pk, clone_questions)
+    return copy
+
+
+def clone_round(round_obj, quiz=None, name=None, clone_questions=False):
+    """Copy a round and its question links to the end of `quiz` (default: its own quiz)"""
+    target_id = quiz.pk if quiz is not None else round_obj.quiz_id
+    with transaction.atomic():
+        last = Round.objects.filter(quiz_id=target_id).aggregate(last=Max('order'))['last']
+        row = {field: getattr(round_obj, 'pk' if field == 'id' else field) for field in ROUND_FIELDS}
+        row['name'] = name or (f'{round_obj.name} (Copy)' if target_id == round_obj.quiz_id else round_obj.name)
+        row['order'] = 0 if last is None else last + 1
+        return _clone_rounds([row], target_id, clone_questions)[0]
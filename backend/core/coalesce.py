@@ -0,0 +1,50 @@
+import asyncio
+
+
+class Coalescer:
+    """Batch same-kind events for one connection inside a short window.
+
+    Events whose type is in `types` are held for up to `window_ms` and then
+    sent as a single BATCH frame per kind (or as the plain frame when only one
+    arrived). Any other event flushes what is pending and goes out
+    immediately, so latency-critical events like buzzer locks are never
+    delayed and ordering is preserved.
+    """
+
+    def __init__(self, send, window_ms, types):
+        self._send = send
+        self.window = window_ms / 1000
+        self.types = frozenset(types)
+        self._pending = {}
+        self._task = None
+
+    async def push(self, msg_type, data):
+        if not self.window or msg_type not in self.types:
+            await self.flush()
+            await self._send(msg_type, data)
+            return
+        self._pending.setdefault(msg_type, []).append(data)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._task = None
+        await self.flush()
+
+    async def flush(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        pending, self._pending = self._pending, {}
+        for kind, items in pending.items():
+            if len(items) == 1:
+                await self._send(kind, items[0])
+            else:
+                await self._send('BATCH', {'kind': kind, 'items': items})
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._pending = {}
@@ -1,47 +1,126 @@
-import json
+from urllib.parse import parse_qs
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from .models import Team, Quiz, QuizQuestion
+from .models import Team, Quiz, Submission
+from .admission import team_from_token
+from .broadcast import team_group_name
+from .coalesce import Coalescer
+from .db import database_async
+from .game import CommandError, get_actor
+from .outbox import Outbox
+from .profiling import profiled, profiler
+from .recording import get_recorder
+from .roundcache import rounds
+from . import timing, wire
+
+RECIPIENT_CLASSES = ('projector', 'qm', 'team')
 
 class QuizConsumer(AsyncWebsocketConsumer):
+    @profiled('connect')
     async def connect(self):
         self.quiz_id = self.scope['url_route']['kwargs']['quiz_id']
         self.room_group_name = f'quiz_{self.quiz_id}'
+        if not self.quiz_id.isdigit() or not await self.quiz_exists():
+            await self.close()
+            return
+        self.actor = await get_actor(self.quiz_id)
+        self.actor.attach()
+        self.codec = wire.negotiate(self.scope.get('subprotocols'))
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        # Game control follows the logged-in user, never the query string
+        self.controls_game = await self.user_controls_quiz()
+        role = query.get('role', [None])[0]
+        if role not in RECIPIENT_CLASSES or (role == 'qm' and not self.controls_game):
+            role = None
+        self.role = role or ('qm' if self.controls_game else 'team')
+        self.profile_requested = profiler.authorized(query.get('profile', [None])[0])
+        queue = settings.QZMAN_SEND_QUEUE
+        self.outbox = Outbox(
+            self.write_frame,
+            self.close_slow_consumer,
+            self.close_broken_connection,
+            maxsize=queue['MAXSIZE'],
+            overflow_seconds=queue['OVERFLOW_SECONDS'],
+            policies=queue['POLICIES'],
+            label=f'ws.{self.role}',
+        )
+        self.coalescer = Coalescer(
+            self.outbox.put,
+            settings.QZMAN_COALESCE_WINDOWS.get(self.role, 0),
+            settings.QZMAN_COALESCE_TYPES,
+        )
+
+        self.recorder = get_recorder()
+        if self.recorder is not None:
+            self.recording_id = self.recorder.open_connection(self.scope, self.codec.subprotocol)
 
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        self.team_id = None
+        token = query.get('team_token', [None])[0]
+        user = self.scope.get('user')
+        if self.role == 'team' and (token or (user is not None and user.is_authenticated)):
+            await self.join_team_group(await self.resolve_team(token))
 
-        await self.accept()
+        await self.accept(subprotocol=self.codec.subprotocol)
+        # Late joiners see what is on screen now, straight from the actor
+        await self.send_message('STATE_SNAPSHOT', self.actor.snapshot())
 
     async def disconnect(self, close_code):
+        if hasattr(self, 'actor'):
+            self.actor.detach()
+        if not hasattr(self, 'outbox'):
+            return
+        self.coalescer.close()
+        self.outbox.close()
+        if self.recorder is not None:
+            self.recorder.close_connection(self.recording_id, close_code)
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        if self.team_id is not None:
+            await self.channel_layer.group_discard(team_group_name(self.quiz_id, self.team_id), self.channel_name)
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        msg_type = text_data_json.get('type')
-        data = text_data_json.get('data', {})
+    @profiled('receive')
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.recorder is not None:
+            self.recorder.received(self.recording_id, text_data, bytes_data)
+        # Text frames are always JSON, even on a MessagePack connection
+        codec = self.codec if bytes_data is not None else wire.JSON
+        try:
+            msg_type, data = codec.decode(bytes_data if bytes_data is not None else text_data)
+        except wire.DecodeError:
+            return
 
         # Handle specific message types
         if msg_type == 'SUBMIT_ANSWER':
-            # team_id = data.get('team_id')
-            # answer = data.get('answer')
-            # We should validate and save to DB here.
-            # For now, we will just echo a "masked" confirmation to everyone
-            # and the full answer to the Admin (frontend handles identifying admin vs team).
-            # Actually, to secure it, we should NOT broadcast the answer to the group.
-            
+            if not isinstance(data, dict) or not self.actor.accepts(data.get('question_id')):
+                await self.send_message('REJECTED', {'request': msg_type, 'reason': 'Answers are closed'})
+                return
+            # Answers count for the team this socket proved it plays for, never a team_id it names
+            team_id = self.team_id
+            if team_id is None:
+                team_id = await self.resolve_team(data.get('team_token'))
+                if team_id is not None and self.role == 'team':
+                    await self.join_team_group(team_id)
+            if team_id is None:
+                await self.send_message('REJECTED', {'request': msg_type, 'reason': 'Join the quiz as a team first'})
+                return
+            await self.save_submission(team_id, data, self.actor.current, self.actor.response_time())
+            data = {key: value for key, value in data.items() if key != 'team_token'}
+            data['team_id'] = team_id
+
             # Broadcast "Team X Submitted" to everyone
             await self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'quiz_message',
                     'message_type': 'ANSWER_SUBMISSION',
-                    'data': { 'team_id': data.get('team_id'), 'status': 'submitted' }
+                    'data': { 'team_id': team_id, 'status': 'submitted' }
                 }
             )
             # Send full answer ONLY to Admin listeners (implementation detail: maybe logic in frontend filter, or separate admin group)
@@ -56,17 +135,16 @@ class QuizConsumer(AsyncWebsocketConsumer):
                 }
             )
 
-        elif msg_type == 'PHASE_CHANGE':
-            # Broadcast to everyone (Projector, Teams)
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'quiz_message',
-                    'message_type': 'PHASE_CHANGE',
-                    'data': data
-                }
-            )
-        
+        elif msg_type in ('PHASE_CHANGE', 'QM_COMMAND'):
+            # Validated and broadcast by the quiz's actor
+            if not self.controls_game:
+                await self.send_message('REJECTED', {'request': msg_type, 'reason': 'Only the quiz master controls the game'})
+                return
+            try:
+                await self.actor.command(msg_type, data)
+            except CommandError as e:
+                await self.send_message('REJECTED', {'request': msg_type, 'reason': str(e)})
+
         else:
             # Generic broadcast
             await self.channel_layer.group_send(
@@ -78,8 +156,83 @@ class QuizConsumer(AsyncWebsocketConsumer):
                 }
             )
 
+    @database_async
+    def quiz_exists(self):
+        return Quiz.objects.filter(pk=self.quiz_id).exists()
+
+    @database_async
+    def user_controls_quiz(self):
+        """Staff, or the user who created the quiz, may run its game"""
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return False
+        return user.is_staff or Quiz.objects.filter(pk=self.quiz_id, created_by=user).exists()
+
+    @database_async
+    def resolve_team(self, token):
+        """The team a device plays for: its logged-in team user, or the team its join token names"""
+        user = self.scope.get('user')
+        teams = Team.objects.filter(quiz_id=self.quiz_id)
+        if user is not None and user.is_authenticated:
+            team_id = teams.filter(user=user).values_list('id', flat=True).first()
+            if team_id is not None:
+                return team_id
+        team_id = team_from_token(token, self.quiz_id)
+        if team_id is not None:
+            return teams.filter(pk=team_id).values_list('id', flat=True).first()
+        return None
+
+    async def join_team_group(self, team_id):
+        """Receive messages meant for one team (e.g. its post-round summary)"""
+        if team_id is None:
+            return
+        self.team_id = team_id
+        await self.channel_layer.group_add(team_group_name(self.quiz_id, team_id), self.channel_name)
+
+    @database_async
+    def save_submission(self, team_id, data, current, millis):
+        """Record the team's response time for the question on screen, and persist the
+        answer for grading against the question it names (default: the one on screen)"""
+        try:
+            question_id = int(data.get('question_id') or 0)
+        except (TypeError, ValueError):
+            return
+        if not question_id and current is not None:
+            question_id = current.id
+        if current is not None and millis is not None:
+            kind = timing.BUZZ if str(data.get('answer', '')).strip().upper() == 'BUZZ' else timing.ANSWER
+            timing.record(current.round_id, team_id, current.id, millis, kind)
+        if not question_id:
+            return
+        question = rounds.question(question_id)
+        if question is None or question.quiz_id != int(self.quiz_id):
+            return
+        # First answer wins; resubmissions hit the unique constraint and are ignored
+        Submission.objects.bulk_create([Submission(
+            round_id=question.round_id, question_id=question_id, team_id=team_id,
+            answer=str(data.get('answer', '')),
+        )], ignore_conflicts=True)
+
+    @profiled('quiz_message')
     async def quiz_message(self, event):
-        await self.send(text_data=json.dumps({
-            'type': event['message_type'],
-            'data': event['data']
-        }))
+        await self.coalescer.push(event['message_type'], event['data'])
+
+    async def send_message(self, msg_type, data):
+        await self.outbox.put(msg_type, data)
+
+    async def write_frame(self, msg_type, data):
+        frame = self.codec.encode(msg_type, data)
+        if self.recorder is not None:
+            self.recorder.sent(self.recording_id, frame, self.codec.binary)
+        if self.codec.binary:
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+
+    async def close_slow_consumer(self):
+        # 4008 (policy violation range): the client fell too far behind
+        await self.close(code=4008)
+
+    async def close_broken_connection(self):
+        # 1011: a frame could not be sent, so the client would miss updates silently
+        await self.close(code=1011)
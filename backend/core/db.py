@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+
+from .profiling import attached
+
+_executor = None
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created handler: tune every new SQLite connection.
+
+    WAL lets readers run alongside the writer, and busy_timeout makes writers
+    wait for the lock instead of failing with "database is locked".
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'QZMAN_SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def db_executor():
+    """Bounded thread pool reserved for consumer database work"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.QZMAN_DB_WORKERS,
+            thread_name_prefix='qzman-db',
+        )
+    return _executor
+
+
+class ExecutorDatabaseSyncToAsync(DatabaseSyncToAsync):
+    """database_sync_to_async that runs on the dedicated DB executor.
+
+    The pool's threads keep their connections open (CONN_MAX_AGE), so
+    consumer queries reuse a few tuned connections instead of opening one
+    per call, and a burst of socket traffic can only occupy QZMAN_DB_WORKERS
+    threads.
+    """
+
+    def __init__(self, func):
+        # attached() runs in the caller's copied context, so the executor
+        # thread is sampled for the profiled call waiting on it, if any
+        super().__init__(attached()(func), thread_sensitive=False, executor=db_executor())
+
+
+def database_async(func):
+    """Decorator: run a synchronous ORM function on the DB executor"""
+    return ExecutorDatabaseSyncToAsync(func)
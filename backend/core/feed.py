@@ -0,0 +1,170 @@
+import asyncio
+import json
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .broadcast import group_name
+from .coalesce import Coalescer
+from .game import get_actor
+
+
+class FeedEvent:
+    """One quiz event, encoded once: `text` for long-poll bodies, `sse` as an event-stream frame"""
+    __slots__ = ('id', 'text', 'sse')
+
+    def __init__(self, event_id, msg_type, data):
+        self.id = event_id
+        self.text = json.dumps({'id': event_id, 'type': msg_type, 'data': data})
+        self.sse = f'id: {event_id}\ndata: {self.text}\n\n'.encode()
+
+
+class QuizFeed:
+    """The projector's view of a quiz for clients without a WebSocket (SSE and long-poll).
+
+    A tap joins the quiz's channel group like a projector socket, runs the
+    same coalescing, and appends each event to a bounded buffer shared by
+    every subscriber, so an event is encoded once however many clients read
+    it. Waiting clients are parked on an asyncio.Event, not a thread. Event
+    ids continue from the time the feed started, so a client's Last-Event-ID
+    from before a restart is recognised as too old rather than reused.
+    The tap stops `idle_seconds` after the last subscriber leaves, or after
+    it starts if no client ever subscribes (one that disconnected before
+    reading, say).
+    """
+
+    def __init__(self, quiz_id, size, idle_seconds):
+        self.quiz_id = quiz_id
+        self.loop = asyncio.get_running_loop()
+        self.events = []
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.last_id = time.time_ns() // 1000
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._task = asyncio.ensure_future(self._tap())
+        self._idle = self.loop.call_later(idle_seconds, self.stop)
+
+    async def _tap(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel('feed.')
+        group = group_name(self.quiz_id)
+        await layer.group_add(group, channel)
+        coalescer = Coalescer(
+            self.append, settings.QZMAN_COALESCE_WINDOWS.get('projector', 0), settings.QZMAN_COALESCE_TYPES,
+        )
+        try:
+            while True:
+                message = await layer.receive(channel)
+                if message.get('type') == 'quiz_message':
+                    await coalescer.push(message['message_type'], message['data'])
+        finally:
+            coalescer.close()
+            await layer.group_discard(group, channel)
+
+    async def append(self, msg_type, data):
+        self.last_id += 1
+        self.events.append(FeedEvent(self.last_id, msg_type, data))
+        if len(self.events) > self.size * 2:
+            # Trim in steps rather than per event; since() indexes the list directly
+            del self.events[:-self.size]
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def since(self, last_id):
+        """Events after last_id; None when some of them have already left the buffer"""
+        if last_id >= self.last_id:
+            return [] if last_id == self.last_id else None
+        if not self.events or last_id < self.events[0].id - 1:
+            return None
+        return self.events[last_id - self.events[0].id + 1:]
+
+    async def wait(self, last_id, timeout):
+        """Wait up to `timeout` seconds for an event after last_id; False if none came"""
+        if self.last_id > last_id:
+            return True
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def snapshot(self):
+        """A STATE_SNAPSHOT event for a client starting (or restarting) at the current position"""
+        actor = await get_actor(self.quiz_id)
+        return FeedEvent(self.last_id, 'STATE_SNAPSHOT', actor.snapshot())
+
+    def subscribe(self):
+        self.subscribers += 1
+        if self._idle is not None:
+            self._idle.cancel()
+            self._idle = None
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._tap())
+            _feeds.setdefault(self.quiz_id, self)
+
+    def unsubscribe(self):
+        self.subscribers -= 1
+        if not self.subscribers and self._task is not None:
+            self._idle = self.loop.call_later(self.idle_seconds, self.stop)
+
+    def stop(self):
+        self._idle = None
+        if self.subscribers or self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        if _feeds.get(self.quiz_id) is self:
+            del _feeds[self.quiz_id]
+
+    async def stream(self, last_id=None, keepalive=15.0):
+        """Event-stream bytes for one SSE client, resuming after last_id when still buffered"""
+        self.subscribe()
+        try:
+            yield b'retry: 2000\n\n'
+            if last_id is None or self.since(last_id) is None:
+                event = await self.snapshot()
+                last_id = event.id
+                yield event.sse
+            while True:
+                events = self.since(last_id)
+                if events is None:
+                    # Fell further behind than the buffer holds: start over from the current state
+                    event = await self.snapshot()
+                    last_id = event.id
+                    yield event.sse
+                elif events:
+                    last_id = events[-1].id
+                    yield b''.join(event.sse for event in events)
+                elif not await self.wait(last_id, keepalive):
+                    yield b': keepalive\n\n'
+        finally:
+            self.unsubscribe()
+
+    async def poll(self, last_id=None, timeout=25.0):
+        """(last_id, events) for a long-poll request: waits up to `timeout` when there is nothing new"""
+        self.subscribe()
+        try:
+            events = self.since(last_id) if last_id is not None else None
+            if events == [] and await self.wait(last_id, timeout):
+                events = self.since(last_id)
+            if events is None:
+                event = await self.snapshot()
+                return event.id, [event]
+            return (events[-1].id if events else last_id), events
+        finally:
+            self.unsubscribe()
+
+
+_feeds = {}
+
+
+def get_feed(quiz_id):
+    """The quiz's feed on this event loop, started on first use"""
+    quiz_id = int(quiz_id)
+    feed = _feeds.get(quiz_id)
+    if feed is None or feed.loop is not asyncio.get_running_loop():
+        config = settings.QZMAN_FEED
+        feed = _feeds[quiz_id] = QuizFeed(quiz_id, config['BUFFER'], config['IDLE_SECONDS'])
+    return feed
@@ -0,0 +1,364 @@
+import asyncio
+import logging
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import timing
+from .broadcast import group_name
+from .db import database_async
+from .models import Round
+from .roundcache import rounds
+
+logger = logging.getLogger(__name__)
+
+IDLE = 'IDLE'
+QUESTION = 'QUESTION'  # Question text (or media) on screen
+OPTIONS = 'OPTIONS'    # MCQ options revealed
+OPEN = 'OPEN'          # Buzzer / answer input open
+CLOSED = 'CLOSED'      # Input closed, answer not yet shown
+ANSWER = 'ANSWER'
+LEADERBOARD = 'LEADERBOARD'
+ENDED = 'ENDED'
+PHASES = (IDLE, QUESTION, OPTIONS, OPEN, CLOSED, ANSWER, LEADERBOARD, ENDED)
+QUESTION_PHASES = (QUESTION, OPTIONS, OPEN, CLOSED, ANSWER)
+# Where a question may be started from
+BETWEEN_QUESTIONS = (IDLE, ANSWER, LEADERBOARD)
+
+
+class CommandError(ValueError):
+    pass
+
+
+class GameState:
+    """What is on screen: phase, current question and whether input is open"""
+    __slots__ = ('phase', 'round_id', 'index', 'input_open', 'options_shown', 'revision', 'opened_at')
+
+    def __init__(self, round_id=None):
+        self.phase = IDLE
+        self.round_id = round_id
+        self.index = None
+        self.input_open = False
+        self.options_shown = False
+        self.revision = 0
+        # Loop time at which answers first opened for the current question
+        self.opened_at = None
+
+
+def load_questions(quiz_id):
+    """The quiz's questions in play order (round order, then question order), and its active round"""
+    round_rows = list(
+        Round.objects.filter(quiz_id=quiz_id).order_by('order', 'id').values_list('id', 'is_active')
+    )
+    questions = []
+    for round_id, _ in round_rows:
+        data = rounds.get(round_id)
+        if data is not None:
+            questions.extend(data.questions)
+    active = next((round_id for round_id, is_active in round_rows if is_active), None)
+    return questions, active
+
+
+class QuizActor:
+    """Single owner of a quiz's live game state.
+
+    Commands are queued and applied one at a time by the actor's own task,
+    so transitions are validated against the state they actually apply to.
+    Questions come from the worker's round cache, read once (and again
+    after an edit marks the actor stale); snapshots are rebuilt on each transition, so serving one to a
+    late joiner never touches the database. Sockets attach while they use the
+    actor; `idle_seconds` after the last one leaves it is dropped, and the
+    next connection starts the quiz afresh from IDLE.
+    """
+
+    def __init__(self, quiz_id, idle_seconds=None):
+        self.quiz_id = quiz_id
+        self.idle_seconds = idle_seconds
+        self.connections = 0
+        self._idle = None
+        self.loop = asyncio.get_running_loop()
+        # The start() task, shared by everyone waiting for this actor (see get_actor)
+        self.started = None
+        self.stale = False
+        self.questions = []
+        self.positions = {}
+        self.state = GameState()
+        self._snapshot = None
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    async def start(self):
+        await self._load()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _load(self):
+        self.stale = False
+        current = self.current
+        self.questions, active = await database_async(load_questions)(self.quiz_id)
+        self.positions = {question.id: index for index, question in enumerate(self.questions)}
+        state = self.state
+        if current is not None and current.id in self.positions:
+            state.index = self.positions[current.id]
+        elif state.phase in QUESTION_PHASES:
+            # The question on screen was removed from the quiz
+            state.phase, state.index, state.input_open, state.options_shown = IDLE, None, False, False
+        if state.index is None:
+            state.round_id = active
+        self._snapshot = None
+
+    def attach(self):
+        """A connection uses the actor; it stays loaded while any is attached"""
+        self.connections += 1
+        if self._idle is not None:
+            self._idle.cancel()
+            self._idle = None
+
+    def detach(self):
+        self.connections -= 1
+        if not self.connections:
+            self.stop_when_idle()
+
+    def stop_when_idle(self):
+        if self.idle_seconds is not None and self._idle is None:
+            self._idle = self.loop.call_later(self.idle_seconds, self.stop)
+
+    def stop(self):
+        self._idle = None
+        if self.connections:
+            return
+        if self._task is not None:
+            self._task.cancel()
+        if _actors.get(self.quiz_id) is self:
+            del _actors[self.quiz_id]
+
+    @property
+    def current(self):
+        if self.state.index is None or self.state.index >= len(self.questions):
+            return None
+        return self.questions[self.state.index]
+
+    def accepts(self, question_id):
+        """Whether a team answer for question_id is allowed right now"""
+        current = self.current
+        if not self.state.input_open or current is None:
+            return False
+        return question_id in (None, '') or str(question_id) == str(current.id)
+
+    def response_time(self):
+        """Milliseconds since answers opened for the current question, None while closed"""
+        if not self.state.input_open or self.state.opened_at is None:
+            return None
+        return int((self.loop.time() - self.state.opened_at) * 1000)
+
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = self._build_snapshot()
+        return self._snapshot
+
+    def _build_snapshot(self):
+        state = self.state
+        current = self.current
+        snapshot = {
+            'quiz_id': self.quiz_id,
+            'revision': state.revision,
+            'phase': state.phase,
+            'round_id': state.round_id,
+            'question_id': current.id if current else None,
+            # Position across the whole quiz, as the QM screen numbers questions
+            'questionIndex': state.index,
+            'question_count': len(self.questions),
+            'input_open': state.input_open,
+            'question': None,
+        }
+        if current is not None and state.phase in QUESTION_PHASES:
+            # Devices take the text, options and media from the round bundle
+            # they fetched ahead (core.bundles): a reveal only names the question
+            question = {'id': current.id, 'options_shown': state.options_shown}
+            if state.phase == ANSWER:
+                question['answer'] = current.answer
+            snapshot['question'] = question
+        return snapshot
+
+    async def command(self, message_type, data):
+        """Queue a QM command; returns the new snapshot or raises CommandError"""
+        future = self.loop.create_future()
+        await self._queue.put((message_type, data if isinstance(data, dict) else {}, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            message_type, data, future = await self._queue.get()
+            try:
+                await self._handle(message_type, data, future)
+            except Exception:
+                logger.exception('Quiz %s: command %s failed', self.quiz_id, message_type)
+            finally:
+                # Whatever happened, the sender must not wait forever
+                if not future.done():
+                    future.set_exception(CommandError('The command could not be applied'))
+
+    async def _handle(self, message_type, data, future):
+        previous = self.state
+        was_open = previous.input_open
+        try:
+            if self.stale:
+                await self._load()
+            if message_type == 'PHASE_CHANGE':
+                self._apply_phase(data)
+            else:
+                self._apply(str(data.get('command', '')).upper(), data)
+        except CommandError as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        state = self.state
+        if state.input_open and state.opened_at is None:
+            state.opened_at = self.loop.time()
+        state.revision += 1
+        self._snapshot = None
+        snapshot = self.snapshot()
+        try:
+            await self._broadcast(snapshot)
+        except Exception:
+            # e.g. ChannelFull: the state has changed regardless; clients catch up
+            # from the next broadcast or the snapshot they get on reconnect
+            logger.exception('Quiz %s: broadcasting the new state failed', self.quiz_id)
+        if not future.done():
+            future.set_result(snapshot)
+        if was_open and not state.input_open and previous.round_id is not None:
+            # Answers just closed: store the response times taken so far
+            try:
+                await database_async(timing.flush)(previous.round_id)
+            except Exception:
+                # Still held in memory; saved by the next flush
+                logger.exception('Quiz %s: saving response times failed', self.quiz_id)
+
+    async def _broadcast(self, snapshot):
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            await channel_layer.group_send(group_name(self.quiz_id), {
+                'type': 'quiz_message',
+                'message_type': 'PHASE_CHANGE',
+                'data': snapshot,
+            })
+
+    def _start_question(self, index, options_shown=False, input_open=False):
+        if index is None or not 0 <= index < len(self.questions):
+            raise CommandError('No such question')
+        state = self.state
+        state.index = index
+        state.round_id = self.questions[index].round_id
+        state.phase = QUESTION
+        state.options_shown = options_shown
+        state.input_open = input_open
+        state.opened_at = None
+
+    def _apply(self, command, data):
+        state = self.state
+        current = self.current
+        if command == 'ADVANCE':
+            # Staged reveal: text -> options (MCQ) -> input open -> closed -> answer -> next question
+            if state.phase in BETWEEN_QUESTIONS:
+                next_index = 0 if state.index is None else state.index + 1
+                if next_index >= len(self.questions):
+                    raise CommandError('No more questions')
+                self._start_question(next_index)
+            elif state.phase == QUESTION and current.type == 'MCQ' and current.options:
+                state.phase, state.options_shown = OPTIONS, True
+            elif state.phase in (QUESTION, OPTIONS):
+                state.phase, state.input_open = OPEN, True
+            elif state.phase == OPEN:
+                state.phase, state.input_open = CLOSED, False
+            elif state.phase == CLOSED:
+                state.phase = ANSWER
+            else:
+                raise CommandError(f'Cannot advance from {state.phase}')
+        elif command == 'GOTO':
+            if state.phase not in BETWEEN_QUESTIONS:
+                raise CommandError(f'Finish the current question before jumping ({state.phase})')
+            try:
+                question_id = int(data.get('question_id'))
+            except (TypeError, ValueError):
+                raise CommandError('question_id is required')
+            self._start_question(self.positions.get(question_id))
+        elif command == 'OPEN_INPUT':
+            if state.phase not in (QUESTION, OPTIONS, CLOSED):
+                raise CommandError(f'Cannot open input during {state.phase}')
+            state.phase, state.input_open = OPEN, True
+        elif command == 'CLOSE_INPUT':
+            if state.phase != OPEN:
+                raise CommandError('Input is not open')
+            state.phase, state.input_open = CLOSED, False
+        elif command == 'REVEAL':
+            if state.phase not in QUESTION_PHASES or state.phase == ANSWER:
+                raise CommandError('No question to reveal')
+            state.phase, state.input_open, state.options_shown = ANSWER, False, True
+        elif command == 'LEADERBOARD':
+            if state.phase not in BETWEEN_QUESTIONS:
+                raise CommandError(f'Finish the current question first ({state.phase})')
+            state.phase = LEADERBOARD
+        elif command == 'END':
+            state.phase, state.input_open = ENDED, False
+        elif command == 'RESET':
+            self.state = GameState(state.round_id)
+            self.state.revision = state.revision
+        else:
+            raise CommandError(f'Unknown command {command or "(none)"}')
+
+    def _apply_phase(self, data):
+        """PHASE_CHANGE as sent by the one-step QM screen: a phase name and questionIndex"""
+        phase = str(data.get('phase', '')).upper()
+        state = self.state
+        if phase not in PHASES:
+            raise CommandError(f'Unknown phase {phase or "(none)"}')
+        if phase == QUESTION:
+            try:
+                index = int(data['questionIndex']) if data.get('questionIndex') is not None else state.index
+            except (TypeError, ValueError):
+                raise CommandError('questionIndex must be a number')
+            # Without staging, the question arrives with its options and input open
+            self._start_question(index, options_shown=True, input_open=True)
+        elif phase in (OPTIONS, OPEN, CLOSED, ANSWER):
+            if self.current is None:
+                raise CommandError('No current question')
+            state.phase = phase
+            state.input_open = phase == OPEN
+            if phase != CLOSED:
+                state.options_shown = True
+        else:
+            state.phase, state.input_open = phase, False
+
+
+_actors = {}
+
+
+async def get_actor(quiz_id):
+    """The quiz's actor for this event loop, created and loaded on first use.
+
+    Concurrent callers share one start; if it fails they all get the error,
+    and the next call starts a fresh actor.
+    """
+    quiz_id = int(quiz_id)
+    actor = _actors.get(quiz_id)
+    if actor is None or actor.loop is not asyncio.get_running_loop():
+        actor = _actors[quiz_id] = QuizActor(quiz_id, settings.QZMAN_ACTOR_IDLE_SECONDS)
+        actor.started = asyncio.ensure_future(actor.start())
+        actor.started.add_done_callback(lambda task: _forget_failed(actor, task))
+        # Dropped again unless a connection attaches (e.g. a one-off feed snapshot)
+        actor.stop_when_idle()
+    # Shielded: a caller giving up must not cancel the start for the others
+    await asyncio.shield(actor.started)
+    return actor
+
+
+def _forget_failed(actor, task):
+    if (task.cancelled() or task.exception() is not None) and _actors.get(actor.quiz_id) is actor:
+        del _actors[actor.quiz_id]
+
+
+def mark_stale(quiz_id=None):
+    """Have actors reload their questions before the next command (None: every quiz)"""
+    for actor_quiz_id, actor in list(_actors.items()):
+        if quiz_id is None or actor_quiz_id == quiz_id:
+            actor.stale = True
@@ -0,0 +1,128 @@
+from array import array
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Round, Submission
+from .roundcache import rounds
+from .scoring import apply_bulk_changes
+
+# Keep id lists comfortably under SQLite's bound-parameter limit
+CHUNK_SIZE = 900
+UNMATCHED = -1
+
+
+def option_lookup(options):
+    """Map normalised option text and option letters (A, B, ...) to option indexes"""
+    lookup = {}
+    for index, option in enumerate(options or []):
+        lookup.setdefault(str(option).strip().casefold(), index)
+    for index in range(min(len(options or []), 26)):
+        lookup.setdefault(chr(ord('a') + index), index)
+    return lookup
+
+
+def answer_index(answer, lookup):
+    return lookup.get(str(answer).strip().casefold(), UNMATCHED)
+
+
+def negative_marks(round_obj):
+    """Points deducted for a wrong MCQ answer, from Round.settings['negative_marks']"""
+    try:
+        return abs(int((round_obj.settings or {}).get('negative_marks', 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _chunks(ids):
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def grade_mcq_round(round_obj, awarded_by=None):
+    """Grade every ungraded MCQ submission of a round.
+
+    Questions come from the round cache and submissions from one query,
+    and are graded in a single pass over parallel arrays of answer indexes. Correct answers earn
+    QuizQuestion.points, wrong answers lose the round's negative marks, and
+    answers that match no option score nothing. Per-question outcomes are
+    kept on Submission.is_correct; each team's net change becomes one ScoreLog
+    row and team scores move with one UPDATE (see scoring.apply_bulk_changes).
+    Submissions that are already graded are skipped, so closing a round twice
+    is harmless. Returns None if the round no longer exists.
+    """
+    with transaction.atomic():
+        # Serialise concurrent graders of the same round
+        if Round.objects.select_for_update().only('pk').filter(pk=round_obj.pk).first() is None:
+            return None
+        return _grade_mcq_round(round_obj, awarded_by)
+
+
+def _grade_mcq_round(round_obj, awarded_by):
+    position = {}
+    lookups = []
+    correct = array('h')
+    points = array('i')
+    data = rounds.get(round_obj.pk)
+    if data is None:
+        return None
+    for question in data.questions:
+        if question.type != 'MCQ':
+            continue
+        lookup = option_lookup(question.options)
+        position[question.id] = len(lookups)
+        lookups.append(lookup)
+        correct.append(answer_index(question.answer, lookup))
+        points.append(question.points)
+
+    ungraded = Submission.objects.filter(
+        round=round_obj, question_id__in=list(position), is_correct__isnull=True,
+    )
+    rows = list(ungraded.values_list('id', 'team_id', 'question_id', 'answer'))
+    summary = {'graded': len(rows), 'correct': 0, 'teams': 0, 'points': 0}
+    if not rows:
+        return summary
+
+    question_pos = array('i', (position[row[2]] for row in rows))
+    chosen = array('h', (answer_index(row[3], lookups[pos]) for row, pos in zip(rows, question_pos)))
+    hits = array('b', (
+        choice != UNMATCHED and choice == correct[pos]
+        for choice, pos in zip(chosen, question_pos)
+    ))
+    penalty = negative_marks(round_obj)
+    awarded = array('i', (
+        points[pos] if hit else (-penalty if choice != UNMATCHED else 0)
+        for hit, choice, pos in zip(hits, chosen, question_pos)
+    ))
+
+    right_ids = []
+    team_delta = defaultdict(int)
+    team_right = defaultdict(int)
+    team_wrong = defaultdict(int)
+    for row, hit, score in zip(rows, hits, awarded):
+        submission_id, team_id = row[0], row[1]
+        if hit:
+            right_ids.append(submission_id)
+            team_right[team_id] += 1
+        else:
+            team_wrong[team_id] += 1
+        team_delta[team_id] += score
+
+    for ids in _chunks(right_ids):
+        Submission.objects.filter(pk__in=ids).update(is_correct=True)
+    # Everything else read above was wrong; ids only grow, so the bound
+    # keeps submissions that arrived after the read ungraded.
+    ungraded.filter(pk__lte=max(row[0] for row in rows)).update(is_correct=False)
+    logs = apply_bulk_changes(
+        round_obj.quiz_id,
+        {
+            team_id: (delta, f'Auto-graded {round_obj.name}: {team_right[team_id]} correct, {team_wrong[team_id]} wrong')
+            for team_id, delta in team_delta.items()
+        },
+        awarded_by=awarded_by,
+        round=round_obj,
+    )
+
+    summary.update(correct=len(right_ids), teams=len(logs), points=sum(team_delta.values()))
+    return summary
+
@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+import os
+import time
+
+from django.db import DatabaseError, transaction
+
+from .media import MediaError, clean_media_url
+from .models import QuestionBank, question_fingerprint
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+TYPES = {code for code, _ in QuestionBank.QUESTION_TYPES}
+DIFFICULTIES = {code for code, _ in QuestionBank.DIFFICULTY}
+
+
+class IngestionError(ValueError):
+    pass
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """Yield (row number, dict) pairs from a CSV (with header) or JSONL text stream, one at a time"""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            yield number, row
+    elif fmt == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+    else:
+        raise IngestionError(f'Unsupported format: {fmt}')
+
+
+def _list(value, separator):
+    """JSONL gives lists; CSV cells hold a JSON array or separator-joined text"""
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    value = str(value).strip()
+    if value.startswith('['):
+        try:
+            return _list(json.loads(value), separator)
+        except ValueError:
+            pass
+    return [item.strip() for item in value.split(separator) if item.strip()]
+
+
+def build_question(row):
+    """An unsaved QuestionBank for a row, or raise IngestionError"""
+    if not isinstance(row, dict):
+        raise IngestionError('not a JSON object')
+    row = {str(key).strip().lower(): value for key, value in row.items() if key}
+    text = str(row.get('text') or '').strip()
+    answer = str(row.get('answer') or '').strip()
+    if not text:
+        raise IngestionError('text is required')
+    if not answer:
+        raise IngestionError('answer is required')
+
+    question_type = str(row.get('type') or 'TEXT').strip().upper()
+    if question_type not in TYPES:
+        raise IngestionError(f'unknown type {question_type}')
+    difficulty = str(row.get('difficulty') or 'MEDIUM').strip().upper()
+    if difficulty not in DIFFICULTIES:
+        raise IngestionError(f'unknown difficulty {difficulty}')
+    options = _list(row.get('options'), '|')
+    if question_type == 'MCQ' and len(options) < 2:
+        raise IngestionError('MCQ questions need at least two options')
+    try:
+        media_url = clean_media_url(row.get('media_url'))
+    except MediaError as e:
+        raise IngestionError(str(e))
+
+    return QuestionBank(
+        text=text,
+        answer=answer,
+        type=question_type,
+        options=options,
+        aliases=_list(row.get('aliases'), '|'),
+        tags=_list(row.get('tags'), ','),
+        category=str(row.get('category') or 'General').strip()[:100],
+        difficulty=difficulty,
+        media_url=media_url,
+        fingerprint=question_fingerprint(text),
+    )
+
+
+class IngestResult:
+    __slots__ = ('read', 'committed', 'created', 'duplicates', 'invalid', 'skipped', 'errors', 'error', 'elapsed')
+
+    def __init__(self, skipped=0):
+        self.read = 0
+        # Rows read up to the last committed batch
+        self.committed = 0
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.skipped = skipped
+        self.errors = []
+        # Why the run stopped early, if it did
+        self.error = None
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def position(self):
+        """Rows of the file that are done; resume with skip=position"""
+        return self.skipped + self.committed
+
+    def as_dict(self):
+        result = {
+            'read': self.read, 'created': self.created, 'duplicates': self.duplicates,
+            'invalid': self.invalid, 'skipped': self.skipped, 'position': self.position,
+            'errors': self.errors, 'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+        if self.error is not None:
+            result['error'] = self.error
+        return result
+
+
+def _insert(batch, result):
+    """Drop questions already in the bank or earlier in the batch, insert the rest"""
+    fresh = {}
+    for question in batch:
+        fresh.setdefault(question.fingerprint, question)
+    with transaction.atomic():
+        existing = set(
+            QuestionBank.objects.filter(fingerprint__in=list(fresh)).values_list('fingerprint', flat=True)
+        )
+        new = [question for fingerprint, question in fresh.items() if fingerprint not in existing]
+        QuestionBank.objects.bulk_create(new)
+    result.duplicates += len(batch) - len(new)
+    result.created += len(new)
+    result.committed = result.read
+
+
+def ingest(rows, skip=0, batch_size=BATCH_SIZE, on_batch=None):
+    """Insert questions from (row number, dict) pairs in chunked transactions.
+
+    The first `skip` rows are passed over, so a failed run can resume from the
+    last reported position. Invalid rows are counted and reported but do not
+    stop the run; rows whose text (ignoring case and spacing) is already in
+    the bank are skipped, which also makes re-running a file harmless.
+    `on_batch(result)` is called after every committed batch. A file that
+    cannot be read further or a failed insert stops the run with
+    `result.error` set; `result.position` is then the last committed row.
+    """
+    result = IngestResult(skipped=skip)
+    start = time.perf_counter()
+    batch = []
+    try:
+        for index, (number, row) in enumerate(rows):
+            if index < skip:
+                continue
+            result.read += 1
+            try:
+                batch.append(build_question(row))
+            except IngestionError as e:
+                result.invalid += 1
+                if len(result.errors) < MAX_REPORTED_ERRORS:
+                    result.errors.append(f'Row {number}: {e}')
+            if result.read % batch_size == 0:
+                _insert(batch, result)
+                batch = []
+                result.elapsed = time.perf_counter() - start
+                if on_batch:
+                    on_batch(result)
+        if batch:
+            _insert(batch, result)
+    except (ValueError, csv.Error, OSError, DatabaseError) as e:
+        result.error = str(e)
+    result.elapsed = time.perf_counter() - start
+    if on_batch:
+        on_batch(result)
+    return result
+
+
+def open_upload(upload):
+    """Text stream and format for an uploaded question file"""
+    return io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''), detect_format(upload.name)
+
+
+class Checkpoint:
+    """Position of the last committed batch, kept next to the source file"""
+
+    def __init__(self, path):
+        self.path = f'{path}.checkpoint'
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return int(json.load(f)['position'])
+        except (FileNotFoundError, ValueError, KeyError):
+            return 0
+
+    def save(self, result):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(result.as_dict(), f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core import assets
+
+
+class Command(BaseCommand):
+    help = 'Write precompressed .gz/.br copies of the static assets served by the ASGI app'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Directories to compress (default: QZMAN_STATIC_MOUNTS)')
+        parser.add_argument('--min-size', type=int, default=512, help='Skip files smaller than this many bytes')
+
+    def handle(self, *args, **options):
+        roots = [Path(path) for path in options['paths']] or assets.configured_roots()
+        counts = {}
+        for path in assets.iter_files(roots):
+            for encoding in assets.compress_file(path, options['min_size']):
+                counts[encoding] = counts.get(encoding, 0) + 1
+        summary = ', '.join(f'{count} {encoding}' for encoding, count in sorted(counts.items())) or 'nothing new'
+        self.stdout.write(self.style.SUCCESS(f'Compressed {summary}'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.grading import grade_mcq_round
+from core.models import Round
+
+
+class Command(BaseCommand):
+    help = 'Auto-grade the MCQ submissions of a round'
+
+    def add_arguments(self, parser):
+        parser.add_argument('round_id', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            round_obj = Round.objects.get(pk=options['round_id'])
+        except Round.DoesNotExist:
+            raise CommandError(f"Round {options['round_id']} does not exist")
+
+        summary = grade_mcq_round(round_obj)
+        if summary is None:
+            raise CommandError(f"Round {options['round_id']} does not exist")
+        self.stdout.write(self.style.SUCCESS(
+            f"Graded {summary['graded']} submissions ({summary['correct']} correct), "
+            f"{summary['points']} points across {summary['teams']} teams"
+        ))
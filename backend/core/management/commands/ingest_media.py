@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core import media
+from core.models import QuestionBank
+
+
+class Command(BaseCommand):
+    help = 'Copy question media into the local content-addressed store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--round', type=int, help='Only media used by this round')
+
+    def handle(self, *args, **options):
+        questions = QuestionBank.objects.all()
+        if options['round']:
+            questions = questions.filter(quizquestion__round_id=options['round'])
+
+        ingested, failures = media.ingest_pending(questions)
+        for url, error in failures.items():
+            self.stderr.write(self.style.WARNING(f'{url}: {error}'))
+        self.stdout.write(self.style.SUCCESS(f'Ingested {ingested} media files, {len(failures)} failed'))
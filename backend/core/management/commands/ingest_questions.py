@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ingestion
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load the question bank from a CSV or JSONL file, skipping questions already present'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row, or JSONL (.jsonl/.ndjson)')
+        parser.add_argument('--batch-size', type=int, default=ingestion.BATCH_SIZE)
+        parser.add_argument('--skip', type=int, help='Start after this many rows (default: resume from the checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Ignore any checkpoint and start from the top')
+
+    def handle(self, *args, **options):
+        checkpoint = ingestion.Checkpoint(options['path'])
+        if options['skip'] is not None:
+            skip = options['skip']
+        else:
+            skip = 0 if options['restart'] else checkpoint.load()
+        if skip:
+            self.stderr.write(f'Resuming after row {skip}')
+
+        def progress(result):
+            checkpoint.save(result)
+            self.stderr.write(
+                f'{result.position} rows: {result.created} created, {result.duplicates} duplicates, '
+                f'{result.invalid} invalid ({result.rows_per_second:.0f} rows/s)'
+            )
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                rows = ingestion.read_rows(stream, ingestion.detect_format(options['path']))
+                result = ingestion.ingest(rows, skip=skip, batch_size=options['batch_size'], on_batch=progress)
+        except OSError as e:
+            raise CommandError(str(e))
+        if result.error is not None:
+            raise CommandError(f'{result.error} (stopped after row {result.position}; run again to resume)')
+
+        checkpoint.clear()
+        for error in result.errors:
+            self.stderr.write(self.style.WARNING(error))
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {result.read} rows in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s): '
+            f'{result.created} created, {result.duplicates} duplicates, {result.invalid} invalid'
+        ))
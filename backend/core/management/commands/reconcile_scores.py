@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.scoring import reconcile_scores
+
+
+class Command(BaseCommand):
+    help = 'Check Team.score against the sum of its ScoreLog entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only check teams of this quiz')
+        parser.add_argument('--fix', action='store_true', help='Reset mismatched scores to the ledger total')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every N seconds (for running alongside a live event)')
+
+    def handle(self, *args, **options):
+        while True:
+            self.check_once(options['quiz'], options['fix'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def check_once(self, quiz_id, fix):
+        mismatches = reconcile_scores(quiz_id=quiz_id, fix=fix)
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All team scores match the ledger'))
+            return
+        for team_id, name, score, ledger_total in mismatches:
+            self.stdout.write(self.style.WARNING(
+                f'Team {team_id} ({name}): score {score}, ledger {ledger_total}'
+                + (' -> fixed' if fix else '')
+            ))
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.recording import RecordingError
+from core.replay import Replay, load_scripts
+
+
+def parse_speed(value):
+    if value == 'max':
+        return None
+    try:
+        speed = float(value.rstrip('x'))
+    except ValueError:
+        speed = 0
+    if speed <= 0:
+        raise ValueError(value)
+    return speed
+
+
+class Command(BaseCommand):
+    help = ('Replay recorded WebSocket traffic (QZMAN_RECORD_DIR) against a server and report latency '
+            'and throughput. Start the target from a copy of the recorded database so ids match, and run '
+            'this with its SECRET_KEY: team tokens are signed afresh for it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('recording', help='A .qzrec file written by the recorder')
+        parser.add_argument('--url', default='ws://127.0.0.1:8000', help='Server to drive')
+        parser.add_argument('--speed', default='1', help='1, 10 (times real time) or max')
+        parser.add_argument('--quiz', action='append', default=[], metavar='RECORDED=TARGET',
+                            help='Connect to quiz TARGET where the recording used RECORDED (repeatable)')
+        parser.add_argument('--team', action='append', default=[], metavar='RECORDED=TARGET',
+                            help='Play as team TARGET where the recording used RECORDED (repeatable)')
+        parser.add_argument('--window', type=float, default=1.0,
+                            help='Seconds within which a recorded server frame counts as the reply to a send')
+        parser.add_argument('--drain', type=float, default=1.0,
+                            help='Seconds to keep connections open after their last send at max speed')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            speed = parse_speed(options['speed'])
+        except ValueError:
+            raise CommandError('--speed must be a positive number or "max"')
+        try:
+            quiz_map = dict(pair.split('=', 1) for pair in options['quiz'])
+            team_map = dict(pair.split('=', 1) for pair in options['team'])
+        except ValueError:
+            raise CommandError('--quiz and --team take RECORDED=TARGET')
+        try:
+            scripts = load_scripts(options['recording'], quiz_map, options['window'], team_map)
+        except (OSError, RecordingError) as e:
+            raise CommandError(str(e))
+        if not scripts:
+            raise CommandError('The recording has no connections')
+
+        replay = Replay(scripts, options['url'], speed=speed, drain=options['drain'])
+        report = asyncio.run(replay.run()).as_dict()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        latency = report['latency_ms']
+        self.stdout.write(
+            f"{report['connections']} connections ({report['failed_connections']} failed), "
+            f"{report['elapsed']}s at " + (f'{speed:g}x' if speed else 'max speed')
+        )
+        self.stdout.write(
+            f"sent {report['frames_sent']} frames ({report['sent_per_second']}/s), "
+            f"received {report['frames_received']} of {report['frames_recorded']} recorded "
+            f"({report['received_per_second']}/s)"
+        )
+        self.stdout.write(
+            f"reply latency over {latency['count']}: p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+            f"p99 {latency['p99']} ms, max {latency['max']} ms; {report['unanswered']} unanswered"
+        )
+        if speed:
+            self.stdout.write(f"schedule lag p99 {report['schedule_lag_ms']['p99']} ms")
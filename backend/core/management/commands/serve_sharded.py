@@ -0,0 +1,40 @@
+import asyncio
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.supervisor import Supervisor
+
+
+class Command(BaseCommand):
+    help = ('Serve with several daphne workers behind a proxy that keeps each quiz (its sockets and '
+            'REST calls) on one worker, restarting workers that fail health checks.')
+
+    def add_arguments(self, parser):
+        config = settings.QZMAN_SHARDING
+        parser.add_argument('--workers', type=int, default=config['WORKERS'])
+        parser.add_argument('--bind', default='127.0.0.1', help='Address the proxy listens on')
+        parser.add_argument('--port', type=int, default=8000, help='Port the proxy listens on')
+        parser.add_argument('--worker-port', type=int, default=config['WORKER_PORT'],
+                            help='Port of worker 0; worker n listens on this plus n')
+        parser.add_argument('--state', help='Directory used to tell workers about content changes '
+                                            '(default: a new temporary directory)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        config = settings.QZMAN_SHARDING
+        state = options['state'] or tempfile.mkdtemp(prefix='qzman-shard-')
+        supervisor = Supervisor(
+            options['workers'], options['worker_port'], state,
+            health_interval=config['HEALTH_INTERVAL'],
+            health_timeout=config['HEALTH_TIMEOUT'],
+            failures=config['HEALTH_FAILURES'],
+            restart_wait=config['RESTART_WAIT'],
+            log=lambda message: self.stdout.write(message),
+        )
+        try:
+            asyncio.run(supervisor.serve(options['bind'], options['port']))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
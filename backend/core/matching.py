@@ -0,0 +1,267 @@
+import re
+import unicodedata
+
+from .models import Submission
+from .roundcache import rounds
+
+MATCH = 'match'
+NEAR = 'near'
+NO_MATCH = 'no_match'
+# Question types whose answers are typed rather than picked
+TYPED_QUESTIONS = ('TEXT', 'MEDIA')
+
+ARTICLES = {'a', 'an', 'the'}
+UNITS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13,
+    'fourteen': 14, 'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19,
+}
+TENS = {
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50,
+    'sixty': 60, 'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+SCALES = {'hundred': 100, 'thousand': 1000, 'million': 10 ** 6}
+ORDINALS = {
+    'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5,
+    'sixth': 6, 'seventh': 7, 'eighth': 8, 'ninth': 9, 'tenth': 10,
+}
+# Letters NFKD does not decompose into ASCII
+TRANSLITERATE = str.maketrans({'æ': 'ae', 'ø': 'o', 'œ': 'oe', 'ł': 'l', 'đ': 'd', 'þ': 'th', 'ð': 'd'})
+ROMAN = re.compile(r'^(x{0,3})(ix|iv|v?i{0,3})$')
+ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10}
+DIGIT_ORDINAL = re.compile(r'^(\d+)(st|nd|rd|th)$')
+ALTERNATIVES = re.compile(r'\s+/\s+|;')
+
+
+def _roman(token):
+    if len(token) < 2 or not ROMAN.match(token):
+        return None
+    total = 0
+    for current, following in zip(token, token[1:] + ' '):
+        value = ROMAN_VALUES[current]
+        total += -value if ROMAN_VALUES.get(following, 0) > value else value
+    return total
+
+
+def _adds_to(current, value):
+    """Whether a number word continues `current` by addition ('forty' then 'seven')"""
+    low = current % 100
+    if value < 20:
+        return low == 0 or (value < 10 and low >= 20 and low % 10 == 0)
+    return low == 0
+
+
+def _numerals(tokens):
+    """Replace number words, ordinals and roman numerals with digits.
+
+    A teen or tens group followed by one that cannot be added to it, with no
+    scale word in the run, is read the way years are said ('nineteen forty
+    seven' is 1947); otherwise such a word starts a new number.
+    """
+    out = []
+    total = current = None
+    for token in tokens:
+        if token in UNITS or token in TENS or (token in SCALES and current is not None) or (token == 'and' and current is not None):
+            if token == 'and':
+                continue
+            if token in SCALES:
+                if token == 'hundred':
+                    current *= 100
+                else:
+                    total += current * SCALES[token]
+                    current = 0
+                continue
+            value = UNITS.get(token, TENS.get(token))
+            if total is None:
+                total, current = 0, value
+            elif _adds_to(current, value):
+                current += value
+            elif total == 0 and 10 <= current < 100:
+                current = current * 100 + value
+            else:
+                out.append(str(total + current))
+                total, current = 0, value
+            continue
+        if total is not None:
+            out.append(str(total + current))
+            total = current = None
+        ordinal = DIGIT_ORDINAL.match(token)
+        if ordinal:
+            token = ordinal.group(1)
+        elif token in ORDINALS:
+            token = str(ORDINALS[token])
+        else:
+            roman = _roman(token)
+            if roman is not None:
+                token = str(roman)
+        out.append(token)
+    if total is not None:
+        out.append(str(total + current))
+    return out
+
+
+def normalize(text):
+    """Canonical form for comparing typed answers.
+
+    Case-folds, transliterates accents, turns '&' into 'and', drops
+    punctuation and leading-style articles, and writes numbers as digits.
+    """
+    text = unicodedata.normalize('NFKD', str(text).casefold().translate(TRANSLITERATE))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = text.replace('&', ' and ')
+    # Thousands separators go before other punctuation becomes spaces
+    text = re.sub(r'(?<=\d)[,.](?=\d{3}\b)', '', text)
+    tokens = re.sub(r"[^\w\s]|_", ' ', text).split()
+    tokens = _numerals(tokens)
+    if len(tokens) > 1:
+        tokens = [token for token in tokens if token not in ARTICLES] or tokens
+    return ' '.join(tokens)
+
+
+def bounded_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def match_limit(length):
+    """Typos forgiven as a full match for an answer this long"""
+    return min(3, length // 5)
+
+
+def near_limit(length):
+    """Edits still worth flagging to the quiz master as a near match"""
+    return min(6, length // 3) if length >= 3 else 0
+
+
+class Verdict:
+    __slots__ = ('verdict', 'confidence', 'matched')
+
+    def __init__(self, verdict, confidence, matched=None):
+        self.verdict = verdict
+        self.confidence = round(confidence, 3)
+        self.matched = matched
+
+    def as_dict(self):
+        return {'verdict': self.verdict, 'confidence': self.confidence, 'matched': self.matched}
+
+
+class AnswerKey:
+    """A question's accepted answers, normalized once and reused for every submission"""
+    __slots__ = ('forms',)
+
+    def __init__(self, answer, aliases=()):
+        forms = {}
+        for accepted in [*ALTERNATIVES.split(answer or ''), *(aliases or [])]:
+            form = normalize(accepted)
+            if form:
+                forms[form] = (form, frozenset(form.split()), _digits(form))
+        self.forms = list(forms.values())
+
+    def grade(self, submitted):
+        """Verdict for an already-normalized answer"""
+        if not submitted or not self.forms:
+            return Verdict(NO_MATCH, 0.0)
+        tokens = frozenset(submitted.split())
+        digits = _digits(submitted)
+        best = Verdict(NO_MATCH, 0.0)
+        for form, form_tokens, form_digits in self.forms:
+            if submitted == form:
+                return Verdict(MATCH, 1.0, form)
+            # Numbers (years, counts) must be exact: 1947 is not a typo of 1948
+            if digits != form_digits:
+                continue
+            length = max(len(form), len(submitted))
+            distance = bounded_distance(submitted, form, near_limit(length))
+            confidence = 1 - distance / length
+            if distance <= match_limit(length):
+                verdict = Verdict(MATCH, confidence, form)
+            elif distance <= near_limit(length):
+                verdict = Verdict(NEAR, confidence, form)
+            elif _contains(tokens, form_tokens):
+                # 'gandhi' for 'mahatma gandhi', or the answer plus extra words
+                shorter, longer = sorted((len(form), len(submitted)))
+                verdict = Verdict(NEAR, shorter / longer, form)
+            else:
+                continue
+            if (verdict.verdict == MATCH, verdict.confidence) > (best.verdict == MATCH, best.confidence):
+                best = verdict
+        return best
+
+
+def _digits(form):
+    return tuple(token for token in form.split() if token.isdigit())
+
+
+def _contains(tokens, form_tokens):
+    shorter, longer = sorted((tokens, form_tokens), key=len)
+    return shorter < longer and any(len(token) > 2 for token in shorter)
+
+
+def grade_answer(answer, accepted, aliases=()):
+    return AnswerKey(accepted, aliases).grade(normalize(answer))
+
+
+_answer_keys = {}
+
+
+def answer_keys(data):
+    """AnswerKeys of a cached round's typed-answer questions, compiled once per cache entry"""
+    cached = _answer_keys.get(data.id)
+    if cached is None or cached[0] is not data:
+        keys = {
+            question.id: AnswerKey(question.answer, question.aliases)
+            for question in data.questions
+            if question.type in TYPED_QUESTIONS
+        }
+        cached = _answer_keys[data.id] = (data, keys)
+    return cached[1]
+
+
+def suggest_round(round_obj, include_graded=False):
+    """Match/near/no-match suggestions for a round's typed-answer submissions.
+
+    Answer keys come from the round cache and submissions from one query; identical answers
+    to the same question (common across teams) are graded once. None if the round no longer exists.
+    """
+    data = rounds.get(round_obj.pk)
+    if data is None:
+        return None
+    keys = answer_keys(data)
+
+    submissions = Submission.objects.filter(round=round_obj, question_id__in=list(keys))
+    if not include_graded:
+        submissions = submissions.filter(is_correct__isnull=True)
+
+    graded = {}
+    suggestions = []
+    rows = submissions.order_by('question_id', 'id').values_list('id', 'team_id', 'question_id', 'answer', 'is_correct')
+    for submission_id, team_id, question_id, answer, is_correct in rows:
+        normalized = normalize(answer)
+        verdict = graded.get((question_id, normalized))
+        if verdict is None:
+            verdict = graded[question_id, normalized] = keys[question_id].grade(normalized)
+        suggestions.append({
+            'submission_id': submission_id,
+            'team_id': team_id,
+            'question_id': question_id,
+            'answer': answer,
+            'is_correct': is_correct,
+            **verdict.as_dict(),
+        })
+    return suggestions
@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.urls import reverse
+
+from .models import MediaAsset, QuestionBank
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+validate_url = URLValidator(schemes=['http', 'https'])
+
+
+class MediaError(Exception):
+    pass
+
+
+def store_root():
+    return Path(settings.QZMAN_MEDIA_STORE)
+
+
+def asset_path(digest, ext):
+    """Location of a blob in the store: <root>/ab/abcdef...<ext>"""
+    return store_root() / digest[:2] / f'{digest}.{ext}'
+
+
+def asset_url(digest, ext):
+    return reverse('media-file', kwargs={'digest': digest, 'ext': ext})
+
+
+def clean_media_url(value):
+    """A question's media_url as stored: an http(s) URL or None; raises MediaError otherwise"""
+    value = str(value or '').strip()
+    if not value:
+        return None
+    try:
+        validate_url(value)
+    except ValidationError:
+        raise MediaError(f'Invalid media URL: {value}')
+    return value
+
+
+def _local_path(url):
+    """The file a file:// URL or bare path names, if it is inside QZMAN_MEDIA_IMPORT_ROOT"""
+    root = settings.QZMAN_MEDIA_IMPORT_ROOT
+    if root is None:
+        return None
+    parsed = urlparse(url)
+    path = Path(parsed.path if parsed.scheme == 'file' else url).resolve()
+    return path if path.is_relative_to(Path(root).resolve()) and path.is_file() else None
+
+
+def _open_source(url):
+    parsed = urlparse(url)
+    if parsed.scheme in ('http', 'https'):
+        return urllib.request.urlopen(url, timeout=settings.QZMAN_MEDIA_FETCH_TIMEOUT)
+    if parsed.scheme in ('', 'file'):
+        path = _local_path(url)
+        if path is not None:
+            return open(path, 'rb')
+    raise MediaError(f'Cannot fetch {url}')
+
+
+def _extension(url, content_type):
+    ext = Path(urlparse(url).path).suffix.lstrip('.').lower()
+    if not ext and content_type:
+        ext = (mimetypes.guess_extension(content_type) or '').lstrip('.')
+    return re.sub(r'[^a-z0-9]', '', ext)[:10] or 'bin'
+
+
+def _store_stream(stream, ext):
+    """Copy a stream into the store, hashing as it goes; returns (digest, size)"""
+    root = store_root()
+    root.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    limit = settings.QZMAN_MEDIA_MAX_BYTES
+    with tempfile.NamedTemporaryFile(dir=root, delete=False) as tmp:
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > limit:
+                    raise MediaError(f'Media larger than {limit} bytes')
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+    hexdigest = digest.hexdigest()
+    path = asset_path(hexdigest, ext)
+    if path.exists():
+        os.unlink(tmp.name)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp.name, path)
+    return hexdigest, size
+
+
+def _make_variants(path, content_type):
+    """Downscaled copies of an image for phones; needs Pillow (see requirements.txt)"""
+    if not content_type.startswith('image/'):
+        return {}
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning('Pillow is not installed: serving %s without phone-sized variants', path.name)
+        return {}
+
+    variants = {}
+    with Image.open(path) as image:
+        for name, width in settings.QZMAN_MEDIA_VARIANTS.items():
+            if image.width <= width:
+                continue
+            copy = image.copy()
+            copy.thumbnail((width, width * 4))
+            has_alpha = copy.mode in ('RGBA', 'LA', 'P')
+            ext, fmt = ('png', 'PNG') if has_alpha else ('jpg', 'JPEG')
+            with tempfile.SpooledTemporaryFile() as buffer:
+                if fmt == 'JPEG':
+                    copy.convert('RGB').save(buffer, fmt, quality=80, optimize=True, progressive=True)
+                else:
+                    copy.save(buffer, fmt, optimize=True)
+                buffer.seek(0)
+                digest, size = _store_stream(buffer, ext)
+            variants[name] = {'sha256': digest, 'ext': ext, 'size': size, 'width': copy.width}
+    return variants
+
+
+def ingest(url):
+    """Fetch a media URL (or a path under QZMAN_MEDIA_IMPORT_ROOT) once into the store.
+
+    Returns the MediaAsset, reusing an existing one for identical content,
+    and links every QuestionBank row that references the URL.
+    """
+    with _open_source(url) as stream:
+        headers = getattr(stream, 'headers', None)
+        content_type = headers.get('Content-Type', '') if headers is not None else ''
+        content_type = (content_type or mimetypes.guess_type(url)[0] or 'application/octet-stream').split(';')[0]
+        ext = _extension(url, content_type)
+        digest, size = _store_stream(stream, ext)
+
+    asset = MediaAsset.objects.filter(sha256=digest).first()
+    if asset is None:
+        asset = MediaAsset.objects.create(
+            sha256=digest, ext=ext, content_type=content_type, size=size, source_url=url,
+            variants=_make_variants(asset_path(digest, ext), content_type),
+        )
+    QuestionBank.objects.filter(media_url=url).update(media_asset=asset)
+    return asset
+
+
+def ingest_pending(queryset=None):
+    """Ingest every distinct media_url that has no local asset yet.
+
+    Returns (ingested, failures) where failures maps url -> error message.
+    """
+    queryset = queryset if queryset is not None else QuestionBank.objects.all()
+    urls = (
+        queryset.filter(media_asset__isnull=True)
+        .exclude(media_url__isnull=True).exclude(media_url='')
+        .values_list('media_url', flat=True).distinct()
+    )
+    ingested, failures = 0, {}
+    for url in list(urls):
+        try:
+            ingest(url)
+            ingested += 1
+        except (MediaError, OSError, ValueError) as e:
+            failures[url] = str(e)
+    return ingested, failures
+
+
+def urls(digest, ext, variants):
+    """Original and variant URLs for clients"""
+    result = {'original': asset_url(digest, ext)}
+    for name, variant in (variants or {}).items():
+        result[name] = asset_url(variant['sha256'], variant['ext'])
+    return result
+
+
+def round_media(data):
+    """Media to prefetch for a round (a roundcache.RoundData): one entry per question with media"""
+    return [{'question_id': question.id, **question.media} for question in data.questions if question.media]
+
+
+def parse_range(header, size):
+    """Parse a single 'bytes=start-end' range; returns (start, end) inclusive,
+    None when absent or unsupported, or raises ValueError if unsatisfiable."""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if start:
+            start = int(start)
+            end = int(end) if end else size - 1
+        else:
+            length = int(end)
+            start, end = max(size - length, 0), size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def aread_range(path, start, end):
+    """read_range for streaming responses: each chunk is read on a worker thread,
+    so under ASGI the body goes out chunk by chunk instead of being collected first"""
+    chunks = read_range(path, start, end)
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        chunks.close()
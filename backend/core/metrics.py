@@ -0,0 +1,60 @@
+import threading
+from collections import defaultdict
+
+
+class _Stat:
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.last = 0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0,
+            'max': self.max,
+            'last': self.last,
+        }
+
+
+class Registry:
+    """In-process counters and observed values, read back with `snapshot()`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._stats = defaultdict(_Stat)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, value):
+        with self._lock:
+            stat = self._stats[name]
+            stat.count += 1
+            stat.total += value
+            stat.last = value
+            if value > stat.max:
+                stat.max = value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'observations': {name: stat.as_dict() for name, stat in self._stats.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._stats.clear()
+
+
+registry = Registry()
+incr = registry.incr
+observe = registry.observe
+snapshot = registry.snapshot
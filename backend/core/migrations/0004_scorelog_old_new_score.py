@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_submission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scorelog',
+            name='new_score',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scorelog',
+            name='old_score',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
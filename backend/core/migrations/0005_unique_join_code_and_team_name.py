@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:54
+
+import core.models
+from django.db import migrations, models
+
+
+def deduplicate(apps, schema_editor):
+    """Give duplicate quiz codes fresh values and rename duplicate team names"""
+    Quiz = apps.get_model('core', 'Quiz')
+    Team = apps.get_model('core', 'Team')
+
+    used = set()
+    for quiz in Quiz.objects.order_by('id'):
+        if quiz.code in used:
+            code = core.models.generate_join_code()
+            while code in used or Quiz.objects.filter(code=code).exists():
+                code = core.models.generate_join_code()
+            quiz.code = code
+            quiz.save(update_fields=['code'])
+        used.add(quiz.code)
+
+    seen = set()
+    for team in Team.objects.order_by('id'):
+        key = (team.quiz_id, team.name)
+        if key in seen:
+            team.name = f'{team.name[:85]} ({team.pk})'
+            team.save(update_fields=['name'])
+        seen.add((team.quiz_id, team.name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_scorelog_old_new_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='quiz',
+            name='code',
+            field=models.CharField(default=core.models.generate_join_code, help_text='Code players use to join', max_length=10, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='team',
+            constraint=models.UniqueConstraint(fields=('quiz', 'name'), name='unique_team_name_per_quiz'),
+        ),
+    ]
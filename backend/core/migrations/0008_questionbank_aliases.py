@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_media_asset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionbank',
+            name='aliases',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_questionbank_aliases'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scorelog',
+            index=models.Index(fields=['quiz', 'timestamp'], name='scorelog_quiz_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scorelog',
+            index=models.Index(fields=['team', 'timestamp'], name='scorelog_team_time_idx'),
+        ),
+    ]
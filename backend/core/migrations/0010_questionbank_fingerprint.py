@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:07
+
+import core.models
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    QuestionBank = apps.get_model('core', 'QuestionBank')
+    batch = []
+    for question in QuestionBank.objects.only('id', 'text').iterator(chunk_size=2000):
+        question.fingerprint = core.models.question_fingerprint(question.text)
+        batch.append(question)
+        if len(batch) == 2000:
+            QuestionBank.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    QuestionBank.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_scorelog_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionbank',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=40),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
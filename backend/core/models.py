@@ -1,6 +1,31 @@
+import hashlib
+import secrets
 from django.db import models
 from django.contrib.auth.models import User
 
+# Unambiguous characters for join codes typed on phones (no 0/O, 1/I/L)
+JOIN_CODE_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+
+def generate_join_code(length=6):
+    return ''.join(secrets.choice(JOIN_CODE_ALPHABET) for _ in range(length))
+
+def question_fingerprint(text):
+    """Key for spotting the same question typed with different case or spacing"""
+    return hashlib.sha1(' '.join(str(text).casefold().split()).encode()).hexdigest()
+
+class MediaAsset(models.Model):
+    """A media file ingested into the local content-addressed store"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    ext = models.CharField(max_length=10)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    source_url = models.TextField(blank=True)
+    variants = models.JSONField(default=dict, blank=True) # name -> {sha256, ext, size, width}
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]}.{self.ext}"
+
 class QuestionBank(models.Model):
     QUESTION_TYPES = [
         ('MCQ', 'Multiple Choice'),
@@ -15,21 +40,30 @@ class QuestionBank(models.Model):
 
     text = models.TextField()
     media_url = models.URLField(blank=True, null=True)
+    media_asset = models.ForeignKey(MediaAsset, on_delete=models.SET_NULL, null=True, blank=True, related_name='questions')
     type = models.CharField(max_length=10, choices=QUESTION_TYPES, default='TEXT')
     options = models.JSONField(default=list, blank=True)  # List of strings for MCQs
     answer = models.TextField()  # Correct Answer
+    aliases = models.JSONField(default=list, blank=True)  # Other accepted spellings for TEXT answers
     category = models.CharField(max_length=100, db_index=True)
     tags = models.JSONField(default=list, blank=True)
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY, default='MEDIUM')
+    fingerprint = models.CharField(max_length=40, db_index=True, blank=True, editable=False)  # See question_fingerprint
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        self.fingerprint = question_fingerprint(self.text)
+        if kwargs.get('update_fields') is not None and 'text' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'fingerprint'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.category}: {self.text[:50]}..."
 
 class Quiz(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    code = models.CharField(max_length=10, default='ABCD', help_text="Code players use to join")
+    code = models.CharField(max_length=10, unique=True, default=generate_join_code, help_text="Code players use to join")
     scheduled_at = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=False)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -43,6 +77,12 @@ class Team(models.Model):
     members = models.TextField(blank=True)  # Comma separated names
     score = models.IntegerField(default=0)
     is_approved = models.BooleanField(default=False)
+    user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='team') # Team login
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'name'], name='unique_team_name_per_quiz'),
+        ]
 
     def __str__(self):
         return self.name
@@ -79,12 +119,40 @@ class QuizQuestion(models.Model):
     class Meta:
         ordering = ['order']
 
+class Submission(models.Model):
+    """A team's answer to a question in a live round"""
+    round = models.ForeignKey(Round, on_delete=models.CASCADE, related_name='submissions')
+    question = models.ForeignKey(QuizQuestion, on_delete=models.CASCADE, related_name='submissions')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='submissions')
+    answer = models.TextField(blank=True)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    is_correct = models.BooleanField(null=True) # Null until graded
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['team', 'question'], name='unique_team_submission'),
+        ]
+
 class ScoreLog(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='score_logs')
     round = models.ForeignKey(Round, on_delete=models.SET_NULL, null=True)
     question = models.ForeignKey(QuizQuestion, on_delete=models.SET_NULL, null=True)
     points = models.IntegerField()
+    old_score = models.IntegerField(null=True, blank=True)
+    new_score = models.IntegerField(null=True, blank=True)
     reason = models.CharField(max_length=255) # Mandatory reason for manual changes
     timestamp = models.DateTimeField(auto_now_add=True)
     awarded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['quiz', 'timestamp'], name='scorelog_quiz_time_idx'),
+            models.Index(fields=['team', 'timestamp'], name='scorelog_team_time_idx'),
+        ]
+
+class RoundTimings(models.Model):
+    """Response times of a round, packed as arrays (see core.timing.ResponseTimes)"""
+    round = models.OneToOneField(Round, on_delete=models.CASCADE, related_name='timings')
+    data = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
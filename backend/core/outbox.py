@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from . import metrics
+
+DROP_OLDEST = 'drop_oldest'
+LATEST = 'latest'
+RELIABLE = 'reliable'
+
+logger = logging.getLogger(__name__)
+
+
+def kind_of(msg_type, data):
+    """The message type a frame stands for: a BATCH (core.coalesce) counts as the kind it carries"""
+    if msg_type == 'BATCH' and isinstance(data, dict):
+        return data.get('kind', msg_type)
+    return msg_type
+
+
+class Outbox:
+    """Bounded outbound queue for one WebSocket connection.
+
+    Channel-layer handlers only enqueue, and a writer task drains the queue to
+    the socket, so a client that stops reading never holds up the others.
+    Each message type has a policy:
+
+    * ``drop_oldest``: tick and status events; when full, the oldest such
+      entry is discarded to make room.
+    * ``latest``: state snapshots; a queued entry of the same type is replaced
+      in place, so only the newest state is delivered.
+    * ``reliable`` (default): never dropped. When the queue is full of these
+      it may grow past `maxsize`, up to twice that.
+
+    A BATCH frame gets the policy of the kind it carries, which all of its
+    items share: a batch of droppable ticks may be dropped like one tick, a
+    batch of reliable events never is, and a ``latest`` batch replaces
+    the queued state of its kind.
+
+    A connection that stays over capacity for `overflow_seconds`, or reaches
+    the hard limit, is handed to `on_overflow` to be disconnected; one whose
+    `write` fails is closed and handed to `on_failure`.
+    """
+
+    def __init__(self, write, on_overflow, on_failure, maxsize, overflow_seconds, policies, label='ws'):
+        self._write = write
+        self._on_overflow = on_overflow
+        self._on_failure = on_failure
+        self.maxsize = maxsize
+        self.overflow_seconds = overflow_seconds
+        self.policies = policies
+        self.label = label
+        self._queue = deque()
+        self._ready = asyncio.Event()
+        self._overflow_since = None
+        self._closed = False
+        self._task = asyncio.ensure_future(self._drain())
+
+    def __len__(self):
+        return len(self._queue)
+
+    async def put(self, msg_type, data):
+        if self._closed:
+            return
+        kind = kind_of(msg_type, data)
+        policy = self.policies.get(kind, RELIABLE)
+        if policy == LATEST:
+            for entry in self._queue:
+                if kind_of(*entry) == kind:
+                    entry[0], entry[1] = msg_type, data
+                    metrics.incr(f'{self.label}.send_queue.coalesced')
+                    return
+
+        if len(self._queue) >= self.maxsize:
+            self._mark_overflow()
+            if self._closed:
+                return
+            if not self._drop_oldest():
+                if policy == DROP_OLDEST:
+                    metrics.incr(f'{self.label}.send_queue.dropped')
+                    return
+                if len(self._queue) >= self.maxsize * 2:
+                    self._overflow()
+                    return
+
+        self._queue.append([msg_type, data])
+        metrics.observe(f'{self.label}.send_queue.depth', len(self._queue))
+        self._ready.set()
+
+    def _drop_oldest(self):
+        for index, entry in enumerate(self._queue):
+            if self.policies.get(kind_of(*entry), RELIABLE) == DROP_OLDEST:
+                del self._queue[index]
+                metrics.incr(f'{self.label}.send_queue.dropped')
+                return True
+        return False
+
+    def _mark_overflow(self):
+        now = time.monotonic()
+        if self._overflow_since is None:
+            self._overflow_since = now
+        elif now - self._overflow_since >= self.overflow_seconds:
+            self._overflow()
+
+    def _overflow(self):
+        if self._closed:
+            return
+        metrics.incr(f'{self.label}.slow_consumer_disconnects')
+        self.close()
+        asyncio.ensure_future(self._on_overflow())
+
+    async def _drain(self):
+        while True:
+            await self._ready.wait()
+            while self._queue:
+                msg_type, data = self._queue.popleft()
+                try:
+                    await self._write(msg_type, data)
+                except Exception:
+                    # Without the writer nothing would leave the queue again
+                    logger.exception('%s: writing %s failed, closing the connection', self.label, msg_type)
+                    metrics.incr(f'{self.label}.send_queue.write_failures')
+                    asyncio.ensure_future(self._on_failure())
+                    self.close()
+                    return
+                if self._overflow_since is not None and len(self._queue) < self.maxsize // 2:
+                    self._overflow_since = None
+            self._ready.clear()
+
+    def close(self):
+        self._closed = True
+        self._queue.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
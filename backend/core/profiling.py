@@ -0,0 +1,285 @@
+import functools
+import heapq
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+MAX_DEPTH = 128
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+# The session of the call being profiled; sync_to_async copies it into worker threads
+_current = ContextVar('qzman_profile_session', default=None)
+
+
+class Session:
+    """One profiled call: stack samples of the thread it runs on and of the
+    worker threads doing its work meanwhile (see attached)"""
+    __slots__ = ('label', 'threads', 'started', 'wall', 'stacks', 'token')
+
+    def __init__(self, label, thread_id):
+        self.label = label
+        self.threads = {thread_id}
+        self.started = time.perf_counter()
+        self.wall = datetime.now()
+        self.stacks = Counter()
+        self.token = None
+
+
+@contextmanager
+def attached():
+    """Sample the current thread for the profiled call that handed it work, if any.
+
+    Used around database_async calls (core.db), whose executor threads would
+    otherwise never be seen by a session started on the event loop.
+    """
+    session = _current.get()
+    ident = threading.get_ident()
+    if session is None or ident in session.threads:
+        yield
+        return
+    session.threads.add(ident)
+    try:
+        yield
+    finally:
+        session.threads.discard(ident)
+
+
+class Profiler:
+    """Sampling profiler that is switched on for a time window or per call.
+
+    While any session is open a daemon thread wakes every `interval` seconds
+    and records the current stack of each session's thread; with nothing to
+    profile it blocks, so the only cost of leaving it deployed is the
+    `wanted()` check at each entry point.
+
+    Finished sessions are saved by that thread too, never by the caller (an
+    event loop must not wait on file writes): appended as collapsed stacks ("a;b;c count", the
+    input format of flamegraph.pl and speedscope) to <directory>/<label>.collapsed,
+    and the slowest `top_n` calls per label are kept in <directory>/slow.txt.
+    Sessions sharing a thread (async handlers on the event loop) each see the
+    whole thread's samples while they overlap.
+    """
+
+    def __init__(self, directory, interval, top_n, token):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.top_n = top_n
+        self.token = token
+        self.enabled_until = 0.0
+        self._lock = threading.Lock()
+        self._sessions = set()
+        self._wake = threading.Event()
+        self._thread = None
+        self._slow = {}
+        self._names = {}
+        self._finished = deque()
+        self._save_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return time.monotonic() < self.enabled_until
+
+    def enable(self, seconds):
+        self.enabled_until = time.monotonic() + seconds
+
+    def disable(self):
+        self.enabled_until = 0.0
+        self._flush()
+        self.write_report()
+
+    def authorized(self, token):
+        return bool(token and self.token and secrets.compare_digest(token, self.token))
+
+    def wanted(self, token=None):
+        """Whether a call should be profiled: inside the window, or carrying the configured token"""
+        return self.enabled or self.authorized(token)
+
+    def start(self, label):
+        session = Session(label, threading.get_ident())
+        session.token = _current.set(session)
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name='qzman-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return session
+
+    def stop(self, session, label=None):
+        elapsed = time.perf_counter() - session.started
+        with self._lock:
+            self._sessions.discard(session)
+        try:
+            _current.reset(session.token)
+        except ValueError:
+            # Stopped from another context than it started in
+            pass
+        if label:
+            session.label = label
+        self._finished.append((session, elapsed))
+        self._wake.set()
+
+    def _sample(self):
+        while True:
+            self._flush()
+            if not self._sessions:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for session in self._sessions:
+                    for thread_id in tuple(session.threads):
+                        frame = frames.get(thread_id)
+                        if frame is not None:
+                            session.stacks[self._collapse(frame)] += 1
+            del frames
+
+    def _flush(self):
+        """Save the finished sessions"""
+        with self._save_lock:
+            while self._finished:
+                self._save(*self._finished.popleft())
+
+    def _name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            filename = code.co_filename
+            marker = filename.rfind('site-packages' + os.sep)
+            if marker >= 0:
+                filename = filename[marker + len('site-packages') + 1:]
+            elif filename.startswith(str(settings.BASE_DIR)):
+                filename = os.path.relpath(filename, settings.BASE_DIR)
+            name = self._names[code] = f'{code.co_name} ({filename}:{code.co_firstlineno})'
+        return name
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < MAX_DEPTH:
+            names.append(self._name(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    def _save(self, session, elapsed):
+        label = re.sub(r'[^\w.-]+', '_', session.label).strip('_') or 'unnamed'
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if session.stacks:
+            with open(self.directory / f'{label}.collapsed', 'a') as f:
+                f.writelines(f'{stack} {count}\n' for stack, count in session.stacks.items())
+
+        leaves = Counter()
+        for stack, count in session.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        entry = (elapsed, session.wall.isoformat(timespec='seconds'), sum(leaves.values()), leaves.most_common(5))
+        with self._lock:
+            slowest = self._slow.setdefault(session.label, [])
+            if len(slowest) < self.top_n:
+                heapq.heappush(slowest, entry)
+            elif elapsed > slowest[0][0]:
+                heapq.heapreplace(slowest, entry)
+            else:
+                return
+        self.write_report()
+
+    def write_report(self):
+        with self._lock:
+            slow = {label: sorted(entries, reverse=True) for label, entries in self._slow.items()}
+        if not slow:
+            return
+        lines = []
+        for label, entries in sorted(slow.items()):
+            lines.append(f'{label}')
+            for elapsed, wall, samples, hottest in entries:
+                hot = ', '.join(f'{name} {count * 100 // max(samples, 1)}%' for name, count in hottest)
+                lines.append(f'  {elapsed * 1000:9.1f} ms  {wall}  {samples} samples  {hot}')
+            lines.append('')
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / 'slow.txt').write_text('\n'.join(lines))
+
+    def status(self):
+        return {
+            'enabled': self.enabled,
+            'seconds_left': max(0.0, round(self.enabled_until - time.monotonic(), 1)),
+            'directory': str(self.directory),
+            'labels': sorted(self._slow),
+        }
+
+
+class ProfilingMiddleware:
+    """Profile the rest of the middleware chain and the view for a request.
+
+    Profiled when a window is open (see profiling_view) or the request
+    carries the configured token in QZMAN_PROFILING['HEADER'].
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = settings.QZMAN_PROFILING['HEADER']
+        # Async under ASGI, so async views (core.feed) wait on the event loop, not a thread
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not profiler.wanted(request.headers.get(self.header)):
+            return self.get_response(request)
+        session = profiler.start(f'{request.method} {request.path}')
+        try:
+            return self.get_response(request)
+        finally:
+            self._stop(request, session)
+
+    async def __acall__(self, request):
+        if not profiler.wanted(request.headers.get(self.header)):
+            return await self.get_response(request)
+        session = profiler.start(f'{request.method} {request.path}')
+        try:
+            return await self.get_response(request)
+        finally:
+            self._stop(request, session)
+
+    def _stop(self, request, session):
+        match = request.resolver_match
+        name = match.view_name if match is not None else ID_SEGMENT.sub('/<id>', request.path)
+        profiler.stop(session, label=f'{request.method} {name}')
+
+
+def profiled(name):
+    """Profile an async consumer handler when a window is open or the
+    connection was opened with the profiling token (`self.profile_requested`)"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(self, *args, **kwargs):
+            if not (profiler.enabled or getattr(self, 'profile_requested', False)):
+                return await handler(self, *args, **kwargs)
+            session = profiler.start(f'ws {name}')
+            try:
+                return await handler(self, *args, **kwargs)
+            finally:
+                profiler.stop(session)
+        return wrapper
+    return decorator
+
+
+profiler = Profiler(
+    directory=settings.QZMAN_PROFILING['DIR'],
+    interval=settings.QZMAN_PROFILING['INTERVAL_MS'] / 1000,
+    top_n=settings.QZMAN_PROFILING['TOP_N'],
+    token=settings.QZMAN_PROFILING['TOKEN'],
+)
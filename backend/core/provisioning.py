@@ -0,0 +1,173 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+
+from .models import JOIN_CODE_ALPHABET, Quiz, Team
+
+CREDENTIAL_FIELDS = ['username', 'password', 'group', 'team_name', 'quiz']
+# Below this many passwords a process pool costs more than it saves
+POOL_THRESHOLD = 8
+
+
+class ProvisioningError(ValueError):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def generate_password(length=10):
+    return ''.join(secrets.choice(JOIN_CODE_ALPHABET.lower() + JOIN_CODE_ALPHABET) for _ in range(length))
+
+
+def clean_row(row):
+    if not isinstance(row, dict):
+        raise ProvisioningError(['Each row must be an object'])
+    return {str(key).strip(): str(value).strip() for key, value in row.items() if key and value is not None}
+
+
+def parse_rows(stream, fmt):
+    """Yield row dicts from a CSV (with header) or JSONL text stream"""
+    try:
+        yield from _parse_rows(stream, fmt)
+    except UnicodeDecodeError:
+        raise ProvisioningError(['The file is not valid UTF-8'])
+    except csv.Error as e:
+        raise ProvisioningError([f'Invalid CSV: {e}'])
+
+
+def _parse_rows(stream, fmt):
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield clean_row(row)
+    elif fmt == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield clean_row(json.loads(line))
+            except ValueError:
+                raise ProvisioningError([f'Line {number}: invalid JSON'])
+    else:
+        raise ProvisioningError([f'Unsupported format: {fmt}'])
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def hash_passwords(passwords, workers=None):
+    """PBKDF2-hash passwords across a process pool.
+
+    A 'spawn' pool is used so it is safe to start from a threaded server;
+    children inherit DJANGO_SETTINGS_MODULE and only need the hashers.
+    """
+    workers = workers or settings.QZMAN_PROVISION_WORKERS or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    workers = min(workers, len(passwords))
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def validate(rows):
+    errors = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        username = row.get('username', '')
+        if not username:
+            errors.append(f'Row {number}: username is required')
+        elif username in seen:
+            errors.append(f'Row {number}: duplicate username {username}')
+        seen.add(username)
+        if row.get('team_name') and not row.get('quiz'):
+            errors.append(f'Row {number}: team_name needs a quiz code')
+
+    existing = set(User.objects.filter(username__in=seen).values_list('username', flat=True))
+    errors.extend(f'User {username} already exists' for username in sorted(existing))
+
+    codes = {row['quiz'] for row in rows if row.get('quiz')}
+    quizzes = dict(Quiz.objects.filter(code__in=codes).values_list('code', 'id'))
+    errors.extend(f'Unknown quiz code {code}' for code in sorted(codes - set(quizzes)))
+
+    team_keys = {(quizzes.get(row.get('quiz')), row['team_name']) for row in rows if row.get('team_name')}
+    taken = set(
+        Team.objects
+        .filter(quiz_id__in={quiz_id for quiz_id, _ in team_keys}, name__in={name for _, name in team_keys})
+        .values_list('quiz_id', 'name')
+    ) & team_keys
+    errors.extend(f'Team {name} already exists in that quiz' for _, name in sorted(taken))
+    if len(team_keys) != sum(1 for row in rows if row.get('team_name')):
+        errors.append('Duplicate team names within the same quiz')
+    if errors:
+        raise ProvisioningError(errors)
+    return quizzes
+
+
+def provision(rows, workers=None):
+    """Create users, group memberships and Team rows in one transaction.
+
+    Rows have `username` and optionally `password` (generated when blank),
+    `email`, `group` (created if missing), `team_name` and `quiz` (join code).
+    Returns credential dicts in input order, including the plain passwords.
+    """
+    rows = list(rows)
+    quizzes = validate(rows)
+    for row in rows:
+        if not row.get('password'):
+            row['password'] = generate_password()
+    hashes = hash_passwords([row['password'] for row in rows], workers)
+
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username=row['username'], email=row.get('email', ''), password=password_hash)
+            for row, password_hash in zip(rows, hashes)
+        ])
+        user_ids = dict(
+            User.objects.filter(username__in=[row['username'] for row in rows]).values_list('username', 'id')
+        )
+
+        group_names = {row['group'] for row in rows if row.get('group')}
+        groups = dict(Group.objects.filter(name__in=group_names).values_list('name', 'id'))
+        missing = group_names - set(groups)
+        if missing:
+            Group.objects.bulk_create([Group(name=name) for name in missing])
+            groups = dict(Group.objects.filter(name__in=group_names).values_list('name', 'id'))
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user_ids[row['username']], group_id=groups[row['group']])
+            for row in rows if row.get('group')
+        ])
+
+        Team.objects.bulk_create([
+            Team(quiz_id=quizzes[row['quiz']], name=row['team_name'], user_id=user_ids[row['username']])
+            for row in rows if row.get('team_name')
+        ])
+
+    return [{field: row.get(field, '') for field in CREDENTIAL_FIELDS} for row in rows]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def credentials_csv(credentials):
+    """Yield the credentials as CSV lines, for StreamingHttpResponse"""
+    writer = csv.DictWriter(_Echo(), fieldnames=CREDENTIAL_FIELDS)
+    yield writer.writeheader()
+    for row in credentials:
+        yield writer.writerow(row)
+
+
+def open_upload(upload):
+    """Text stream and format for an uploaded provisioning file"""
+    return io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''), detect_format(upload.name)
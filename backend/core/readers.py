@@ -0,0 +1,146 @@
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .models import QuestionBank, QuizQuestion, Round, Team
+from .serializers import (
+    QuestionBankSerializer, QuizQuestionSerializer, QuizSerializer, RoundSerializer, TeamSerializer,
+)
+
+MANY = 'many'
+ONE = 'one'
+
+
+class UnknownFields(ValueError):
+    pass
+
+
+def datetime_converter(field):
+    """field.to_representation for aware datetimes with the output timezone looked
+    up once (per rows() call) rather than per value; other cases go to the field"""
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        text = value.astimezone(field_timezone).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+
+class Reader:
+    """Read-only rendering of a ModelSerializer straight from values_list() rows.
+
+    The output matches the serializer's byte for byte: the keys and their
+    order come from the serializer's own fields, foreign keys are ids and
+    datetimes are formatted as the field formats them. Nested serializers
+    are filled by `nested`: name -> function(queryset being read) returning
+    {parent id: [items]} for many=True, or {related id: item} for a single
+    nested object. That is one query per level instead of one per object,
+    and no model instances or field objects per row.
+    """
+
+    def __init__(self, serializer_class, nested=None):
+        self.serializer_class = serializer_class
+        self.nested = nested or {}
+        self._spec = None
+
+    @property
+    def spec(self):
+        """(name, column, datetime field, nested kind) per serializer field, in output order"""
+        if self._spec is None:
+            spec = []
+            for name, field in self.serializer_class().fields.items():
+                if isinstance(field, serializers.ListSerializer):
+                    spec.append((name, None, None, MANY))
+                elif isinstance(field, serializers.BaseSerializer):
+                    spec.append((name, f'{field.source}_id', None, ONE))
+                elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                    spec.append((name, f'{field.source}_id', None, None))
+                elif isinstance(field, serializers.DateTimeField):
+                    spec.append((name, field.source, field, None))
+                else:
+                    spec.append((name, field.source, None, None))
+            self._spec = spec
+        return self._spec
+
+    def select(self, fields):
+        """The spec entries for `fields` (all when None), in output order"""
+        if fields is None:
+            return self.spec
+        unknown = set(fields).difference(name for name, _, _, _ in self.spec)
+        if unknown:
+            raise UnknownFields(', '.join(sorted(unknown)))
+        return [entry for entry in self.spec if entry[0] in fields]
+
+    def rows(self, queryset, fields=None, group_by=None):
+        """Dicts for the objects of `queryset` in its order; grouped into
+        {group_by value: [dicts]} when group_by names a column"""
+        spec = self.select(fields)
+        columns = ['id']
+        plan = []
+        for name, column, datetime_field, kind in spec:
+            if kind == MANY:
+                plan.append((name, 0, None, kind))
+                continue
+            if column not in columns:
+                columns.append(column)
+            convert = datetime_converter(datetime_field) if datetime_field is not None else None
+            plan.append((name, columns.index(column), convert, kind))
+        if group_by is not None:
+            columns.append(group_by)
+        related = {name: self.nested[name](queryset) for name, _, _, kind in spec if kind is not None}
+
+        items = []
+        grouped = {}
+        for row in queryset.values_list(*columns):
+            item = {}
+            for name, index, convert, kind in plan:
+                value = row[index]
+                if kind == MANY:
+                    item[name] = related[name].get(value, [])
+                elif value is None:
+                    item[name] = None
+                elif kind == ONE:
+                    item[name] = related[name].get(value)
+                elif convert is not None:
+                    item[name] = convert(value)
+                else:
+                    item[name] = value
+            if group_by is None:
+                items.append(item)
+            else:
+                grouped.setdefault(row[-1], []).append(item)
+        return items if group_by is None else grouped
+
+
+def _by_id(items):
+    return {item['id']: item for item in items}
+
+
+question_bank_reader = Reader(QuestionBankSerializer)
+team_reader = Reader(TeamSerializer)
+quiz_question_reader = Reader(QuizQuestionSerializer, {
+    'question_details': lambda links: _by_id(question_bank_reader.rows(
+        QuestionBank.objects.filter(pk__in=links.values('question_id')),
+    )),
+})
+# Related managers use the models' default ordering; id breaks ties the way
+# the per-object queries return them
+round_reader = Reader(RoundSerializer, {
+    'questions': lambda rounds: quiz_question_reader.rows(
+        QuizQuestion.objects.filter(round__in=rounds.values('id')).order_by('order', 'id'), group_by='round_id',
+    ),
+})
+quiz_reader = Reader(QuizSerializer, {
+    'rounds': lambda quizzes: round_reader.rows(
+        Round.objects.filter(quiz__in=quizzes.values('id')).order_by('order', 'id'), group_by='quiz_id',
+    ),
+    'teams': lambda quizzes: team_reader.rows(
+        Team.objects.filter(quiz__in=quizzes.values('id')).order_by('id'), group_by='quiz_id',
+    ),
+})
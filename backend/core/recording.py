@@ -0,0 +1,187 @@
+import atexit
+import itertools
+import json
+import os
+import struct
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+
+from . import wire
+from .admission import team_from_token
+
+MAGIC = b'QZREC\x01'
+HEADER = struct.Struct('<6sq')     # magic, wall-clock start (ns since the epoch)
+RECORD = struct.Struct('<QIBI')    # offset from start (ns), connection, kind, payload length
+
+OPEN = 0
+IN_TEXT = 1
+IN_BINARY = 2
+OUT_TEXT = 3
+OUT_BINARY = 4
+CLOSE = 5
+INBOUND = (IN_TEXT, IN_BINARY)
+OUTBOUND = (OUT_TEXT, OUT_BINARY)
+
+# Never written to a recording
+PRIVATE_PARAMS = ('profile', 'team_token')
+# Frame field carrying a team token; recorded as the team id it was issued for
+TEAM_TOKEN_FIELD = 'team_token'
+
+
+def rewrite_team_token(payload, binary, codec, replace):
+    """A client frame with data.team_token replaced by replace(value).
+
+    Frames without the field (most of them) are returned untouched, without
+    being decoded. Text frames are always JSON; binary ones use the
+    connection's codec.
+    """
+    marker = TEAM_TOKEN_FIELD.encode() if isinstance(payload, bytes) else TEAM_TOKEN_FIELD
+    if marker not in payload:
+        return payload
+    try:
+        if binary:
+            msg_type, data = codec.decode(payload)
+        else:
+            message = json.loads(payload)
+            data = message.get('data') if isinstance(message, dict) else None
+    except (wire.DecodeError, ValueError):
+        return payload
+    if not isinstance(data, dict) or TEAM_TOKEN_FIELD not in data:
+        return payload
+    data[TEAM_TOKEN_FIELD] = replace(data[TEAM_TOKEN_FIELD])
+    return codec.encode(msg_type, data) if binary else json.dumps(message)
+
+
+class Event:
+    __slots__ = ('offset', 'connection', 'kind', 'payload')
+
+    def __init__(self, offset, connection, kind, payload):
+        self.offset = offset
+        self.connection = connection
+        self.kind = kind
+        self.payload = payload
+
+
+class Recorder:
+    """Append-only log of WebSocket traffic for later replay.
+
+    Every record is a fixed 17-byte header (nanoseconds since the recording
+    started, connection number, kind, length) followed by the raw frame, so
+    recording costs one buffered write per frame and no encoding. OPEN
+    records carry the path, query string, subprotocol and team as JSON; CLOSE
+    records carry the close code. Each process writes its own file.
+
+    Team tokens are credentials, so none is ever written: the query's token
+    and any data.team_token in a client frame are replaced by the id of the
+    team they were issued for (None if invalid), and the replayer signs
+    fresh tokens for the server it drives.
+    """
+
+    def __init__(self, path, flush_seconds=1.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_seconds = flush_seconds
+        self._file = open(self.path, 'xb', buffering=1024 * 1024)
+        self._file.write(HEADER.pack(MAGIC, time.time_ns()))
+        self._started = time.perf_counter_ns()
+        self._flushed = time.monotonic()
+        self._ids = itertools.count(1)
+        # connection -> (quiz id, codec) for scrubbing its frames
+        self._connections = {}
+        atexit.register(self.close)
+
+    def write(self, connection, kind, payload):
+        if self._file.closed:
+            return
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._file.write(RECORD.pack(time.perf_counter_ns() - self._started, connection, kind, len(payload)) + payload)
+        if time.monotonic() - self._flushed >= self.flush_seconds:
+            self._file.flush()
+            self._flushed = time.monotonic()
+
+    def open_connection(self, scope, subprotocol):
+        """Record a new connection; returns its number for the frames that follow"""
+        connection = next(self._ids)
+        quiz_id = scope.get('url_route', {}).get('kwargs', {}).get('quiz_id')
+        self._connections[connection] = (quiz_id, wire.negotiate([subprotocol] if subprotocol else []))
+        query = parse_qsl(scope.get('query_string', b'').decode())
+        token = next((value for key, value in query if key == TEAM_TOKEN_FIELD), None)
+        self.write(connection, OPEN, json.dumps({
+            'path': scope.get('path', ''),
+            'query': urlencode([(key, value) for key, value in query if key not in PRIVATE_PARAMS]),
+            'subprotocol': subprotocol,
+            'team': self._team(quiz_id, token),
+        }))
+        return connection
+
+    @staticmethod
+    def _team(quiz_id, token):
+        return team_from_token(token, quiz_id) if quiz_id and str(quiz_id).isdigit() else None
+
+    def received(self, connection, text_data, bytes_data):
+        quiz_id, codec = self._connections.get(connection, (None, wire.JSON))
+
+        def scrub(token):
+            return self._team(quiz_id, token)
+
+        if bytes_data is not None:
+            self.write(connection, IN_BINARY, rewrite_team_token(bytes_data, True, codec, scrub))
+        else:
+            self.write(connection, IN_TEXT, rewrite_team_token(text_data or '', False, codec, scrub))
+
+    def sent(self, connection, frame, binary):
+        self.write(connection, OUT_BINARY if binary else OUT_TEXT, frame)
+
+    def close_connection(self, connection, code):
+        self._connections.pop(connection, None)
+        self.write(connection, CLOSE, json.dumps({'code': code}))
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+_recorder = None
+
+
+def get_recorder():
+    """The process's recorder when QZMAN_RECORDING['DIR'] is set, else None"""
+    global _recorder
+    directory = settings.QZMAN_RECORDING['DIR']
+    if _recorder is None and directory:
+        name = f'{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.qzrec'
+        _recorder = Recorder(Path(directory) / name, settings.QZMAN_RECORDING['FLUSH_SECONDS'])
+    return _recorder
+
+
+class RecordingError(ValueError):
+    pass
+
+
+def read_events(path):
+    """(wall-clock start in ns, iterator of Events) for a recording; a torn last record is ignored"""
+    f = open(path, 'rb')
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        f.close()
+        raise RecordingError(f'{path} is not a traffic recording')
+    started = HEADER.unpack(header)[1]
+
+    def events():
+        with f:
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    return
+                offset, connection, kind, length = RECORD.unpack(head)
+                payload = f.read(length)
+                if len(payload) < length:
+                    return
+                yield Event(offset, connection, kind, payload)
+
+    return started, events()
@@ -0,0 +1,367 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import ssl
+import struct
+import time
+from array import array
+from collections import deque
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from . import wire
+from .admission import team_token
+from .recording import (
+    CLOSE, IN_BINARY, INBOUND, OPEN, OUT_BINARY, OUTBOUND, TEAM_TOKEN_FIELD, read_events, rewrite_team_token,
+)
+
+QUIZ_PATH = re.compile(r'(/ws/quiz/)(\d+)(/)')
+CONNECT_TIMEOUT = 10
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class Script:
+    """What one recorded connection did: when it opened and closed, and the frames it sent.
+
+    Each send is [offset, binary, payload, reply], where reply is the type of
+    the first frame the server sent back on the same connection within the
+    response window, or None when nothing came back in time.
+    """
+    __slots__ = ('number', 'path', 'query', 'subprotocol', 'opened', 'closed', 'sends', 'received', '_awaiting')
+
+    def __init__(self, number, opened, path, query, subprotocol):
+        self.number = number
+        self.opened = opened
+        self.path = path
+        self.query = query
+        self.subprotocol = subprotocol
+        self.closed = None
+        self.sends = []
+        self.received = 0
+        self._awaiting = None
+
+    @property
+    def codec(self):
+        return wire.negotiate([self.subprotocol] if self.subprotocol else [])
+
+
+def frame_type(codec, payload, binary):
+    try:
+        if binary:
+            return codec.decode(payload)[0]
+        return wire.JSON.decode(payload.decode())[0]
+    except (wire.DecodeError, UnicodeDecodeError):
+        return None
+
+
+def load_scripts(path, quiz_map=None, response_window=1.0, team_map=None):
+    """Group a recording's events into per-connection Scripts, in order of opening.
+
+    quiz_map and team_map ({recorded id: target id}) rewrite quiz paths and
+    teams for a server whose quizzes and teams have different ids. Recorded
+    team ids become team tokens signed for the target quiz, so replay must
+    run with the target server's SECRET_KEY.
+    """
+    _, events = read_events(path)
+    window = int(response_window * 1e9)
+    scripts = {}
+    minters = {}
+    last = 0
+    for event in events:
+        last = event.offset
+        if event.kind == OPEN:
+            info = json.loads(event.payload)
+            path = info['path']
+            if quiz_map:
+                path = QUIZ_PATH.sub(lambda m: f'{m[1]}{quiz_map.get(m[2], m[2])}{m[3]}', path)
+            minters[event.connection] = mint = token_minter(path, team_map)
+            query = info['query']
+            if info.get('team') is not None:
+                query = urlencode(parse_qsl(query) + [(TEAM_TOKEN_FIELD, mint(info['team']))])
+            scripts[event.connection] = Script(event.connection, event.offset, path, query, info['subprotocol'])
+            continue
+        script = scripts.get(event.connection)
+        if script is None:
+            continue
+        if event.kind in INBOUND:
+            binary = event.kind == IN_BINARY
+            payload = rewrite_team_token(event.payload, binary, script.codec, minters[event.connection])
+            send = [event.offset, binary, payload if isinstance(payload, bytes) else payload.encode(), None]
+            script.sends.append(send)
+            script._awaiting = send
+        elif event.kind in OUTBOUND:
+            script.received += 1
+            send = script._awaiting
+            if send is not None:
+                if event.offset - send[0] <= window:
+                    send[3] = frame_type(script.codec, event.payload, event.kind == OUT_BINARY)
+                script._awaiting = None
+        elif event.kind == CLOSE:
+            script.closed = event.offset
+    for script in scripts.values():
+        if script.closed is None:
+            script.closed = last
+    return sorted(scripts.values(), key=lambda script: script.opened)
+
+
+def token_minter(path, team_map=None):
+    """Turns a recorded team id into a team token for the quiz a replayed path connects to"""
+    match = QUIZ_PATH.search(path)
+
+    def mint(team):
+        if team is None or match is None:
+            return None
+        team = (team_map or {}).get(str(team), team)
+        return team_token(match[2], team)
+
+    return mint
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ReplayStats:
+    __slots__ = (
+        'connections', 'failed', 'sent', 'received', 'expected', 'unanswered', 'latencies', 'lags',
+        'elapsed', 'last_frame',
+    )
+
+    def __init__(self):
+        self.connections = 0
+        self.failed = 0
+        self.sent = 0
+        self.received = 0
+        self.expected = 0
+        self.unanswered = 0
+        self.latencies = array('d')
+        self.lags = array('d')
+        self.elapsed = 0.0
+        self.last_frame = None
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+        lags = sorted(self.lags)
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            'connections': self.connections,
+            'failed_connections': self.failed,
+            'frames_sent': self.sent,
+            'frames_received': self.received,
+            'frames_recorded': self.expected,
+            'unanswered': self.unanswered,
+            'elapsed': round(self.elapsed, 3),
+            'sent_per_second': round(self.sent / self.elapsed, 1) if self.elapsed else 0.0,
+            'received_per_second': round(self.received / self.elapsed, 1) if self.elapsed else 0.0,
+            'latency_ms': {
+                'count': len(latencies),
+                'p50': ms(percentile(latencies, 0.5)),
+                'p95': ms(percentile(latencies, 0.95)),
+                'p99': ms(percentile(latencies, 0.99)),
+                'max': ms(latencies[-1] if latencies else None),
+            },
+            # How far behind schedule sends went out; large values mean the
+            # replayer itself, not the server, was the bottleneck
+            'schedule_lag_ms': {'p99': ms(percentile(lags, 0.99)), 'max': ms(lags[-1] if lags else None)},
+        }
+
+
+class WebSocketClient:
+    """Minimal RFC 6455 client on asyncio streams.
+
+    Just enough for replay: one handshake, masked sends and an on_frame
+    callback per received message. (The autobahn client cannot be used here:
+    daphne already binds txaio to Twisted in the Django process.)
+    """
+
+    def __init__(self, reader, writer, on_frame):
+        self.reader = reader
+        self.writer = writer
+        self.on_frame = on_frame
+        self.closed = asyncio.get_running_loop().create_future()
+        self._task = None
+
+    @classmethod
+    async def connect(cls, host, port, path, subprotocol, on_frame, ssl_context=None):
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        key = base64.b64encode(os.urandom(16)).decode()
+        lines = [
+            f'GET {path} HTTP/1.1', f'Host: {host}:{port}', 'Upgrade: websocket', 'Connection: Upgrade',
+            f'Sec-WebSocket-Key: {key}', 'Sec-WebSocket-Version: 13',
+        ]
+        if subprotocol:
+            lines.append(f'Sec-WebSocket-Protocol: {subprotocol}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        response = await reader.readuntil(b'\r\n\r\n')
+        status = response.split(b'\r\n', 1)[0]
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest())
+        if b' 101 ' not in status or accept not in response:
+            writer.close()
+            raise ConnectionError(f'Handshake refused: {status.decode(errors="replace")}')
+        client = cls(reader, writer, on_frame)
+        client._task = asyncio.ensure_future(client._read())
+        return client
+
+    def send(self, payload, binary=False, opcode=None):
+        opcode = opcode if opcode is not None else (0x2 if binary else 0x1)
+        length = len(payload)
+        if length < 126:
+            head = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            head = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            head = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        mask = os.urandom(4)
+        masked = (int.from_bytes(payload, 'big') ^ int.from_bytes((mask * (length // 4 + 1))[:length], 'big'))
+        self.writer.write(head + mask + masked.to_bytes(length, 'big'))
+
+    async def _read(self):
+        message, message_opcode = [], None
+        code = 1006
+        try:
+            while True:
+                first, second = await self.reader.readexactly(2)
+                opcode, length = first & 0x0F, second & 0x7F
+                if length == 126:
+                    length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+                payload = await self.reader.readexactly(length)
+                if opcode == 0x8:
+                    code = struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else 1005
+                    break
+                if opcode == 0x9:
+                    self.send(payload, opcode=0xA)
+                    continue
+                if opcode == 0xA:
+                    continue
+                if opcode:
+                    message_opcode = opcode
+                message.append(payload)
+                if first & 0x80:
+                    self.on_frame(b''.join(message), message_opcode == 0x2)
+                    message = []
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writer.close()
+            if not self.closed.done():
+                self.closed.set_result(code)
+
+    async def close(self, code=1000):
+        if not self.closed.done():
+            try:
+                self.send(struct.pack('!H', code), opcode=0x8)
+            except ConnectionError:
+                pass
+            try:
+                await asyncio.wait_for(asyncio.shield(self.closed), CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+
+
+class ReplayConnection:
+    def __init__(self, replay, script):
+        self.replay = replay
+        self.script = script
+        self.codec = script.codec
+        self.pending = deque()
+
+    def frame(self, payload, binary):
+        stats = self.replay.stats
+        stats.received += 1
+        stats.last_frame = time.perf_counter()
+        if not self.pending:
+            return
+        msg_type = frame_type(self.codec, payload, binary)
+        for index, (expected, sent_at) in enumerate(self.pending):
+            if expected == msg_type:
+                stats.latencies.append(time.perf_counter() - sent_at)
+                del self.pending[index]
+                return
+
+    async def run(self):
+        replay, script, stats = self.replay, self.script, self.replay.stats
+        await replay.wait_until(script.opened)
+        path = script.path + (f'?{script.query}' if script.query else '')
+        try:
+            client = await asyncio.wait_for(
+                WebSocketClient.connect(replay.host, replay.port, path, script.subprotocol, self.frame, replay.ssl),
+                CONNECT_TIMEOUT,
+            )
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            stats.failed += 1
+            return
+        stats.connections += 1
+
+        for offset, binary, payload, reply in script.sends:
+            lag = await replay.wait_until(offset)
+            if client.closed.done():
+                break
+            if lag is not None:
+                stats.lags.append(lag)
+            if reply is not None:
+                self.pending.append((reply, time.perf_counter()))
+            client.send(payload, binary)
+            stats.sent += 1
+            stats.last_frame = time.perf_counter()
+
+        if replay.speed is None:
+            await asyncio.sleep(replay.drain)
+        else:
+            await replay.wait_until(script.closed)
+            # Give replies to the last frames a moment to arrive
+            await asyncio.sleep(min(replay.drain, 0.1) if self.pending else 0)
+        stats.unanswered += len(self.pending)
+        await client.close()
+
+
+class Replay:
+    """Drive a server with a recording's connections and frames.
+
+    At a given speed (1 for real time, 10 for ten times faster) every
+    connection opens and every frame is sent at its recorded moment, scaled;
+    with speed None each connection opens at once and sends its frames back
+    to back. Latency is measured from a send to the first frame of the type
+    the server answered it with in the recording.
+    """
+
+    def __init__(self, scripts, url, speed=1.0, drain=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'wss' else 80)
+        self.ssl = ssl.create_default_context() if parsed.scheme == 'wss' else None
+        self.scripts = scripts
+        self.speed = speed
+        self.drain = drain
+        self.stats = ReplayStats()
+        self.stats.expected = sum(script.received for script in scripts)
+        self.origin = min((script.opened for script in scripts), default=0)
+        self.loop = None
+        self.started = None
+
+    async def wait_until(self, offset):
+        """Sleep until a recorded offset comes round; returns how late we are, or None at max speed"""
+        if self.speed is None:
+            return None
+        target = self.started + (offset - self.origin) / 1e9 / self.speed
+        delay = target - self.loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return max(0.0, self.loop.time() - target)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.started = self.loop.time()
+        began = time.perf_counter()
+        await asyncio.gather(*(ReplayConnection(self, script).run() for script in self.scripts))
+        # Up to the last frame sent or received, not the closing drain
+        self.stats.elapsed = (self.stats.last_frame or time.perf_counter()) - began
+        return self.stats
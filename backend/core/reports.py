@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Abs
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .db import database_async
+from .models import ScoreLog
+
+PAGE_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+COLUMNS = [
+    ('id', 'id'),
+    ('timestamp', 'timestamp'),
+    ('quiz_id', 'quiz_id'),
+    ('round_id', 'round_id'),
+    ('round', 'round__name'),
+    ('question_id', 'question_id'),
+    ('team_id', 'team_id'),
+    ('team', 'team__name'),
+    ('points', 'points'),
+    ('old_score', 'old_score'),
+    ('new_score', 'new_score'),
+    ('reason', 'reason'),
+    ('awarded_by', 'awarded_by__username'),
+]
+FILTERS = {'quiz': 'quiz_id', 'round': 'round_id', 'team': 'team_id', 'awarded_by': 'awarded_by_id'}
+
+
+class ReportError(ValueError):
+    pass
+
+
+def _parse_moment(value, name):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ReportError(f'{name} must be an ISO date or datetime')
+        moment = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def filtered_logs(params):
+    """ScoreLog rows matching quiz/round/team/awarded_by ids and a since/until window"""
+    queryset = ScoreLog.objects.all()
+    for param, field in FILTERS.items():
+        value = params.get(param)
+        if value:
+            try:
+                queryset = queryset.filter(**{field: int(value)})
+            except ValueError:
+                raise ReportError(f'{param} must be an id')
+    if params.get('since'):
+        queryset = queryset.filter(timestamp__gte=_parse_moment(params['since'], 'since'))
+    if params.get('until'):
+        queryset = queryset.filter(timestamp__lt=_parse_moment(params['until'], 'until'))
+    return queryset
+
+
+def iter_pages(queryset, page_size=PAGE_SIZE):
+    """Yield report rows as lists of tuples in (timestamp, id) order, one keyset page per query.
+
+    Each page starts strictly after the last row of the previous one, so the
+    (quiz, timestamp) / (team, timestamp) indexes answer every page with a
+    range seek instead of an OFFSET scan, and rows appended during the export
+    do not shift pages.
+    """
+    fields = [field for _, field in COLUMNS]
+    ordered = queryset.order_by('timestamp', 'id').values_list(*fields)
+    page = list(ordered[:page_size])
+    while page:
+        yield page
+        if len(page) < page_size:
+            return
+        last_id, last_time = page[-1][0], page[-1][1]
+        page = list(
+            ordered.filter(timestamp__gte=last_time).exclude(timestamp=last_time, id__lte=last_id)[:page_size]
+        )
+
+
+def _serialized(page):
+    return ((row[0], row[1].isoformat(), *row[2:]) for row in page)
+
+
+def stream_csv(queryset):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in COLUMNS])
+    for page in iter_pages(queryset):
+        writer.writerows(_serialized(page))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_jsonl(queryset):
+    names = [name for name, _ in COLUMNS]
+    for page in iter_pages(queryset):
+        yield ''.join(json.dumps(dict(zip(names, row))) + '\n' for row in _serialized(page))
+
+
+def stream(queryset, fmt):
+    if fmt not in FORMATS:
+        raise ReportError(f'output must be one of {", ".join(FORMATS)}')
+    return stream_csv(queryset) if fmt == 'csv' else stream_jsonl(queryset)
+
+
+def astream(queryset, fmt):
+    """stream() as an async iterator for ASGI responses.
+
+    A sync generator body is collected in full before Daphne sends it; this
+    one computes each page's chunk on the DB executor as the client reads,
+    so only one page is in memory at a time.
+    """
+    return _on_db_executor(stream(queryset, fmt))
+
+
+async def _on_db_executor(chunks):
+    next_chunk = database_async(lambda: next(chunks, None))
+    try:
+        while (chunk := await next_chunk()) is not None:
+            yield chunk
+    finally:
+        chunks.close()
+
+
+def _totals(queryset, group_by):
+    rows = (
+        queryset.order_by()
+        .values(*group_by)
+        .annotate(
+            entries=Count('id'),
+            net=Sum('points'),
+            gained=Sum('points', filter=Q(points__gt=0), default=0),
+            lost=Sum(Abs('points'), filter=Q(points__lt=0), default=0),
+            first=Min('timestamp'),
+            last=Max('timestamp'),
+        )
+        .order_by(*group_by)
+    )
+    return list(rows)
+
+
+def summary(queryset):
+    """Per-team and per-round totals of the filtered rows, aggregated in SQL"""
+    return {
+        'teams': _totals(queryset, ['team_id', 'team__name']),
+        'rounds': _totals(queryset, ['round_id', 'round__name']),
+    }
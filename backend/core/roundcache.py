@@ -0,0 +1,141 @@
+import threading
+from types import MappingProxyType
+
+from . import media
+from .models import QuizQuestion, Round
+
+
+class QuestionRecord:
+    """A round's question with its bank content, flattened for read-only use"""
+    __slots__ = (
+        'id', 'quiz_id', 'round_id', 'question_id', 'order', 'points', 'text', 'type', 'options',
+        'answer', 'aliases', 'category', 'difficulty', 'media_url', 'media',
+    )
+
+    def __init__(self, id, quiz_id, round_id, question_id, order, points, text, type, options,
+                 answer, aliases, category, difficulty, media_url, media):
+        self.id = id
+        self.quiz_id = quiz_id
+        self.round_id = round_id
+        self.question_id = question_id
+        self.order = order
+        self.points = points
+        self.text = text
+        self.type = type
+        self.options = tuple(options or ())
+        self.answer = answer
+        self.aliases = tuple(aliases or ())
+        self.category = category
+        self.difficulty = difficulty
+        self.media_url = media_url
+        # Client URLs of the original and its variants, None without media
+        self.media = media
+
+
+class RoundData:
+    """A round and its questions in play order; `by_id` maps QuizQuestion id -> record"""
+    __slots__ = ('id', 'quiz_id', 'name', 'type', 'order', 'settings', 'questions', 'by_id')
+
+    def __init__(self, round_values, questions):
+        self.id, self.quiz_id, self.name, self.type, self.order, self.settings = round_values
+        self.settings = MappingProxyType(dict(self.settings or {}))
+        self.questions = tuple(questions)
+        self.by_id = MappingProxyType({question.id: question for question in self.questions})
+
+
+def load_round(round_id):
+    values = (
+        Round.objects.filter(pk=round_id)
+        .values_list('id', 'quiz_id', 'name', 'type', 'order', 'settings')
+        .first()
+    )
+    if values is None:
+        return None
+    rows = (
+        QuizQuestion.objects
+        .filter(round_id=round_id)
+        .order_by('order', 'id')
+        .values_list(
+            'id', 'round_id', 'question_id', 'order', 'points', 'question__text', 'question__type',
+            'question__options', 'question__answer', 'question__aliases', 'question__category',
+            'question__difficulty', 'question__media_url', 'question__media_asset__sha256',
+            'question__media_asset__ext', 'question__media_asset__variants',
+        )
+    )
+    questions = []
+    for row in rows:
+        sha256, ext, variants = row[13:]
+        if sha256:
+            urls = media.urls(sha256, ext, variants)
+        else:
+            urls = {'original': row[12]} if row[12] else None
+        questions.append(QuestionRecord(row[0], values[1], *row[1:13], urls))
+    return RoundData(values, questions)
+
+
+class RoundCache:
+    """Per-process cache of rounds and their questions, shared by every
+    view and consumer in the worker.
+
+    Rounds are loaded with two queries on first use (activate_round warms
+    the new live round up front) and dropped when a round, one of its
+    questions or a bank question is edited (see core.signals). Cached
+    objects are never mutated: an edit replaces them, so holders of an old
+    RoundData keep a consistent view and can tell it is outdated with
+    `is_current`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rounds = {}
+        self._question_rounds = {}
+        self._generation = 0
+
+    def get(self, round_id):
+        data = self._rounds.get(round_id)
+        if data is None:
+            data = self.warm(round_id)
+        return data
+
+    def warm(self, round_id):
+        """(Re)load a round into the cache; returns None if it does not exist"""
+        generation = self._generation
+        data = load_round(round_id)
+        with self._lock:
+            # Drop the result if an edit landed while it was loading
+            if data is not None and generation == self._generation:
+                self._rounds[round_id] = data
+                for question_id in data.by_id:
+                    self._question_rounds[question_id] = round_id
+        return data
+
+    def question(self, quiz_question_id):
+        """Record for a QuizQuestion id, loading its round if needed"""
+        round_id = self._question_rounds.get(quiz_question_id)
+        if round_id is None:
+            round_id = QuizQuestion.objects.filter(pk=quiz_question_id).values_list('round_id', flat=True).first()
+            if round_id is None:
+                return None
+        data = self.get(round_id)
+        return data.by_id.get(quiz_question_id) if data is not None else None
+
+    def is_current(self, data):
+        return self._rounds.get(data.id) is data
+
+    def invalidate(self, round_id=None, quiz_question_id=None):
+        """Drop a round, and the round currently holding a QuizQuestion (moved
+        or deleted questions); with neither, drop everything"""
+        with self._lock:
+            self._generation += 1
+            if round_id is None and quiz_question_id is None:
+                self._rounds.clear()
+                self._question_rounds.clear()
+                return
+            for stale_id in (round_id, self._question_rounds.get(quiz_question_id)):
+                data = self._rounds.pop(stale_id, None)
+                if data is not None:
+                    for question_id in data.by_id:
+                        self._question_rounds.pop(question_id, None)
+
+
+rounds = RoundCache()
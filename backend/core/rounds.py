@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.urls import reverse
+
+from . import bundles, media
+from .broadcast import broadcast
+from .models import Round
+from .roundcache import rounds
+
+
+def activate_round(round_obj):
+    """Make `round_obj` the quiz's only active round and prepare clients for it.
+
+    The round is loaded into the worker's round cache, its question bundle
+    is built and announced, and clients are told which media it uses, so
+    devices can download both before any question is revealed; reveals then
+    only need to carry a question id.
+    """
+    with transaction.atomic():
+        Round.objects.filter(quiz_id=round_obj.quiz_id, is_active=True).exclude(pk=round_obj.pk).update(is_active=False)
+        if not round_obj.is_active:
+            round_obj.is_active = True
+            round_obj.save(update_fields=['is_active'])
+
+    data = rounds.warm(round_obj.pk)
+    bundle = bundles.build_bundle(data)
+    broadcast(round_obj.quiz_id, 'ROUND_BUNDLE', {
+        'round_id': round_obj.pk,
+        'url': reverse('round-bundle', kwargs={'pk': round_obj.pk}),
+        'etag': bundle.etag,
+    })
+    broadcast(round_obj.quiz_id, 'MEDIA_PREFETCH', {
+        'round_id': round_obj.pk,
+        'media': media.round_media(data),
+    })
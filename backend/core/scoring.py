@@ -0,0 +1,113 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import ScoreLog, Team
+
+# Keep id lists comfortably under SQLite's bound-parameter limit
+CHUNK_SIZE = 900
+
+
+class ScoreChangeError(ValueError):
+    pass
+
+
+def _clean_reason(reason):
+    reason = (reason or '').strip()
+    if not reason:
+        raise ScoreChangeError('A reason is required for every score change')
+    return reason[:255]
+
+
+def apply_score_change(team_id, points, reason, awarded_by=None, round=None, question=None):
+    """Change one team's score and record it in the ledger, atomically.
+
+    The score moves with an F() increment, so concurrent changes never lose
+    updates, and the ScoreLog row (with old and new score) is written in the
+    same transaction.
+    """
+    reason = _clean_reason(reason)
+    points = int(points)
+    with transaction.atomic():
+        updated = Team.objects.filter(pk=team_id).update(score=F('score') + points)
+        if not updated:
+            raise Team.DoesNotExist(f'Team {team_id} does not exist')
+        # Our UPDATE holds the row until commit, so this reads our own result
+        quiz_id, new_score = Team.objects.filter(pk=team_id).values_list('quiz_id', 'score').get()
+        return ScoreLog.objects.create(
+            quiz_id=quiz_id, team_id=team_id, round=round, question=question,
+            points=points, old_score=new_score - points, new_score=new_score,
+            reason=reason, awarded_by=awarded_by,
+        )
+
+
+def apply_bulk_changes(quiz_id, changes, awarded_by=None, round=None):
+    """Apply {team_id: (points, reason)} in one transaction.
+
+    Scores move with a single CASE-based UPDATE and the ledger rows are
+    written with one bulk_create. Returns the created ScoreLog rows.
+    """
+    changes = {
+        team_id: (int(points), _clean_reason(reason))
+        for team_id, (points, reason) in changes.items() if points
+    }
+    if not changes:
+        return []
+
+    by_points = {}
+    for team_id, (points, _) in changes.items():
+        by_points.setdefault(points, []).append(team_id)
+
+    team_ids = list(changes)
+    with transaction.atomic():
+        Team.objects.filter(pk__in=team_ids).update(
+            score=F('score') + Case(
+                *[When(pk__in=ids, then=Value(points)) for points, ids in by_points.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        new_scores = {}
+        for start in range(0, len(team_ids), CHUNK_SIZE):
+            new_scores.update(
+                Team.objects.filter(pk__in=team_ids[start:start + CHUNK_SIZE]).values_list('id', 'score')
+            )
+        return ScoreLog.objects.bulk_create([
+            ScoreLog(
+                quiz_id=quiz_id, team_id=team_id, round=round, points=points,
+                old_score=new_scores[team_id] - points, new_score=new_scores[team_id],
+                reason=reason, awarded_by=awarded_by,
+            )
+            for team_id, (points, reason) in changes.items()
+        ])
+
+
+def ledger_totals():
+    """Per-team sum of ScoreLog points, for use as an annotation"""
+    return Coalesce(
+        Subquery(
+            ScoreLog.objects
+            .filter(team=OuterRef('pk'))
+            .values('team')
+            .annotate(total=Sum('points'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def reconcile_scores(quiz_id=None, fix=False):
+    """Find teams whose score differs from their ledger total.
+
+    Returns (team_id, name, score, ledger_total) for each mismatch. With
+    `fix`, those scores are reset to the ledger total, which is the source
+    of truth.
+    """
+    teams = Team.objects.all()
+    if quiz_id is not None:
+        teams = teams.filter(quiz_id=quiz_id)
+    mismatched = teams.annotate(ledger_total=ledger_totals()).exclude(score=F('ledger_total'))
+    rows = list(mismatched.values_list('id', 'name', 'score', 'ledger_total'))
+    if fix and rows:
+        Team.objects.filter(pk__in=[row[0] for row in rows]).update(score=ledger_totals())
+    return rows
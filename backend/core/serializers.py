@@ -1,15 +1,28 @@
 from rest_framework import serializers
-from .models import Quiz, Round, Team, QuestionBank, QuizQuestion
+from .models import Quiz, Round, Team, QuestionBank, QuizQuestion, ScoreLog
+from .media import MediaError, clean_media_url
 
 class QuestionBankSerializer(serializers.ModelSerializer):
     class Meta:
         model = QuestionBank
         fields = '__all__'
 
+    def validate_media_url(self, value):
+        try:
+            return clean_media_url(value)
+        except MediaError as e:
+            raise serializers.ValidationError(str(e))
+
 class TeamSerializer(serializers.ModelSerializer):
     class Meta:
         model = Team
         fields = '__all__'
+        read_only_fields = ['score'] # Changed only through the score ledger
+
+class ScoreLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScoreLog
+        fields = '__all__'
 
 class QuizQuestionSerializer(serializers.ModelSerializer):
     question_details = QuestionBankSerializer(source='question', read_only=True)
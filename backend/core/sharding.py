@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+
+from .models import Quiz, Round, Team
+
+# Set by the supervisor (see core.supervisor) for its worker processes
+WORKER_ENV = 'QZMAN_WORKER'
+STATE_ENV = 'QZMAN_SHARD_STATE'
+
+QUIZ_PATHS = (
+    re.compile(r'^/ws/quiz/(\d+)/'),
+    re.compile(r'^/api/quizzes/(\d+)/'),
+)
+ROUND_PATHS = (
+    re.compile(r'^/api/rounds/(\d+)/'),
+)
+TEAM_PATHS = (
+    re.compile(r'^/api/teams/(\d+)/'),
+)
+# Request fields that name a quiz, directly or through one of its objects
+BODY_FIELDS = ('quiz', 'access_code', 'round', 'team')
+
+
+def shard_for(quiz_id, workers):
+    """The worker that owns a quiz; stable for a given number of workers"""
+    return int(quiz_id) % workers
+
+
+class QuizResolver:
+    """Find the quiz a request belongs to from its path, query string or small form body.
+
+    Round, team and join-code lookups are cached: an object never moves to
+    another quiz.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _lookup(self, kind, key):
+        cached = self._cache.get((kind, key))
+        if cached is not None:
+            return cached
+        if kind == 'round':
+            quiz_id = Round.objects.filter(pk=key).values_list('quiz_id', flat=True).first()
+        elif kind == 'team':
+            quiz_id = Team.objects.filter(pk=key).values_list('quiz_id', flat=True).first()
+        else:
+            quiz_id = Quiz.objects.filter(code=key).values_list('id', flat=True).first()
+        if quiz_id is not None:
+            with self._lock:
+                self._cache[kind, key] = quiz_id
+        return quiz_id
+
+    def from_path(self, path, query=''):
+        for pattern in QUIZ_PATHS:
+            match = pattern.match(path)
+            if match:
+                return int(match[1])
+        for kind, patterns in (('round', ROUND_PATHS), ('team', TEAM_PATHS)):
+            for pattern in patterns:
+                match = pattern.match(path)
+                if match:
+                    return self._lookup(kind, int(match[1]))
+        if query:
+            return self.from_fields({key: values[0] for key, values in parse_qs(query).items()})
+        return None
+
+    def from_fields(self, fields):
+        for name in BODY_FIELDS:
+            value = fields.get(name)
+            if value in (None, ''):
+                continue
+            value = str(value).strip()
+            if name == 'quiz' and value.isdigit():
+                return int(value)
+            if name == 'access_code':
+                return self._lookup('code', value)
+            if value.isdigit():
+                return self._lookup(name, int(value))
+        return None
+
+    def from_body(self, body, content_type):
+        """Quiz named by a JSON or urlencoded request body, if any"""
+        try:
+            if content_type.startswith('application/json'):
+                fields = json.loads(body)
+            elif content_type.startswith('application/x-www-form-urlencoded'):
+                fields = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+            else:
+                return None
+        except (ValueError, UnicodeDecodeError):
+            return None
+        return self.from_fields(fields) if isinstance(fields, dict) else None
+
+
+_announce_lock = threading.Lock()
+_announced = 0
+
+
+def announce_change():
+    """Tell the other workers that quiz content changed (no-op when not sharded).
+
+    Each process counts its announcements in its own file of the shared state
+    directory, so writers never overwrite each other's announcements.
+    """
+    global _announced
+    directory = os.environ.get(STATE_ENV)
+    if not directory:
+        return
+    path = os.path.join(directory, str(os.getpid()))
+    with _announce_lock:
+        _announced += 1
+        with open(f'{path}.tmp', 'w') as f:
+            f.write(str(_announced))
+        os.replace(f'{path}.tmp', path)
+
+
+class ChangeWatcher:
+    """Daemon thread in a worker that runs `callback` when another worker announces a change.
+
+    Caches are per process, so an edit handled by one worker would go
+    unnoticed by the others; reading the other workers' counters every
+    `interval` seconds bounds how long they can serve stale content.
+    """
+
+    def __init__(self, path, callback, interval):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self._seen = self._counters()
+
+    def _counters(self):
+        """{writer pid: announcements} for every process but this one"""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return {}
+        own = str(os.getpid())
+        counters = {}
+        for name in names:
+            if name == own or not name.isdigit():
+                continue
+            try:
+                with open(os.path.join(self.path, name)) as f:
+                    counters[name] = int(f.read())
+            except (FileNotFoundError, ValueError):
+                continue
+        return counters
+
+    def check(self):
+        """Run the callback if any other writer announced since the last check"""
+        counters = self._counters()
+        changed = any(self._seen.get(name) != count for name, count in counters.items())
+        self._seen = counters
+        if changed:
+            self.callback()
+
+    def start(self):
+        threading.Thread(target=self._run, name='qzman-shard-watch', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
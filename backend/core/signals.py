@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import game, sharding
+from .admission import join_codes
+from .models import QuestionBank, Quiz, QuizQuestion, Round
+from .roundcache import rounds
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def invalidate_join_codes(sender, **kwargs):
+    join_codes.invalidate()
+    sharding.announce_change()
+
+
+@receiver([post_save, post_delete], sender=Round)
+def invalidate_round_content(sender, instance, **kwargs):
+    # Round bundles are rebuilt from the replacement cache entry
+    rounds.invalidate(instance.pk)
+    game.mark_stale(instance.quiz_id)
+    sharding.announce_change()
+
+
+@receiver([post_save, post_delete], sender=QuizQuestion)
+def invalidate_round_questions(sender, instance, **kwargs):
+    rounds.invalidate(instance.round_id, quiz_question_id=instance.pk)
+    game.mark_stale()
+    sharding.announce_change()
+
+
+@receiver([post_save, post_delete], sender=QuestionBank)
+def invalidate_question_content(sender, **kwargs):
+    # A bank question can appear in any number of rounds
+    rounds.invalidate()
+    game.mark_stale()
+    sharding.announce_change()
+
+
+def invalidate_all():
+    """Drop every content cache of this process (another worker changed something)"""
+    join_codes.invalidate()
+    rounds.invalidate()
+    game.mark_stale()
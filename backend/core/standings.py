@@ -0,0 +1,124 @@
+from collections import defaultdict
+
+from . import timing
+from .broadcast import send_to_teams
+from .models import ScoreLog, Submission, Team
+from .roundcache import rounds
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentiles(ordered):
+    """Nearest-rank percentiles of an already sorted sequence"""
+    if not ordered:
+        return {f'p{p}': None for p in PERCENTILES}
+    last = len(ordered) - 1
+    return {f'p{p}': ordered[min(last, (p * len(ordered) + 99) // 100 - 1)] for p in PERCENTILES}
+
+
+def format_duration(millis):
+    """4m 30s, or 12.3s under a minute"""
+    if millis < 60000:
+        return f'{millis / 1000:.1f}s'
+    seconds = round(millis / 1000)
+    return f'{seconds // 60}m {seconds % 60:02d}s'
+
+
+def _correct_answers(round_id):
+    """(team, question) pairs answered correctly: graded submissions, or points awarded for the question"""
+    correct = set(
+        Submission.objects.filter(round_id=round_id, is_correct=True).values_list('team_id', 'question_id')
+    )
+    correct.update(
+        ScoreLog.objects
+        .filter(round_id=round_id, question__isnull=False, points__gt=0)
+        .values_list('team_id', 'question_id')
+    )
+    return correct
+
+
+def round_standings(round_id):
+    """Rankings, per-question response-time percentiles and per-team cards for a round.
+
+    Teams rank by points scored in the round, then by the total time they
+    took over their correct answers (faster first); teams equal on both
+    share a rank. Response times are read once from their packed arrays and
+    every figure comes from a single pass over them.
+    """
+    data = rounds.get(round_id)
+    if data is None:
+        return None
+    times = timing.load(round_id)
+    correct = _correct_answers(round_id)
+    scores = defaultdict(int)
+    for team_id, points in ScoreLog.objects.filter(round_id=round_id).values_list('team_id', 'points'):
+        scores[team_id] += points
+    teams = dict(Team.objects.filter(quiz_id=data.quiz_id).values_list('id', 'name'))
+
+    answered = defaultdict(int)
+    correct_count = defaultdict(int)
+    correct_millis = defaultdict(int)
+    total_millis = defaultdict(int)
+    by_question = defaultdict(list)
+    for team_id, question_id, millis in zip(times.teams, times.questions, times.millis):
+        answered[team_id] += 1
+        total_millis[team_id] += millis
+        by_question[question_id].append(millis)
+        if (team_id, question_id) in correct:
+            correct_count[team_id] += 1
+            correct_millis[team_id] += millis
+    # Correct answers with no recorded time (e.g. marked by the QM) still count
+    for team_id, question_id in correct:
+        if (team_id, question_id) not in times:
+            correct_count[team_id] += 1
+
+    max_score = sum(question.points for question in data.questions)
+    ranked = sorted(
+        (team_id for team_id in teams if team_id in scores or team_id in answered),
+        key=lambda team_id: (-scores[team_id], correct_millis[team_id], team_id),
+    )
+    cards = []
+    previous = None
+    for position, team_id in enumerate(ranked, start=1):
+        key = (scores[team_id], correct_millis[team_id])
+        rank = cards[-1]['rank'] if key == previous else position
+        previous = key
+        cards.append({
+            'team_id': team_id,
+            'team': teams[team_id],
+            'rank': rank,
+            'score': scores[team_id],
+            'max_score': max_score,
+            'correct': correct_count[team_id],
+            'answered': answered[team_id],
+            'questions': len(data.questions),
+            'time_ms': correct_millis[team_id],
+            'total_time_ms': total_millis[team_id],
+            'summary': f'Score: {scores[team_id]}/{max_score} | Time: {format_duration(correct_millis[team_id])}',
+        })
+
+    questions = []
+    for question in data.questions:
+        millis = sorted(by_question.get(question.id, ()))
+        questions.append({
+            'question_id': question.id,
+            'order': question.order,
+            'responses': len(millis),
+            'fastest_ms': millis[0] if millis else None,
+            **{f'{name}_ms': value for name, value in percentiles(millis).items()},
+        })
+
+    return {'round_id': round_id, 'quiz_id': data.quiz_id, 'teams': cards, 'questions': questions}
+
+
+def publish_summaries(round_id):
+    """Send every ranked team its own post-round card; returns the standings"""
+    standings = round_standings(round_id)
+    if standings is None:
+        return None
+    team_count = len(standings['teams'])
+    send_to_teams(standings['quiz_id'], 'ROUND_SUMMARY', {
+        card['team_id']: {'round_id': round_id, 'teams': team_count, **card}
+        for card in standings['teams']
+    })
+    return standings
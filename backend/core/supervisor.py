@@ -0,0 +1,304 @@
+import asyncio
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from .sharding import STATE_ENV, WORKER_ENV, QuizResolver, shard_for
+
+# Largest request body read up front to look for a quiz, join code, round or team
+BODY_PEEK = 64 * 1024
+HEAD_LIMIT = 64 * 1024
+STARTUP_TIMEOUT = 60.0
+STOP_TIMEOUT = 5.0
+HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection'}
+
+
+def http_response(status, reason, body):
+    data = json.dumps(body).encode()
+    return (
+        f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'
+    ).encode() + data
+
+
+async def pipe(reader, writer):
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        pass
+
+
+class Worker:
+    """One daphne process serving the quizzes with shard_for(quiz_id) == index"""
+    __slots__ = ('index', 'port', 'process', 'ready', 'failures', 'restarts', 'started_at')
+
+    def __init__(self, index, port):
+        self.index = index
+        self.port = port
+        self.process = None
+        self.ready = asyncio.Event()
+        self.failures = 0
+        self.restarts = 0
+        self.started_at = None
+
+    def status(self):
+        return {
+            'worker': self.index,
+            'port': self.port,
+            'pid': self.process.pid if self.process else None,
+            'ready': self.ready.is_set(),
+            'failures': self.failures,
+            'restarts': self.restarts,
+            'uptime': round(time.monotonic() - self.started_at, 1) if self.started_at else None,
+        }
+
+
+class Supervisor:
+    """Run N worker processes behind a proxy that keeps each quiz on one worker.
+
+    A quiz's game state, round cache and channel groups live in the memory
+    of the process its sockets reach, so the proxy sends `ws/quiz/<id>/`
+    and every REST call that names the quiz (by path, ?quiz=, join code,
+    round or team) to worker `quiz_id % N`; other requests go round robin.
+    Requests are proxied one per connection. A worker that exits or fails
+    `failures` health checks in a row is restarted on its own; requests for
+    its quizzes wait up to `restart_wait` seconds for it, and the other
+    workers' quizzes carry on untouched.
+    """
+
+    def __init__(self, workers, worker_port, state_path, health_interval, health_timeout,
+                 failures, restart_wait, log=None):
+        self.workers = [Worker(index, worker_port + index) for index in range(workers)]
+        self.state_path = state_path
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.failures = failures
+        self.restart_wait = restart_wait
+        self.log = log or (lambda message: None)
+        self.resolver = QuizResolver()
+        self._round_robin = itertools.cycle(range(workers))
+        self._restarting = set()
+
+    # Worker processes
+
+    def spawn(self, worker):
+        env = dict(os.environ, **{WORKER_ENV: str(worker.index), STATE_ENV: self.state_path})
+        worker.process = subprocess.Popen(
+            [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(worker.port), 'qzman.asgi:application'],
+            env=env,
+        )
+        worker.started_at = time.monotonic()
+        worker.failures = 0
+        self.log(f'worker {worker.index} started (pid {worker.process.pid}, port {worker.port})')
+
+    async def stop(self, worker):
+        worker.ready.clear()
+        process = worker.process
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(process.wait), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await asyncio.to_thread(process.wait)
+
+    async def wait_started(self, worker):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if worker.process.poll() is not None:
+                return False
+            if await self.check(worker):
+                worker.ready.set()
+                self.log(f'worker {worker.index} ready')
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    async def restart(self, worker, reason):
+        if worker.index in self._restarting:
+            return
+        self._restarting.add(worker.index)
+        try:
+            self.log(f'restarting worker {worker.index}: {reason}')
+            await self.stop(worker)
+            worker.restarts += 1
+            while True:
+                self.spawn(worker)
+                if await self.wait_started(worker):
+                    return
+                await self.stop(worker)
+                await asyncio.sleep(1.0)
+        finally:
+            self._restarting.discard(worker.index)
+
+    async def check(self, worker):
+        """GET /api/health/ on the worker; True on a 200 within health_timeout"""
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection('127.0.0.1', worker.port), self.health_timeout,
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+        try:
+            writer.write(b'GET /api/health/ HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n')
+            status = await asyncio.wait_for(reader.readline(), self.health_timeout)
+            return status.split(b' ', 2)[1:2] == [b'200']
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            writer.close()
+
+    async def monitor(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for worker in self.workers:
+                if worker.index in self._restarting:
+                    continue
+                if worker.process.poll() is not None:
+                    asyncio.ensure_future(self.restart(worker, f'exited with {worker.process.returncode}'))
+                elif await self.check(worker):
+                    worker.failures = 0
+                else:
+                    worker.failures += 1
+                    if worker.failures >= self.failures:
+                        asyncio.ensure_future(self.restart(worker, f'{worker.failures} failed health checks'))
+
+    # Proxy
+
+    async def pick(self, quiz_id):
+        """The ready worker for a quiz (waiting out a restart), or any ready one; None if there is none"""
+        if quiz_id is not None:
+            worker = self.workers[shard_for(quiz_id, len(self.workers))]
+            try:
+                await asyncio.wait_for(worker.ready.wait(), self.restart_wait)
+            except asyncio.TimeoutError:
+                return None
+            return worker
+        for _ in self.workers:
+            worker = self.workers[next(self._round_robin)]
+            if worker.ready.is_set():
+                return worker
+        return None
+
+    async def connect(self, quiz_id):
+        """Open a connection to the worker for a quiz (or any worker), riding out a restart"""
+        deadline = time.monotonic() + self.restart_wait
+        while time.monotonic() < deadline:
+            worker = await self.pick(quiz_id)
+            if worker is None:
+                return None
+            if worker.process.poll() is None:
+                try:
+                    return await asyncio.open_connection('127.0.0.1', worker.port)
+                except OSError:
+                    pass
+            # Went down since its last health check
+            worker.ready.clear()
+            asyncio.ensure_future(self.restart(worker, 'unreachable'))
+            await asyncio.sleep(0.05)
+        return None
+
+    async def resolve(self, path, query, headers, body):
+        loop = asyncio.get_running_loop()
+        quiz_id = await loop.run_in_executor(None, self.resolver.from_path, path, query)
+        if quiz_id is None and body:
+            quiz_id = await loop.run_in_executor(
+                None, self.resolver.from_body, body, headers.get('content-type', ''),
+            )
+        return quiz_id
+
+    async def control(self, method, path):
+        """Loopback-only /_supervisor/ endpoints: status, and restart/<n>"""
+        if path.rstrip('/') == '/_supervisor/status':
+            return http_response(200, 'OK', {'workers': [worker.status() for worker in self.workers]})
+        parts = path.strip('/').split('/')
+        if method == 'POST' and len(parts) == 3 and parts[1] == 'restart' and parts[2].isdigit():
+            index = int(parts[2])
+            if index < len(self.workers):
+                asyncio.ensure_future(self.restart(self.workers[index], 'requested'))
+                return http_response(202, 'Accepted', {'restarting': index})
+        return http_response(404, 'Not Found', {'error': 'Not found'})
+
+    async def handle(self, reader, writer):
+        upstream = None
+        try:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            lines = head.decode('latin-1').split('\r\n')
+            try:
+                method, target, version = lines[0].split(' ', 2)
+            except ValueError:
+                writer.write(http_response(400, 'Bad Request', {'error': 'Bad request'}))
+                return
+            header_lines = [line for line in lines[1:] if line]
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            path, _, query = target.partition('?')
+
+            if path.startswith('/_supervisor/'):
+                peer = writer.get_extra_info('peername') or ('',)
+                if peer[0] in ('127.0.0.1', '::1'):
+                    writer.write(await self.control(method, path))
+                else:
+                    writer.write(http_response(403, 'Forbidden', {'error': 'Forbidden'}))
+                return
+
+            upgrade = 'upgrade' in headers.get('connection', '').lower()
+            body = b''
+            length = headers.get('content-length', '')
+            if length.isdigit() and 0 < int(length) <= BODY_PEEK:
+                body = await reader.readexactly(int(length))
+            quiz_id = await self.resolve(path, query, headers, body)
+            connection = await self.connect(quiz_id)
+            if connection is None:
+                writer.write(http_response(503, 'Service Unavailable', {'error': 'Worker unavailable'}))
+                return
+            upstream_reader, upstream = connection
+            if not upgrade:
+                # One request per connection: the worker closes after answering
+                header_lines = [
+                    line for line in header_lines if line.partition(':')[0].strip().lower() not in HOP_HEADERS
+                ]
+                header_lines.append('Connection: close')
+            upstream.write('\r\n'.join([lines[0], *header_lines, '', '']).encode('latin-1') + body)
+            sending = asyncio.ensure_future(pipe(reader, upstream))
+            await pipe(upstream_reader, writer)
+            sending.cancel()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if upstream is not None:
+                upstream.close()
+            writer.close()
+
+    async def serve(self, host, port):
+        os.makedirs(self.state_path, exist_ok=True)
+        for worker in self.workers:
+            self.spawn(worker)
+        started = await asyncio.gather(*(self.wait_started(worker) for worker in self.workers))
+        for worker, ok in zip(self.workers, started):
+            if not ok:
+                asyncio.ensure_future(self.restart(worker, 'did not start'))
+        server = await asyncio.start_server(self.handle, host, port, limit=HEAD_LIMIT)
+        self.log(f'proxy listening on {host}:{port} for {len(self.workers)} workers')
+        monitor = asyncio.ensure_future(self.monitor())
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            monitor.cancel()
+            await asyncio.gather(*(self.stop(worker) for worker in self.workers))
@@ -1,3 +1,1291 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qsl
 
-# Create your tests here.
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import AsyncClient, SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import (
+    assets, cloning, feed, game, ingestion, timing, matching, media, profiling, provisioning, recording, replay,
+    reports, roundcache, sharding, wire,
+)
+from .admission import join_batcher, team_from_token, team_token
+from .broadcast import team_group_name
+from .db import database_async
+from .coalesce import Coalescer
+from .outbox import Outbox
+from .models import MediaAsset, QuestionBank, Quiz, QuizQuestion, Round, ScoreLog, Submission, Team
+from .routing import websocket_urlpatterns
+from .scoring import apply_bulk_changes, apply_score_change, reconcile_scores
+from .serializers import QuestionBankSerializer, QuizSerializer, TeamSerializer
+
+
+class ScoreLedgerStressTest(TransactionTestCase):
+    """Concurrent score changes must neither lose updates nor drift from the ledger"""
+    THREADS = 8
+    CHANGES_PER_THREAD = 25
+
+    def setUp(self):
+        user = User.objects.create(username='qm')
+        self.quiz = Quiz.objects.create(title='Stress', created_by=user)
+        self.teams = [Team.objects.create(quiz=self.quiz, name=f'Team {i}') for i in range(3)]
+
+    def run_in_threads(self, target):
+        # An in-memory SQLite test database cannot be shared between threads
+        if getattr(connection, 'is_in_memory_db', lambda: False)():
+            self.skipTest('Needs a test database that allows multiple connections')
+        errors = []
+
+        def worker(index):
+            try:
+                target(index)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_changes_are_not_lost(self):
+        team = self.teams[0]
+
+        def adjust(index):
+            for _ in range(self.CHANGES_PER_THREAD):
+                apply_score_change(team.pk, index + 1, 'Stress test')
+
+        self.run_in_threads(adjust)
+
+        expected = sum(range(1, self.THREADS + 1)) * self.CHANGES_PER_THREAD
+        team.refresh_from_db()
+        self.assertEqual(team.score, expected)
+        logs = list(ScoreLog.objects.filter(team=team).values_list('points', 'old_score', 'new_score'))
+        self.assertEqual(len(logs), self.THREADS * self.CHANGES_PER_THREAD)
+        for points, old_score, new_score in logs:
+            self.assertEqual(new_score - old_score, points)
+        # Every change saw a distinct score, i.e. none overlapped another
+        self.assertEqual(len({new_score for _, _, new_score in logs}), len(logs))
+        self.assertEqual(reconcile_scores(self.quiz.pk), [])
+
+    def test_bulk_and_single_changes_interleave(self):
+        team_ids = [team.pk for team in self.teams]
+
+        def adjust(index):
+            for _ in range(self.CHANGES_PER_THREAD):
+                if index % 2:
+                    apply_bulk_changes(self.quiz.pk, {t: (2, 'Bulk') for t in team_ids})
+                else:
+                    apply_score_change(team_ids[0], -1, 'Penalty')
+
+        self.run_in_threads(adjust)
+
+        bulk_total = (self.THREADS // 2) * self.CHANGES_PER_THREAD * 2
+        penalties = (self.THREADS - self.THREADS // 2) * self.CHANGES_PER_THREAD
+        scores = dict(Team.objects.values_list('id', 'score'))
+        self.assertEqual(scores[team_ids[0]], bulk_total - penalties)
+        self.assertEqual(scores[team_ids[1]], bulk_total)
+        self.assertEqual(reconcile_scores(self.quiz.pk), [])
+
+    def test_reason_is_mandatory(self):
+        with self.assertRaises(ValueError):
+            apply_score_change(self.teams[0].pk, 5, '  ')
+        self.assertFalse(ScoreLog.objects.exists())
+
+    def test_only_score_managers_adjust_scores(self):
+        team = self.teams[0]
+        team.user = User.objects.create(username='team0')
+        team.save(update_fields=['user'])
+        manager = User.objects.create(username='scorer')
+        manager.groups.add(Group.objects.create(name='Score Manager'))
+        staff = User.objects.create(username='admin', is_staff=True)
+        client = APIClient()
+        for user, expected in ((team.user, 403), (manager, 201), (staff, 201)):
+            client.force_authenticate(user)
+            response = client.post(f'/api/teams/{team.pk}/adjust_score/', {'points': 5, 'reason': 'Bonus'}, format='json')
+            self.assertEqual(response.status_code, expected, user.username)
+        team.refresh_from_db()
+        self.assertEqual(team.score, 10)
+
+    def test_reconcile_fixes_drift(self):
+        apply_score_change(self.teams[0].pk, 10, 'Correct answer')
+        Team.objects.filter(pk=self.teams[0].pk).update(score=99)
+
+        self.assertEqual(reconcile_scores(self.quiz.pk), [(self.teams[0].pk, 'Team 0', 99, 10)])
+        reconcile_scores(self.quiz.pk, fix=True)
+        self.teams[0].refresh_from_db()
+        self.assertEqual(self.teams[0].score, 10)
+
+
+class SqlitePragmaTest(TransactionTestCase):
+    """Every new connection is switched to WAL with a busy timeout"""
+
+    def test_fresh_connections_are_tuned(self):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            self.skipTest('Needs a SQLite database file')
+        pragmas = {}
+
+        def read_pragmas():
+            # A new thread gets its own, newly created connection
+            try:
+                with connection.cursor() as cursor:
+                    for name in ('journal_mode', 'busy_timeout', 'synchronous'):
+                        pragmas[name] = cursor.execute(f'PRAGMA {name}').fetchone()[0]
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=read_pragmas)
+        thread.start()
+        thread.join()
+        self.assertEqual(pragmas['journal_mode'], 'wal')
+        self.assertEqual(pragmas['busy_timeout'], settings.QZMAN_SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(pragmas['synchronous'], 1)  # NORMAL
+
+        # WAL is a property of the file: even a connection Django did not open sees it
+        raw = sqlite3.connect(connection.settings_dict['NAME'])
+        try:
+            self.assertEqual(raw.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        finally:
+            raw.close()
+
+
+class QuizConsumerTest(TransactionTestCase):
+    """Drive the socket with the messages GameControl and Lobby actually send"""
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.quiz = Quiz.objects.create(title='Live', created_by=self.owner)
+        self.round = Round.objects.create(quiz=self.quiz, name='Prelims', type='MCQ', is_active=True)
+        question = QuestionBank.objects.create(
+            text='Capital of France?', type='MCQ', options=['Paris', 'Rome'], answer='Paris', category='Geo',
+        )
+        self.link = QuizQuestion.objects.create(round=self.round, question=question, order=0)
+        self.team = Team.objects.create(quiz=self.quiz, name='Owls')
+        self.token = team_token(self.quiz.pk, self.team.pk)
+
+    async def connect(self, user=None, query=''):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/quiz/{self.quiz.pk}/{query}')
+        communicator.scope['user'] = user or AnonymousUser()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await self.receive(communicator, 'STATE_SNAPSHOT')
+        return communicator
+
+    async def receive(self, communicator, msg_type):
+        """The next frame of msg_type, skipping others"""
+        while True:
+            message = json.loads(await communicator.receive_from(timeout=2))
+            if message['type'] == msg_type:
+                return message['data']
+
+    async def next_question(self, communicator):
+        # GameControl.nextQuestion
+        await communicator.send_to(text_data=json.dumps({'type': 'PHASE_CHANGE', 'data': {
+            'phase': 'QUESTION', 'questionIndex': 0,
+            'question': {'text': 'Capital of France?', 'category': 'Geo', 'difficulty': 'MEDIUM',
+                         'type': 'MCQ', 'options': ['Paris', 'Rome']},
+        }}))
+
+    async def send_team_message(self):
+        # What publish_summaries sends to each team's group
+        await get_channel_layer().group_send(team_group_name(self.quiz.pk, self.team.pk), {
+            'type': 'quiz_message', 'message_type': 'ROUND_SUMMARY', 'data': {'rank': 1},
+        })
+
+    async def test_projector_role_gets_bursts_as_one_batch(self):
+        # ProjectorView connects with ?role=projector and unpacks BATCH frames
+        projector = await self.connect(query='?role=projector')
+        layer = get_channel_layer()
+        for team_id in (1, 2):
+            await layer.group_send(f'quiz_{self.quiz.pk}', {
+                'type': 'quiz_message', 'message_type': 'ANSWER_SUBMISSION', 'data': {'team_id': team_id},
+            })
+        batch = await self.receive(projector, 'BATCH')
+        self.assertEqual(batch, {'kind': 'ANSWER_SUBMISSION', 'items': [{'team_id': 1}, {'team_id': 2}]})
+        await projector.disconnect()
+
+    async def test_creator_runs_the_game_without_a_role_parameter(self):
+        qm = await self.connect(self.owner)
+        lobby = await self.connect(query=f'?role=team&team_token={self.token}')
+        await self.next_question(qm)
+        state = await self.receive(qm, 'PHASE_CHANGE')
+        self.assertEqual((state['phase'], state['questionIndex'], state['input_open']), ('QUESTION', 0, True))
+        # Devices read the text from the round bundle; the reveal only names the question
+        self.assertEqual((await self.receive(lobby, 'PHASE_CHANGE'))['question'], {
+            'id': self.link.pk, 'options_shown': True,
+        })
+
+        # Lobby.submitAnswer
+        await lobby.send_to(text_data=json.dumps({'type': 'SUBMIT_ANSWER', 'data': {
+            'answer': 'Paris', 'team_token': self.token, 'team_name': 'Owls',
+        }}))
+        self.assertEqual(await self.receive(qm, 'ANSWER_SUBMISSION'), {'team_id': self.team.pk, 'status': 'submitted'})
+        self.assertEqual(await self.receive(qm, 'ADMIN_ANSWER_REVEAL'), {
+            'answer': 'Paris', 'team_name': 'Owls', 'team_id': self.team.pk,
+        })
+
+        await qm.send_to(text_data=json.dumps({'type': 'PHASE_CHANGE', 'data': {'phase': 'ANSWER'}}))
+        self.assertEqual((await self.receive(lobby, 'PHASE_CHANGE'))['question']['answer'], 'Paris')
+        await qm.disconnect()
+        await lobby.disconnect()
+
+    async def test_lobby_answers_are_graded_when_the_round_closes(self):
+        await Round.objects.filter(pk=self.round.pk).aupdate(settings={'negative_marks': 5})
+        hawks = await Team.objects.acreate(quiz=self.quiz, name='Hawks')
+        hawks_token = team_token(self.quiz.pk, hawks.pk)
+        qm = await self.connect(self.owner)
+        owls_lobby = await self.connect(query=f'?role=team&team_token={self.token}')
+        hawks_lobby = await self.connect(query=f'?role=team&team_token={hawks_token}')
+        await self.next_question(qm)
+        question = (await self.receive(owls_lobby, 'PHASE_CHANGE'))['question']
+        await self.receive(hawks_lobby, 'PHASE_CHANGE')
+
+        # Lobby.submitAnswer, with and without the question on screen
+        await owls_lobby.send_to(text_data=json.dumps({'type': 'SUBMIT_ANSWER', 'data': {
+            'answer': 'Paris', 'question_id': question['id'], 'team_token': self.token, 'team_name': 'Owls',
+        }}))
+        await hawks_lobby.send_to(text_data=json.dumps({'type': 'SUBMIT_ANSWER', 'data': {
+            'answer': 'Rome', 'team_token': hawks_token, 'team_name': 'Hawks',
+        }}))
+        revealed = 0
+        while revealed < 2:
+            # Back-to-back answers may reach the QM as one BATCH
+            message = json.loads(await qm.receive_from(timeout=2))
+            if message['type'] == 'ADMIN_ANSWER_REVEAL':
+                revealed += 1
+            elif message['type'] == 'BATCH' and message['data']['kind'] == 'ADMIN_ANSWER_REVEAL':
+                revealed += len(message['data']['items'])
+        for communicator in (qm, owls_lobby, hawks_lobby):
+            await communicator.disconnect()
+        answers = {
+            team_id: (question_id, answer)
+            async for team_id, question_id, answer in Submission.objects.values_list('team_id', 'question_id', 'answer')
+        }
+        self.assertEqual(answers, {self.team.pk: (self.link.pk, 'Paris'), hawks.pk: (self.link.pk, 'Rome')})
+
+        def close_round():
+            client = APIClient()
+            client.force_authenticate(self.owner)
+            return client.post(f'/api/rounds/{self.round.pk}/close/')
+
+        response = await database_async(close_round)()
+        self.assertEqual(response.status_code, 200)
+        scores = {team_id: score async for team_id, score in Team.objects.values_list('pk', 'score')}
+        self.assertEqual(scores, {self.team.pk: 10, hawks.pk: -5})
+        logged = {team_id: points async for team_id, points in ScoreLog.objects.values_list('team_id', 'points')}
+        self.assertEqual(logged, {self.team.pk: 10, hawks.pk: -5})
+
+    async def test_msgpack_only_when_the_subprotocol_is_negotiated(self):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/quiz/{self.quiz.pk}/', subprotocols=['qzman.msgpack.v1'],
+        )
+        communicator.scope['user'] = AnonymousUser()
+        connected, subprotocol = await communicator.connect()
+        self.assertEqual((connected, subprotocol), (True, 'qzman.msgpack.v1'))
+        frame = await communicator.receive_output(timeout=2)
+        self.assertEqual(wire.msgpack_codec().decode(frame['bytes'])[0], 'STATE_SNAPSHOT')
+        await communicator.disconnect()
+
+        # self.connect offers no subprotocol and reads JSON text frames
+        await (await self.connect()).disconnect()
+
+    async def test_unknown_quiz_is_refused_without_an_actor(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/quiz/{self.quiz.pk + 1}/')
+        communicator.scope['user'] = AnonymousUser()
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertNotIn(self.quiz.pk + 1, game._actors)
+
+    async def test_staff_controls_any_quiz(self):
+        staff = await User.objects.acreate(username='staff', is_staff=True)
+        qm = await self.connect(staff)
+        await self.next_question(qm)
+        self.assertEqual((await self.receive(qm, 'PHASE_CHANGE'))['phase'], 'QUESTION')
+        await qm.disconnect()
+
+    async def test_claiming_the_qm_role_grants_nothing(self):
+        stranger = await User.objects.acreate(username='stranger')
+        for user in (None, stranger):
+            socket = await self.connect(user, '?role=qm')
+            await self.next_question(socket)
+            self.assertEqual((await self.receive(socket, 'REJECTED'))['request'], 'PHASE_CHANGE')
+            await socket.send_to(text_data=json.dumps({'type': 'QM_COMMAND', 'data': {'command': 'ADVANCE'}}))
+            self.assertEqual((await self.receive(socket, 'REJECTED'))['request'], 'QM_COMMAND')
+            await socket.disconnect()
+
+    async def test_answers_are_rejected_until_input_opens(self):
+        lobby = await self.connect()
+        await lobby.send_to(text_data=json.dumps({'type': 'SUBMIT_ANSWER', 'data': {
+            'answer': 'Paris', 'team_id': self.team.pk, 'team_name': 'Owls',
+        }}))
+        self.assertEqual((await self.receive(lobby, 'REJECTED'))['reason'], 'Answers are closed')
+        self.assertFalse(await Submission.objects.aexists())
+        await lobby.disconnect()
+
+    async def test_a_named_team_id_is_not_trusted(self):
+        qm = await self.connect(self.owner)
+        await self.next_question(qm)
+        impostor = await self.connect(query=f'?role=team&team={self.team.pk}')
+        await self.send_team_message()
+        self.assertTrue(await impostor.receive_nothing(0.3))
+        with mock.patch.object(timing, 'record') as record:
+            await impostor.send_to(text_data=json.dumps({'type': 'SUBMIT_ANSWER', 'data': {
+                'answer': 'Paris', 'team_id': self.team.pk, 'team_name': 'Owls',
+            }}))
+            self.assertEqual((await self.receive(impostor, 'REJECTED'))['reason'], 'Join the quiz as a team first')
+        record.assert_not_called()
+        await impostor.disconnect()
+        await qm.disconnect()
+
+    async def test_only_a_token_for_this_quiz_joins_the_team_group(self):
+        other_quiz = await Quiz.objects.acreate(title='Other', created_by=self.owner)
+        forged = await self.connect(query=f'?role=team&team_token={team_token(other_quiz.pk, self.team.pk)}')
+        lobby = await self.connect(query=f'?role=team&team_token={self.token}')
+        await self.send_team_message()
+        self.assertEqual(await self.receive(lobby, 'ROUND_SUMMARY'), {'rank': 1})
+        self.assertTrue(await forged.receive_nothing(0.3))
+        await forged.disconnect()
+        await lobby.disconnect()
+
+    def test_joining_hands_out_a_team_token(self):
+        response = APIClient().post('/api/join/', {'access_code': self.quiz.code, 'team_name': 'Hawks'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(team_from_token(response.json()['token'], self.quiz.pk), response.json()['id'])
+        self.assertIsNone(team_from_token(response.json()['token'], self.quiz.pk + 1))
+
+    def test_a_taken_team_name_gets_no_token(self):
+        response = APIClient().post('/api/join/', {'access_code': self.quiz.code, 'team_name': 'Owls'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn('token', response.json())
+
+        # Two joins with one new name in the same batch: only the first gets the team
+        batch = [(self.quiz.pk, name, Future()) for name in ('Hawks', 'Hawks', 'Owls', 'Kites')]
+        join_batcher._flush(batch)
+        results = [future.result() for _, _, future in batch]
+        self.assertEqual([team and team.name for team in results], ['Hawks', None, None, 'Kites'])
+        self.assertEqual(Team.objects.filter(quiz=self.quiz).count(), 3)
+
+    def test_concurrent_joins_with_one_name_create_one_team(self):
+        if getattr(connection, 'is_in_memory_db', lambda: False)():
+            self.skipTest('Needs a test database that allows multiple connections')
+        results = []
+        start = threading.Barrier(8)
+
+        def join(index):
+            try:
+                start.wait()
+                # Half the devices race for one name, the rest pick their own
+                results.append((index, join_batcher.admit(self.quiz.pk, 'Hawks' if index % 2 else f'Team {index}')))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=join, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        hawks = [team for index, team in results if index % 2]
+        self.assertEqual(len(results), 8)
+        self.assertEqual(sum(team is not None for team in hawks), 1)
+        self.assertTrue(all(team is not None for index, team in results if not index % 2))
+        self.assertEqual(Team.objects.filter(quiz=self.quiz, name='Hawks').count(), 1)
+        self.assertEqual(Team.objects.filter(quiz=self.quiz).count(), 6)
+
+
+class QuizActorFailureTest(SimpleTestCase):
+    """A failure inside the actor must reach the caller, never leave it waiting"""
+
+    def setUp(self):
+        patcher = mock.patch.object(game, 'load_questions', return_value=([], None))
+        self.load_questions = patcher.start()
+        self.addCleanup(patcher.stop)
+        game._actors.clear()
+
+    async def test_broadcast_failure_still_answers_every_command(self):
+        actor = await game.get_actor(1)
+        with mock.patch.object(game.QuizActor, '_broadcast', side_effect=ChannelFull()), \
+                self.assertLogs('core.game', 'ERROR'):
+            snapshot = await asyncio.wait_for(actor.command('PHASE_CHANGE', {'phase': 'LEADERBOARD'}), 2)
+        self.assertEqual(snapshot['phase'], 'LEADERBOARD')
+        snapshot = await asyncio.wait_for(actor.command('PHASE_CHANGE', {'phase': 'ENDED'}), 2)
+        self.assertEqual(snapshot['phase'], 'ENDED')
+
+    async def test_unexpected_error_is_reported_as_a_command_error(self):
+        actor = await game.get_actor(1)
+        with mock.patch.object(game.QuizActor, '_apply', side_effect=KeyError('bug')), \
+                self.assertLogs('core.game', 'ERROR'):
+            with self.assertRaises(game.CommandError):
+                await asyncio.wait_for(actor.command('QM_COMMAND', {'command': 'ADVANCE'}), 2)
+        snapshot = await asyncio.wait_for(actor.command('PHASE_CHANGE', {'phase': 'LEADERBOARD'}), 2)
+        self.assertEqual(snapshot['phase'], 'LEADERBOARD')
+
+    async def test_failed_start_reaches_every_waiter_and_is_retried(self):
+        self.load_questions.side_effect = DatabaseError('locked')
+        results = await asyncio.wait_for(
+            asyncio.gather(game.get_actor(1), game.get_actor(1), return_exceptions=True), 2,
+        )
+        self.assertEqual([type(result) for result in results], [DatabaseError, DatabaseError])
+        self.load_questions.side_effect = None
+        actor = await asyncio.wait_for(game.get_actor(1), 2)
+        self.assertEqual(actor.snapshot()['phase'], game.IDLE)
+
+    @override_settings(QZMAN_ACTOR_IDLE_SECONDS=0.05)
+    async def test_idle_actors_are_dropped(self):
+        unused = await game.get_actor(1)
+        actor = await game.get_actor(2)
+        actor.attach()
+        await asyncio.sleep(0.1)
+        self.assertEqual(list(game._actors), [2])
+        self.assertTrue(unused._task.cancelled())
+
+        actor.detach()
+        actor.attach()
+        actor.detach()
+        await asyncio.sleep(0.1)
+        self.assertEqual(game._actors, {})
+        self.assertIsNot(await game.get_actor(2), actor)
+
+
+class MediaSourceTest(TransactionTestCase):
+    """Only web URLs, or files under QZMAN_MEDIA_IMPORT_ROOT, may reach the public media store"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        (self.root / 'import').mkdir()
+        (self.root / 'import' / 'logo.png').write_bytes(b'png')
+        (self.root / 'secret.txt').write_bytes(b'secret')
+
+    def test_local_files_are_refused_without_an_import_root(self):
+        for url in [f'file://{self.root}/secret.txt', str(self.root / 'secret.txt')]:
+            with self.assertRaises(media.MediaError):
+                media._open_source(url)
+
+    def test_only_files_under_the_import_root_are_read(self):
+        with override_settings(QZMAN_MEDIA_IMPORT_ROOT=self.root / 'import'):
+            with media._open_source(str(self.root / 'import' / 'logo.png')) as stream:
+                self.assertEqual(stream.read(), b'png')
+            for url in [f'file://{self.root}/secret.txt', str(self.root / 'import' / '..' / 'secret.txt')]:
+                with self.assertRaises(media.MediaError):
+                    media._open_source(url)
+
+    async def test_blobs_are_streamed_in_chunks(self):
+        body = bytes(range(256)) * 1024
+        with override_settings(QZMAN_MEDIA_STORE=self.root / 'store'):
+            digest, size = media._store_stream(io.BytesIO(body), 'bin')
+            url = media.asset_url(digest, 'bin')
+            client = AsyncClient()
+
+            response = await client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            self.assertEqual(response['Content-Length'], str(size))
+            chunks = [chunk async for chunk in response.streaming_content]
+            self.assertEqual(len(chunks), size // media.CHUNK_SIZE)
+            self.assertEqual(b''.join(chunks), body)
+
+            response = await client.get(url, headers={'Range': 'bytes=100-199'})
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], f'bytes 100-199/{size}')
+            self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), body[100:200])
+
+    def test_write_paths_reject_non_web_media_urls(self):
+        self.assertEqual(media.clean_media_url(' https://example.com/a.png '), 'https://example.com/a.png')
+        self.assertIsNone(media.clean_media_url(''))
+        with self.assertRaises(ingestion.IngestionError):
+            ingestion.build_question({'text': 'Q', 'answer': 'A', 'media_url': 'file:///etc/passwd'})
+
+        client = APIClient()
+        response = client.post('/api/quizzes/import_quiz/', {'title': 'Leak', 'rounds': [{'questions': [
+            {'question_details': {'text': 'Q', 'answer': 'A', 'media_url': '/etc/passwd'}},
+        ]}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Quiz.objects.exists())
+
+        client.force_authenticate(User.objects.create(username='qm', is_staff=True))
+        response = client.post('/api/questions/', {
+            'text': 'Q', 'answer': 'A', 'media_url': 'ftp://example.com/a.png',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('media_url', response.json())
+
+
+class ChangeWatcherTest(SimpleTestCase):
+    """A worker must see every other worker's announcement, whoever wrote last"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        patcher = mock.patch.dict(os.environ, {sharding.STATE_ENV: self.path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.callback = mock.Mock()
+        self.watcher = sharding.ChangeWatcher(self.path, self.callback, interval=60)
+
+    def announce_from(self, pid, count):
+        with open(os.path.join(self.path, str(pid)), 'w') as f:
+            f.write(str(count))
+
+    def test_own_announcements_are_ignored(self):
+        sharding.announce_change()
+        sharding.announce_change()
+        self.watcher.check()
+        self.callback.assert_not_called()
+
+    def test_another_worker_is_seen_even_when_this_one_wrote_last(self):
+        self.announce_from(1, 1)
+        sharding.announce_change()
+        self.watcher.check()
+        self.assertEqual(self.callback.call_count, 1)
+        self.watcher.check()
+        self.assertEqual(self.callback.call_count, 1)
+
+    def test_every_writer_advancing_counts(self):
+        self.announce_from(1, 1)
+        self.announce_from(2, 1)
+        self.watcher.check()
+        self.announce_from(2, 2)
+        self.watcher.check()
+        self.assertEqual(self.callback.call_count, 2)
+
+
+class AnswerMatchingTest(SimpleTestCase):
+
+    def test_normalize(self):
+        cases = {
+            'Nineteen forty seven': '1947',
+            'nineteen hundred and forty-seven': '1947',
+            'twenty twenty one': '2021',
+            'two thousand and nineteen': '2019',
+            'forty seven': '47',
+            'one two three': '1 2 3',
+            'one million two hundred thousand': '1200000',
+            'The Beatles': 'beatles',
+            'Crème brûlée & Co.': 'creme brulee and co',
+            'Henry VIII': 'henry 8',
+            'the 21st century': '21 century',
+            'Second World War': '2 world war',
+            '1,000,000': '1000000',
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(matching.normalize(text), expected)
+
+    def test_bounded_distance(self):
+        self.assertEqual(matching.bounded_distance('kitten', 'sitting', 5), 3)
+        self.assertEqual(matching.bounded_distance('same', 'same', 0), 0)
+        # Past the limit only limit + 1 is reported
+        self.assertEqual(matching.bounded_distance('kitten', 'sitting', 2), 3)
+        self.assertEqual(matching.bounded_distance('a', 'abcdef', 2), 3)
+
+    def test_match_near_and_no_match_thresholds(self):
+        grade = matching.grade_answer
+        self.assertEqual(grade('Nineteen forty seven', '1947').verdict, matching.MATCH)
+        self.assertEqual(grade('1948', '1947').verdict, matching.NO_MATCH)
+        # 'mississippi' (11 letters) forgives 2 edits as a match and 3 as near
+        self.assertEqual(grade('misisipi', 'Mississippi').verdict, matching.NEAR)
+        self.assertEqual(grade('missisipi', 'Mississippi').verdict, matching.MATCH)
+        self.assertEqual(grade('gandhi', 'Mahatma Gandhi').verdict, matching.NEAR)
+        self.assertEqual(grade('nehru', 'Mahatma Gandhi').verdict, matching.NO_MATCH)
+        self.assertEqual(grade('Paris', 'London / Paris').verdict, matching.MATCH)
+        self.assertEqual(grade('', 'Paris').verdict, matching.NO_MATCH)
+
+
+class ScoreLogReportTest(TransactionTestCase):
+    auth = {'Authorization': f'Basic {base64.b64encode(b"admin:secret").decode()}'}
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        quiz = Quiz.objects.create(title='Report', created_by=self.staff)
+        team = Team.objects.create(quiz=quiz, name='Team')
+        for points in range(1, 6):
+            apply_score_change(team.pk, points, 'Report test')
+
+    async def test_export_is_an_async_stream_of_pages(self):
+        client = AsyncClient()
+        with mock.patch.object(reports.iter_pages, '__defaults__', (2,)):
+            response = await client.get('/api/reports/score-log/?output=jsonl', headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        # Five rows in pages of two
+        self.assertEqual(len(chunks), 3)
+        rows = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+        self.assertEqual([row['points'] for row in rows], [1, 2, 3, 4, 5])
+
+    async def test_unknown_format_is_rejected_before_streaming(self):
+        client = AsyncClient()
+        response = await client.get('/api/reports/score-log/?output=xml', headers=self.auth)
+        self.assertEqual(response.status_code, 400)
+
+
+class QuestionIngestionTest(TransactionTestCase):
+
+    def rows(self, count, fail_at=None):
+        for number in range(1, count + 1):
+            if number == fail_at:
+                raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+            yield number, {'text': f'Question {number}', 'answer': 'A'}
+
+    def test_a_failure_reports_the_last_committed_position(self):
+        result = ingestion.ingest(self.rows(10, fail_at=6), batch_size=2)
+        self.assertIn('invalid start byte', result.error)
+        # Rows 1-4 went in; row 5 was read but never committed
+        self.assertEqual(result.position, 4)
+        self.assertEqual(QuestionBank.objects.count(), 4)
+
+        result = ingestion.ingest(self.rows(10), skip=result.position, batch_size=2)
+        self.assertIsNone(result.error)
+        self.assertEqual((result.position, result.created), (10, 6))
+
+    def test_database_errors_stop_the_run_with_its_position(self):
+        with mock.patch.object(QuestionBank.objects, 'bulk_create', side_effect=DatabaseError('locked')):
+            result = ingestion.ingest(self.rows(3), batch_size=2)
+        self.assertEqual(result.error, 'locked')
+        self.assertEqual(result.as_dict()['position'], 0)
+
+    def test_the_endpoint_returns_the_position_of_a_failed_upload(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        upload = io.BytesIO(b'text,answer\nFirst,A\nSecond,B\n\xff\xfe,C\n')
+        upload.name = 'questions.csv'
+        response = client.post('/api/questions/ingest/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Ingestion failed', response.json()['error'])
+        self.assertEqual(response.json()['position'], 0)
+
+
+class ProvisionViewTest(TransactionTestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in [[{'username': 'a'}], {'rows': 'alice'}]:
+            with self.subTest(body=body):
+                response = self.client.post('/api/provision/', body, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_a_file_that_is_not_utf8_is_rejected(self):
+        for name in ['users.csv', 'users.jsonl']:
+            with self.subTest(name=name):
+                upload = io.BytesIO(b'username\n\xff\xfe\x00bob\n')
+                upload.name = name
+                response = self.client.post('/api/provision/', {'file': upload}, format='multipart')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['details'], ['The file is not valid UTF-8'])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_csv_uploads_keep_line_breaks_inside_quoted_fields(self):
+        upload = SimpleUploadedFile('users.csv', b'\xef\xbb\xbfusername,first_name\r\n"bob","Bob\r\nJr"\r\n')
+        stream, fmt = provisioning.open_upload(upload)
+        rows = list(provisioning.parse_rows(stream, fmt))
+        self.assertEqual(rows, [{'username': 'bob', 'first_name': 'Bob\r\nJr'}])
+
+
+def _busy_in_executor(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ProfilerTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.profiler = profiling.Profiler(self.directory, interval=0.002, top_n=3, token=None)
+
+    async def test_executor_threads_are_sampled_and_saved_off_the_loop(self):
+        saved_on = []
+        save = self.profiler._save
+
+        def record(*args):
+            saved_on.append(threading.current_thread().name)
+            save(*args)
+
+        session = self.profiler.start('ws receive')
+        await database_async(_busy_in_executor)(0.1)
+        with mock.patch.object(self.profiler, '_save', side_effect=record):
+            self.profiler.stop(session)
+            for _ in range(200):
+                if saved_on:
+                    break
+                await asyncio.sleep(0.01)
+        self.assertEqual(saved_on, ['qzman-profiler'])
+        collapsed = (self.directory / 'ws_receive.collapsed').read_text()
+        self.assertIn('_busy_in_executor', collapsed)
+        self.assertTrue((self.directory / 'slow.txt').exists())
+
+
+class OutboxTest(SimpleTestCase):
+
+    async def test_a_failed_write_closes_the_connection(self):
+        written = []
+
+        async def write(msg_type, data):
+            if msg_type == 'BROKEN':
+                raise RuntimeError('socket gone')
+            written.append(msg_type)
+
+        on_failure = mock.AsyncMock()
+        outbox = Outbox(write, mock.AsyncMock(), on_failure, maxsize=10, overflow_seconds=1, policies={})
+        with self.assertLogs('core.outbox', 'ERROR'):
+            await outbox.put('FIRST', {})
+            await outbox.put('BROKEN', {})
+            await outbox.put('NEVER', {})
+            for _ in range(100):
+                if on_failure.await_count:
+                    break
+                await asyncio.sleep(0.01)
+        on_failure.assert_awaited_once()
+        self.assertEqual(written, ['FIRST'])
+        await outbox.put('AFTER', {})
+        self.assertEqual(len(outbox), 0)
+
+    async def test_a_batch_takes_the_policy_of_its_kind(self):
+        release = asyncio.Event()
+        written = []
+
+        async def write(msg_type, data):
+            await release.wait()
+            written.append((msg_type, data))
+
+        outbox = Outbox(write, mock.AsyncMock(), mock.AsyncMock(), maxsize=2, overflow_seconds=60, policies={
+            'ANSWER_SUBMISSION': 'drop_oldest', 'SCORE_UPDATE': 'latest',
+        })
+        await outbox.put('HOLD', {})
+        await asyncio.sleep(0)  # the writer is now stuck on HOLD
+        await outbox.put('BATCH', {'kind': 'SCORE_UPDATE', 'items': [1, 2]})
+        await outbox.put('SCORE_UPDATE', 3)
+        self.assertEqual(len(outbox), 1)
+        await outbox.put('BATCH', {'kind': 'ANSWER_SUBMISSION', 'items': [{'team_id': 1}, {'team_id': 2}]})
+        # Full: the droppable batch makes room for a reliable frame
+        await outbox.put('PHASE_CHANGE', {})
+        await outbox.put('BATCH', {'kind': 'ADMIN_ANSWER_REVEAL', 'items': [{}, {}]})
+        release.set()
+        for _ in range(100):
+            if len(written) == 4:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual([msg_type for msg_type, _ in written], ['HOLD', 'SCORE_UPDATE', 'PHASE_CHANGE', 'BATCH'])
+        self.assertEqual(written[3][1]['kind'], 'ADMIN_ANSWER_REVEAL')
+        outbox.close()
+
+
+class WireTest(SimpleTestCase):
+    """Frame codecs and the batching that happens before frames are encoded"""
+
+    def test_msgpack_round_trip(self):
+        codec = wire.negotiate(['qzman.msgpack.v1', 'qzman.json.v1'])
+        self.assertIs(codec, wire.msgpack_codec())
+        data = {'team_id': 3, 'answer': 'Café', 'options': ['A', 'B'], 'score': -5}
+        frame = codec.encode('SUBMIT_ANSWER', data)
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(codec.decode(frame), ('SUBMIT_ANSWER', data))
+        # Types without a code travel by name
+        self.assertEqual(codec.decode(codec.encode('NEW_TYPE', {})), ('NEW_TYPE', {}))
+        with self.assertRaises(wire.DecodeError):
+            codec.decode(b'\xc1')
+
+    def test_json_when_no_binary_codec_is_negotiated(self):
+        self.assertIs(wire.negotiate(None), wire.JSON)
+        self.assertIs(wire.negotiate(['something.else']), wire.JSON)
+        self.assertIs(wire.negotiate(['qzman.json.v1']), wire.NAMED_JSON)
+        with mock.patch.object(wire, 'msgpack_codec', return_value=None):
+            self.assertIs(wire.negotiate(['qzman.msgpack.v1']), wire.JSON)
+        frame = wire.JSON.encode('PHASE_CHANGE', {'phase': 'OPEN'})
+        self.assertEqual(json.loads(frame), {'type': 'PHASE_CHANGE', 'data': {'phase': 'OPEN'}})
+        self.assertEqual(wire.JSON.decode(frame), ('PHASE_CHANGE', {'phase': 'OPEN'}))
+        with self.assertRaises(wire.DecodeError):
+            wire.JSON.decode('[1, 2]')
+
+    async def test_batches_unpack_to_the_events_they_replace(self):
+        sent = []
+
+        async def send(msg_type, data):
+            sent.append((msg_type, data))
+
+        coalescer = Coalescer(send, 20, ['ANSWER_SUBMISSION', 'SCORE_DELTA'])
+        for team_id in (1, 2, 3):
+            await coalescer.push('ANSWER_SUBMISSION', {'team_id': team_id})
+        await coalescer.push('SCORE_DELTA', {'team_id': 1})
+        # Anything else flushes first, so order is kept
+        await coalescer.push('BUZZER_STATE', {'active': True})
+        self.assertEqual(sent, [
+            ('BATCH', {'kind': 'ANSWER_SUBMISSION', 'items': [{'team_id': 1}, {'team_id': 2}, {'team_id': 3}]}),
+            ('SCORE_DELTA', {'team_id': 1}),
+            ('BUZZER_STATE', {'active': True}),
+        ])
+        # What socket.ts unbatch() does, through the binary codec
+        codec = wire.msgpack_codec()
+        msg_type, data = codec.decode(codec.encode(*sent[0]))
+        self.assertEqual(msg_type, 'BATCH')
+        self.assertEqual(
+            [(data['kind'], item) for item in data['items']],
+            [('ANSWER_SUBMISSION', {'team_id': team_id}) for team_id in (1, 2, 3)],
+        )
+
+        await coalescer.push('ANSWER_SUBMISSION', {'team_id': 4})
+        await asyncio.sleep(0.05)
+        self.assertEqual(sent[-1], ('ANSWER_SUBMISSION', {'team_id': 4}))
+        coalescer.close()
+
+
+class RoundCacheTest(TransactionTestCase):
+
+    def setUp(self):
+        quiz = Quiz.objects.create(title='Cached', created_by=User.objects.create(username='qm'))
+        self.round = Round.objects.create(quiz=quiz, name='Prelims', type='MCQ')
+        self.question = QuestionBank.objects.create(text='Capital of France?', type='MCQ', answer='Paris')
+        self.link = QuizQuestion.objects.create(round=self.round, question=self.question, order=0)
+        self.cache = roundcache.RoundCache()
+
+    def test_rounds_are_loaded_once(self):
+        with self.assertNumQueries(2):
+            data = self.cache.get(self.round.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(self.cache.get(self.round.pk), data)
+            self.assertEqual(self.cache.question(self.link.pk).text, 'Capital of France?')
+        self.assertIsNone(self.cache.get(self.round.pk + 1))
+
+    def test_invalidation_by_round_and_by_question(self):
+        data = self.cache.get(self.round.pk)
+        self.cache.invalidate(round_id=self.round.pk)
+        self.assertFalse(self.cache.is_current(data))
+        data = self.cache.get(self.round.pk)
+        self.cache.invalidate(quiz_question_id=self.link.pk)
+        self.assertFalse(self.cache.is_current(data))
+        data = self.cache.get(self.round.pk)
+        self.cache.invalidate()
+        self.assertFalse(self.cache.is_current(data))
+
+    def test_a_load_overtaken_by_an_edit_is_not_cached(self):
+        load_round = roundcache.load_round
+
+        def load_during_edit(round_id):
+            data = load_round(round_id)
+            self.cache.invalidate(round_id=round_id)
+            return data
+
+        with mock.patch.object(roundcache, 'load_round', side_effect=load_during_edit):
+            data = self.cache.get(self.round.pk)
+        self.assertEqual(data.id, self.round.pk)
+        self.assertFalse(self.cache.is_current(data))
+
+    def test_edits_reach_the_shared_cache(self):
+        roundcache.rounds.invalidate()
+        self.assertEqual(roundcache.rounds.get(self.round.pk).questions[0].text, 'Capital of France?')
+        self.question.text = 'Capital of Italy?'
+        self.question.save()
+        self.assertEqual(roundcache.rounds.get(self.round.pk).questions[0].text, 'Capital of Italy?')
+
+    def test_a_round_deleted_mid_request_is_a_404(self):
+        client = APIClient()
+        with mock.patch.object(roundcache.rounds, 'get', return_value=None):
+            for method, action in [('post', 'close'), ('get', 'standings'), ('get', 'suggestions')]:
+                with self.subTest(action=action):
+                    response = getattr(client, method)(f'/api/rounds/{self.round.pk}/{action}/')
+                    self.assertEqual(response.status_code, 404)
+
+
+class RecordingReplayTest(SimpleTestCase):
+    """Recordings keep no team tokens; replay signs new ones for the quiz it drives"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'traffic.qzrec'
+
+    def record(self, subprotocol=None):
+        recorder = recording.Recorder(self.path)
+        token = team_token(5, 7)
+        connection = recorder.open_connection({
+            'path': '/ws/quiz/5/',
+            'query_string': f'role=team&team_token={token}&profile=secret'.encode(),
+            'url_route': {'kwargs': {'quiz_id': '5'}},
+        }, subprotocol)
+        codec = wire.negotiate([subprotocol] if subprotocol else [])
+        recorder.received(connection, json.dumps({'type': 'SUBMIT_ANSWER', 'data': {
+            'answer': 'Paris', 'team_token': token,
+        }}), None)
+        if codec.binary:
+            recorder.received(connection, None, codec.encode('SUBMIT_ANSWER', {'answer': 'Rome', 'team_token': token}))
+        recorder.received(connection, '{"type": "PING"}', None)
+        recorder.close_connection(connection, 1000)
+        recorder.close()
+        self.assertNotIn(token.encode(), self.path.read_bytes())
+        self.assertNotIn(b'secret', self.path.read_bytes())
+
+    def test_round_trip_mints_tokens_for_the_target_quiz(self):
+        self.record(wire.MSGPACK_SUBPROTOCOL)
+        script, = replay.load_scripts(self.path, quiz_map={'5': '9'}, team_map={'7': '3'})
+        self.assertEqual(script.path, '/ws/quiz/9/')
+        query = dict(parse_qsl(script.query))
+        self.assertEqual(query['role'], 'team')
+        self.assertEqual(team_from_token(query['team_token'], 9), 3)
+
+        text, binary, ping = script.sends
+        msg_type, data = wire.JSON.decode(text[2].decode())
+        self.assertEqual((msg_type, data['answer'], team_from_token(data['team_token'], 9)), ('SUBMIT_ANSWER', 'Paris', 3))
+        self.assertTrue(binary[1])
+        msg_type, data = script.codec.decode(binary[2])
+        self.assertEqual((msg_type, data['answer'], team_from_token(data['team_token'], 9)), ('SUBMIT_ANSWER', 'Rome', 3))
+        self.assertEqual(ping[2], b'{"type": "PING"}')
+
+    def test_same_ids_without_maps(self):
+        self.record()
+        script, = replay.load_scripts(self.path)
+        self.assertEqual(team_from_token(dict(parse_qsl(script.query))['team_token'], 5), 7)
+        self.assertEqual(team_from_token(json.loads(script.sends[0][2])['data']['team_token'], 5), 7)
+
+
+class ReaderTest(TransactionTestCase):
+    """FastReadMixin endpoints must return exactly what their serializers would"""
+
+    def setUp(self):
+        owner = User.objects.create(username='owner')
+        asset = MediaAsset.objects.create(sha256='a' * 64, ext='png', content_type='image/png', size=1)
+        self.full = Quiz.objects.create(title='Full', created_by=owner, scheduled_at=timezone.now())
+        # No rounds, teams or schedule
+        self.empty = Quiz.objects.create(title='Empty', created_by=owner)
+        with_media = QuestionBank.objects.create(
+            text='Whose flag?', type='MCQ', options=['A', 'B'], answer='A', category='Flags', media_asset=asset,
+        )
+        plain = QuestionBank.objects.create(text='Capital of Peru?', answer='Lima', category='Geo')
+        QuestionBank.objects.create(text='Unused', answer='-', category='Geo')
+        prelims = Round.objects.create(quiz=self.full, name='Prelims', type='MCQ', order=0)
+        Round.objects.create(quiz=self.full, name='Empty round', type='BUZZER', order=1)
+        QuizQuestion.objects.create(round=prelims, question=plain, order=1, points=5)
+        QuizQuestion.objects.create(round=prelims, question=with_media, order=0)
+        Team.objects.create(quiz=self.full, name='Owls', user=User.objects.create(username='owls'))
+        Team.objects.create(quiz=self.full, name='Hawks')
+
+    def assertMatchesSerializer(self, path, serializer_class, queryset):
+        client = APIClient()
+        expected = json.loads(JSONRenderer().render(serializer_class(queryset, many=True).data))
+        self.assertEqual(client.get(path).json(), expected)
+        for item in expected:
+            with self.subTest(path=path, id=item['id']):
+                self.assertEqual(client.get(f'{path}{item["id"]}/').json(), item)
+
+    def test_quizzes(self):
+        self.assertMatchesSerializer('/api/quizzes/', QuizSerializer, Quiz.objects.all())
+
+    def test_question_bank(self):
+        self.assertMatchesSerializer('/api/questions/', QuestionBankSerializer, QuestionBank.objects.all())
+
+    def test_teams(self):
+        self.assertMatchesSerializer('/api/teams/', TeamSerializer, Team.objects.all())
+
+    def test_fields_parameter_limits_the_output(self):
+        response = APIClient().get(f'/api/quizzes/{self.empty.pk}/?fields=id,title,teams')
+        self.assertEqual(response.json(), {'id': self.empty.pk, 'title': 'Empty', 'teams': []})
+        self.assertEqual(APIClient().get('/api/teams/?fields=nope').status_code, 400)
+
+
+class CloningTest(TransactionTestCase):
+    """Clones copy rounds, links, questions and media references, and never touch the source"""
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        asset = MediaAsset.objects.create(sha256='b' * 64, ext='jpg', content_type='image/jpeg', size=1)
+        self.quiz = Quiz.objects.create(title='Finals', created_by=self.owner, description='Season 3')
+        self.round = Round.objects.create(
+            quiz=self.quiz, name='Pictures', type='MCQ', order=0, is_active=True, settings={'negative_marks': 5},
+        )
+        Round.objects.create(quiz=self.quiz, name='Buzzer', type='BUZZER', order=1)
+        picture = QuestionBank.objects.create(
+            text='Which bridge?', type='MEDIA', answer='Tower Bridge', category='Places',
+            media_url='https://example.com/bridge.jpg', media_asset=asset, options=['Tower Bridge', 'Golden Gate'],
+        )
+        plain = QuestionBank.objects.create(text='Capital of Peru?', answer='Lima', category='Geo', aliases=['Lima, Peru'])
+        QuizQuestion.objects.create(round=self.round, question=picture, order=0, points=20)
+        QuizQuestion.objects.create(round=self.round, question=plain, order=1)
+        self.source = self.contents(self.quiz)
+
+    def contents(self, quiz, with_ids=True):
+        """A quiz's rounds with their links and questions, in play order"""
+        rounds = []
+        for round_obj in Round.objects.filter(quiz=quiz).order_by('order', 'id'):
+            links = []
+            for link in QuizQuestion.objects.filter(round=round_obj).select_related('question').order_by('order', 'id'):
+                question = link.question
+                links.append({
+                    'order': link.order, 'points': link.points,
+                    'question': {
+                        'text': question.text, 'type': question.type, 'options': question.options,
+                        'answer': question.answer, 'aliases': question.aliases, 'media_url': question.media_url,
+                        'media_asset': question.media_asset_id, 'fingerprint': question.fingerprint,
+                    },
+                    **({'id': link.pk, 'question_id': question.pk} if with_ids else {}),
+                })
+            rounds.append({
+                'name': round_obj.name, 'type': round_obj.type, 'order': round_obj.order,
+                'settings': round_obj.settings, 'links': links,
+                **({'id': round_obj.pk, 'is_active': round_obj.is_active} if with_ids else {}),
+            })
+        return rounds
+
+    def question_ids(self, quiz):
+        return set(QuizQuestion.objects.filter(round__quiz=quiz).values_list('question_id', flat=True))
+
+    def test_quiz_clone_shares_bank_questions(self):
+        copy = cloning.clone_quiz(self.quiz)
+        self.assertNotEqual(copy.pk, self.quiz.pk)
+        self.assertEqual((copy.title, copy.description, copy.is_active), ('Finals (Copy)', 'Season 3', False))
+        self.assertNotEqual(copy.code, self.quiz.code)
+        self.assertEqual(self.contents(copy, with_ids=False), self.contents(self.quiz, with_ids=False))
+        source_rounds = {item['id'] for item in self.source}
+        self.assertFalse(source_rounds & set(Round.objects.filter(quiz=copy).values_list('pk', flat=True)))
+        self.assertFalse(Round.objects.filter(quiz=copy, is_active=True).exists())
+        self.assertEqual(self.question_ids(copy), self.question_ids(self.quiz))
+        self.assertEqual(self.contents(self.quiz), self.source)
+
+    def test_quiz_clone_can_copy_bank_questions(self):
+        copy = cloning.clone_quiz(self.quiz, title='Finals 2', clone_questions=True)
+        self.assertEqual(copy.title, 'Finals 2')
+        self.assertEqual(self.contents(copy, with_ids=False), self.contents(self.quiz, with_ids=False))
+        self.assertFalse(self.question_ids(copy) & self.question_ids(self.quiz))
+        self.assertTrue(all(QuizQuestion.objects.filter(round__quiz=copy).values_list('is_cloned', flat=True)))
+        self.assertEqual(QuestionBank.objects.count(), 4)
+        self.assertEqual(self.contents(self.quiz), self.source)
+
+    def test_round_clone_goes_to_the_end_of_a_quiz(self):
+        copy = cloning.clone_round(self.round, clone_questions=True)
+        self.assertEqual((copy.quiz_id, copy.name, copy.order, copy.is_active), (self.quiz.pk, 'Pictures (Copy)', 2, False))
+        cloned, = [item for item in self.contents(self.quiz, with_ids=False) if item['name'] == 'Pictures (Copy)']
+        original = self.contents(self.quiz, with_ids=False)[0]
+        self.assertEqual(cloned['links'], original['links'])
+        self.assertEqual(cloned['settings'], original['settings'])
+        self.assertEqual(self.contents(self.quiz)[:2], self.source)
+
+        other = Quiz.objects.create(title='Other', created_by=self.owner)
+        moved = cloning.clone_round(self.round, quiz=other)
+        self.assertEqual((moved.quiz_id, moved.name, moved.order), (other.pk, 'Pictures', 0))
+        self.assertEqual(self.question_ids(other), {link['question_id'] for link in self.source[0]['links']})
+
+
+class RoundBundleTest(TransactionTestCase):
+    """Bundles revalidate with ETags and change whenever a question is edited"""
+
+    def setUp(self):
+        quiz = Quiz.objects.create(title='Bundled', created_by=User.objects.create(username='qm'))
+        self.round = Round.objects.create(quiz=quiz, name='Prelims', type='MCQ')
+        self.question = QuestionBank.objects.create(
+            text='Capital of France?', type='MCQ', options=['Paris', 'Rome'], answer='Paris', category='Geo',
+        )
+        QuizQuestion.objects.create(round=self.round, question=self.question)
+        self.url = f'/api/rounds/{self.round.pk}/bundle/'
+
+    def test_matching_etag_is_not_modified(self):
+        client = APIClient()
+        response = client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        bundle = json.loads(gzip.decompress(response.content))
+        self.assertEqual(bundle['questions'][0]['text'], 'Capital of France?')
+        self.assertNotIn('answer', bundle['questions'][0])
+
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_editing_a_question_changes_the_etag(self):
+        client = APIClient()
+        etag = client.get(self.url)['ETag']
+        with mock.patch.object(game, 'mark_stale', wraps=game.mark_stale) as mark_stale:
+            self.question.text = 'Capital of Italy?'
+            self.question.save()
+        mark_stale.assert_called()
+
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['questions'][0]['text'], 'Capital of Italy?')
+
+
+class QuizFeedTest(TransactionTestCase):
+    """SSE and long-poll clients see the projector's events; unused taps stop"""
+
+    def setUp(self):
+        self.quiz = Quiz.objects.create(title='Fed', created_by=User.objects.create(username='qm'))
+        feed._feeds.clear()
+        self.addCleanup(feed._feeds.clear)
+
+    async def publish(self, msg_type, data):
+        # Give the feed's tap a moment to join the group first
+        await asyncio.sleep(0.05)
+        await get_channel_layer().group_send(f'quiz_{self.quiz.pk}', {
+            'type': 'quiz_message', 'message_type': msg_type, 'data': data,
+        })
+
+    def parse_sse(self, chunk):
+        return [json.loads(line[len('data: '):]) for line in chunk.decode().splitlines() if line.startswith('data: ')]
+
+    async def test_sse_streams_a_snapshot_then_events(self):
+        response = await AsyncClient().get(f'/api/quizzes/{self.quiz.pk}/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await asyncio.wait_for(anext(stream), 2), b'retry: 2000\n\n')
+        snapshot, = self.parse_sse(await asyncio.wait_for(anext(stream), 2))
+        self.assertEqual(snapshot['type'], 'STATE_SNAPSHOT')
+
+        await self.publish('PHASE_CHANGE', {'phase': 'OPEN'})
+        event, = self.parse_sse(await asyncio.wait_for(anext(stream), 2))
+        self.assertEqual((event['id'], event['type'], event['data']), (snapshot['id'] + 1, 'PHASE_CHANGE', {'phase': 'OPEN'}))
+        self.assertEqual(feed.get_feed(self.quiz.pk).subscribers, 1)
+        await stream.aclose()
+
+    async def test_long_poll_waits_for_the_next_event(self):
+        client = AsyncClient()
+        first = (await client.get(f'/api/quizzes/{self.quiz.pk}/poll/')).json()
+        self.assertEqual([event['type'] for event in first['events']], ['STATE_SNAPSHOT'])
+
+        response = await client.get(f'/api/quizzes/{self.quiz.pk}/poll/?last_id={first["last_id"]}&timeout=0')
+        self.assertEqual(response.json(), {'last_id': first['last_id'], 'events': []})
+
+        publisher = asyncio.ensure_future(self.publish('TIMER_UPDATE', {'remaining': 30}))
+        response = await client.get(f'/api/quizzes/{self.quiz.pk}/poll/?last_id={first["last_id"]}&timeout=2')
+        await publisher
+        body = response.json()
+        self.assertEqual([(event['type'], event['data']) for event in body['events']], [('TIMER_UPDATE', {'remaining': 30})])
+        self.assertEqual(body['last_id'], first['last_id'] + 1)
+        self.assertEqual((await client.get('/api/quizzes/0/poll/')).status_code, 404)
+
+    @override_settings(QZMAN_FEED={**settings.QZMAN_FEED, 'IDLE_SECONDS': 0.05})
+    async def test_a_feed_nobody_reads_stops(self):
+        tap = feed.get_feed(self.quiz.pk)
+        await asyncio.sleep(0.1)
+        self.assertIsNone(tap._task)
+        self.assertNotIn(self.quiz.pk, feed._feeds)
+
+        tap = feed.get_feed(self.quiz.pk)
+        stream = tap.stream()
+        await anext(stream)
+        await asyncio.sleep(0.1)
+        self.assertIsNotNone(tap._task)
+        await stream.aclose()
+        await asyncio.sleep(0.1)
+        self.assertIsNone(tap._task)
+        self.assertIsNot(feed.get_feed(self.quiz.pk), tap)
+
+
+class StaticFilesAppTest(SimpleTestCase):
+    """Built files are served ahead of Django, with the right variant and caching"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.write('index.html', b'<html>v1</html>')
+        self.write('assets/index-BkL2x7Qa.js', b'console.log(1)')
+        self.write('assets/index-BkL2x7Qa.js.gz', b'gzipped')
+        self.write('assets/index-BkL2x7Qa.js.br', b'brotli')
+        self.write('api/notes.txt', b'shadowed')
+        self.django = mock.AsyncMock()
+        self.app = assets.StaticFilesApp(
+            self.django, mounts=[{'PREFIX': '/', 'ROOT': self.root, 'SPA': True}], passthrough=['/api/'],
+        )
+
+    def write(self, name, content):
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return path
+
+    async def get(self, path, **headers):
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path,
+            'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()],
+        }
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await self.app(scope, mock.AsyncMock(), send)
+        if not messages:
+            return None, {}, None
+        start = messages[0]
+        return (
+            start['status'],
+            {name.decode(): value.decode() for name, value in start['headers']},
+            b''.join(message.get('body', b'') for message in messages[1:]),
+        )
+
+    async def test_accept_encoding_picks_the_variant(self):
+        cases = [
+            ('gzip, br', 'br', b'brotli'),
+            ('gzip', 'gzip', b'gzipped'),
+            ('br;q=0, gzip', 'gzip', b'gzipped'),
+            ('identity', None, b'console.log(1)'),
+            ('', None, b'console.log(1)'),
+        ]
+        for accept, encoding, body in cases:
+            with self.subTest(accept=accept):
+                status, headers, content = await self.get('/assets/index-BkL2x7Qa.js', accept_encoding=accept)
+                self.assertEqual((status, headers.get('content-encoding'), content), (200, encoding, body))
+                self.assertEqual(headers['content-length'], str(len(body)))
+                self.assertEqual(headers['cache-control'], assets.IMMUTABLE)
+                self.assertEqual(headers['vary'], 'Accept-Encoding')
+
+    async def test_matching_etag_is_not_modified(self):
+        status, headers, _ = await self.get('/')
+        self.assertEqual((status, headers['cache-control']), (200, assets.REVALIDATE))
+        status, _, body = await self.get('/', if_none_match=f'"other", {headers["etag"]}')
+        self.assertEqual((status, body), (304, b''))
+
+    async def test_spa_routes_load_index_and_passthrough_reaches_django(self):
+        status, _, body = await self.get('/play/lobby')
+        self.assertEqual((status, body), (200, b'<html>v1</html>'))
+        self.django.assert_not_awaited()
+
+        for path in ('/api/notes.txt', '/missing.js'):
+            with self.subTest(path=path):
+                self.django.reset_mock()
+                self.assertEqual(await self.get(path), (None, {}, None))
+                self.django.assert_awaited_once()
+                self.assertEqual(self.django.await_args.args[0]['path'], path)
+
+    async def test_a_rebuild_is_served_without_a_restart(self):
+        _, headers, _ = await self.get('/')
+        index = self.write('index.html', b'<html>version 2</html>')
+        os.utime(index, ns=(time.time_ns() + 10**9,) * 2)
+        status, new_headers, body = await self.get('/')
+        self.assertEqual((status, body), (200, b'<html>version 2</html>'))
+        self.assertNotEqual(new_headers['etag'], headers['etag'])
+
+        self.write('assets/index-Zz9Yy8Xx.js', b'console.log(2)')
+        with mock.patch.object(assets, 'RESCAN_SECONDS', 0):
+            status, _, body = await self.get('/assets/index-Zz9Yy8Xx.js')
+        self.assertEqual((status, body), (200, b'console.log(2)'))
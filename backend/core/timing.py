@@ -0,0 +1,124 @@
+import struct
+import sys
+import threading
+from array import array
+
+from django.db import DatabaseError, transaction
+
+from .models import RoundTimings
+
+ANSWER = 0
+BUZZ = 1
+MAGIC = b'QZRT'
+HEADER = struct.Struct('<4sI')  # magic, entry count
+
+
+class ResponseTimes:
+    """A round's response times as parallel arrays, one entry per team and question.
+
+    Milliseconds run from the moment answers opened for the question to the
+    team's first answer or buzz; later attempts by the same team are
+    ignored, as for Submissions. Serialised as the raw little-endian arrays
+    (13 bytes an entry) into RoundTimings.data.
+    """
+    __slots__ = ('round_id', 'teams', 'questions', 'millis', 'kinds', '_seen')
+
+    def __init__(self, round_id):
+        self.round_id = round_id
+        self.teams = array('i')
+        self.questions = array('i')
+        self.millis = array('I')
+        self.kinds = array('B')
+        self._seen = set()
+
+    def __len__(self):
+        return len(self.teams)
+
+    def __contains__(self, team_question):
+        return team_question in self._seen
+
+    def record(self, team_id, question_id, millis, kind=ANSWER):
+        """Add a team's first response to a question; False if it already has one"""
+        if (team_id, question_id) in self._seen:
+            return False
+        self._seen.add((team_id, question_id))
+        self.teams.append(team_id)
+        self.questions.append(question_id)
+        self.millis.append(max(0, int(millis)))
+        self.kinds.append(kind)
+        return True
+
+    def merge(self, other):
+        for entry in zip(other.teams, other.questions, other.millis, other.kinds):
+            self.record(*entry)
+
+    def to_bytes(self):
+        parts = [HEADER.pack(MAGIC, len(self))]
+        for values in (self.teams, self.questions, self.millis, self.kinds):
+            if sys.byteorder == 'big' and values.itemsize > 1:
+                values = array(values.typecode, values)
+                values.byteswap()
+            parts.append(values.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, round_id, data):
+        times = cls(round_id)
+        data = bytes(data or b'')
+        if len(data) < HEADER.size:
+            return times
+        magic, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            return times
+        offset = HEADER.size
+        for values in (times.teams, times.questions, times.millis, times.kinds):
+            size = count * values.itemsize
+            values.frombytes(data[offset:offset + size])
+            if sys.byteorder == 'big' and values.itemsize > 1:
+                values.byteswap()
+            offset += size
+        times._seen.update(zip(times.teams, times.questions))
+        return times
+
+
+_lock = threading.Lock()
+_unsaved = {}
+
+
+def record(round_id, team_id, question_id, millis, kind=ANSWER):
+    """Note a response in this process; it reaches the database with flush()"""
+    with _lock:
+        times = _unsaved.get(round_id)
+        if times is None:
+            times = _unsaved[round_id] = ResponseTimes(round_id)
+        return times.record(team_id, question_id, millis, kind)
+
+
+def flush(round_id):
+    """Merge this process's unsaved responses for a round into its stored times"""
+    with _lock:
+        pending = _unsaved.pop(round_id, None)
+    if pending is None or not len(pending):
+        return
+    try:
+        with transaction.atomic():
+            row, _ = RoundTimings.objects.select_for_update().get_or_create(round_id=round_id)
+            times = ResponseTimes.from_bytes(round_id, row.data)
+            times.merge(pending)
+            row.data = times.to_bytes()
+            row.save(update_fields=['data', 'updated_at'])
+    except DatabaseError:
+        # Keep them for the next flush
+        with _lock:
+            current = _unsaved.get(round_id)
+            if current is not None:
+                pending.merge(current)
+            _unsaved[round_id] = pending
+        raise
+
+
+def load(round_id):
+    """All stored response times of a round, after saving any held by this process"""
+    flush(round_id)
+    data = RoundTimings.objects.filter(round_id=round_id).values_list('data', flat=True).first()
+    return ResponseTimes.from_bytes(round_id, data)
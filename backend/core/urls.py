@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 
@@ -6,11 +6,23 @@ router = DefaultRouter()
 router.register(r'quizzes', views.QuizViewSet)
 router.register(r'questions', views.QuestionBankViewSet)
 router.register(r'teams', views.TeamViewSet)
+router.register(r'rounds', views.RoundViewSet)
 
 urlpatterns = [
     path('auth/login/', views.login_view, name='login'),
     path('auth/logout/', views.logout_view, name='logout'),
     path('auth/me/', views.me_view, name='me'),
     path('auth/csrf/', views.csrf_token, name='csrf'),
+    path('join/', views.join_view, name='join'),
+    path('provision/', views.provision_view, name='provision'),
+    path('health/', views.health_view, name='health'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('profiling/', views.profiling_view, name='profiling'),
+    path('reports/score-log/', views.score_log_report, name='score-log-report'),
+    path('reports/score-summary/', views.score_summary, name='score-summary'),
+    re_path(r'^media/(?P<digest>[0-9a-f]{64})\.(?P<ext>[a-z0-9]+)$', views.media_file, name='media-file'),
+    path('rounds/<int:pk>/bundle/', views.round_bundle, name='round-bundle'),
+    path('quizzes/<int:quiz_id>/events/', views.quiz_events, name='quiz-events'),
+    path('quizzes/<int:quiz_id>/poll/', views.quiz_poll, name='quiz-poll'),
     path('', include(router.urls)),
 ]
@@ -1,14 +1,36 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import action, api_view, permission_classes, parser_classes
+from rest_framework.permissions import BasePermission, IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from django.http import HttpResponse
+import mimetypes
+import os
+from django.http import HttpResponse, StreamingHttpResponse, HttpResponseNotModified, Http404
+from django.conf import settings
+from django.views.decorators.http import require_safe
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.middleware.csrf import get_token
 from .models import Quiz, QuestionBank, Team, Round, QuizQuestion, ScoreLog
-from .serializers import QuizSerializer, QuestionBankSerializer, TeamSerializer
+from .serializers import QuizSerializer, QuestionBankSerializer, TeamSerializer, RoundSerializer, ScoreLogSerializer
+from .grading import grade_mcq_round
+from .matching import suggest_round
+from .scoring import apply_score_change, ScoreChangeError
+from .broadcast import broadcast
+from .admission import join_codes, join_batcher, team_token
+from . import provisioning
+from . import media
+from . import bundles
+from .rounds import activate_round
+from . import metrics
+from . import reports
+from . import ingestion
+from . import cloning
+from .profiling import profiler
+from .sharding import WORKER_ENV
+from .feed import get_feed
+from .readers import UnknownFields, question_bank_reader, quiz_reader, team_reader
+from .standings import publish_summaries, round_standings
 
 from django.views.decorators.csrf import csrf_exempt
 
@@ -76,16 +98,232 @@ def me_view(request):
 def csrf_token(request):
     return Response({'csrfToken': get_token(request)})
 
-class QuizViewSet(viewsets.ModelViewSet):
+def admit_team(data, quiz_pk=None):
+    """Resolve the access code through the join-code cache and admit the team"""
+    name = (data.get('team_name') or '').strip()
+    if not name:
+        return Response({'error': 'Team Name is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(name) > Team._meta.get_field('name').max_length:
+        return Response({'error': 'Team Name is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+    quiz_id = join_codes.resolve(data.get('access_code'))
+    if quiz_id is None or (quiz_pk is not None and str(quiz_id) != str(quiz_pk)):
+        return Response({'error': 'Invalid Access Code'}, status=status.HTTP_403_FORBIDDEN)
+
+    team = join_batcher.admit(quiz_id, name)
+    if team is None:
+        # Whoever created the team holds its token; rejoining needs the team login
+        return Response({'error': 'Team Name is already taken'}, status=status.HTTP_409_CONFLICT)
+    # The device presents the token on its socket to act for this team
+    return Response({**TeamSerializer(team).data, 'token': team_token(quiz_id, team.pk)})
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def join_view(request):
+    """Join a quiz by its access code alone"""
+    return admit_team(request.data)
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser, FormParser, JSONParser])
+def provision_view(request):
+    """Bulk-create users, groups and teams from a CSV/JSONL file or a JSON `rows` list.
+    Responds with the credentials as a streamed CSV."""
+    if not isinstance(request.data, dict):
+        return Response({'error': 'Expected an object with a file or rows'}, status=status.HTTP_400_BAD_REQUEST)
+    if 'file' in request.data:
+        rows = provisioning.parse_rows(*provisioning.open_upload(request.data['file']))
+    elif isinstance(request.data.get('rows') or [], list):
+        rows = (provisioning.clean_row(row) for row in request.data.get('rows') or [])
+    else:
+        return Response({'error': 'rows must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        credentials = provisioning.provision(rows)
+    except provisioning.ProvisioningError as e:
+        return Response({'error': 'Provisioning failed', 'details': e.errors},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(provisioning.credentials_csv(credentials), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="credentials.csv"'
+    return response
+
+@require_safe
+def media_file(request, digest, ext):
+    """Serve a stored media blob with Range support and immutable caching"""
+    path = media.asset_path(digest, ext)
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        raise Http404('Unknown media')
+
+    etag = f'"{digest}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        try:
+            byte_range = media.parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        start, end = byte_range or (0, size - 1)
+        response = StreamingHttpResponse(
+            media.aread_range(path, start, end), status=200 if byte_range is None else 206, content_type=content_type,
+        )
+        response['Content-Length'] = end - start + 1
+        if byte_range is not None:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    # Content-addressed, so a URL's bytes never change
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@require_safe
+def round_bundle(request, pk):
+    """A round's questions (without answers) for devices to cache ahead of the round"""
+    bundle = bundles.get_bundle(pk)
+    if bundle is None:
+        raise Http404('Unknown round')
+
+    etag = f'"{bundle.etag}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(bundle.compressed, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(bundle.decompressed(), content_type='application/json')
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    # The URL is stable while the content changes on edit: always revalidate
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def _event_id(value):
+    return int(value) if value and value.isdigit() else None
+
+@require_safe
+async def quiz_events(request, quiz_id):
+    """The projector's event sequence as Server-Sent Events, for venues where WebSockets break"""
+    if not await Quiz.objects.filter(pk=quiz_id).aexists():
+        raise Http404('Unknown quiz')
+    last_id = _event_id(request.headers.get('Last-Event-ID') or request.GET.get('last_id'))
+    feed = get_feed(quiz_id)
+    response = StreamingHttpResponse(
+        feed.stream(last_id, settings.QZMAN_FEED['KEEPALIVE_SECONDS']), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx and similar from holding events back in a buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_safe
+async def quiz_poll(request, quiz_id):
+    """Long-poll form of quiz_events: events after ?last_id=, waiting up to ?timeout= seconds
+    for one. Without last_id, or when it is too old, the reply is a fresh STATE_SNAPSHOT."""
+    if not await Quiz.objects.filter(pk=quiz_id).aexists():
+        raise Http404('Unknown quiz')
+    limit = settings.QZMAN_FEED['POLL_TIMEOUT']
+    try:
+        timeout = min(max(float(request.GET.get('timeout', limit)), 0), limit)
+    except ValueError:
+        timeout = limit
+    last_id, events = await get_feed(quiz_id).poll(_event_id(request.GET.get('last_id')), timeout)
+    body = f'{{"last_id": {last_id}, "events": [{", ".join(event.text for event in events)}]}}'
+    response = HttpResponse(body, content_type='application/json')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def score_log_report(request):
+    """Stream ScoreLog rows as CSV or JSONL (?output=), filtered by
+    quiz, round, team, awarded_by and a since/until window"""
+    fmt = request.query_params.get('output', 'csv')
+    try:
+        rows = reports.astream(reports.filtered_logs(request.query_params), fmt)
+    except reports.ReportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(rows, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="score-log.{fmt}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def score_summary(request):
+    """Per-team and per-round ScoreLog totals, with the same filters as the report"""
+    try:
+        queryset = reports.filtered_logs(request.query_params)
+    except reports.ReportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(reports.summary(queryset))
+
+@api_view(['GET', 'POST', 'DELETE'])
+@permission_classes([IsAdminUser])
+def profiling_view(request):
+    """POST {seconds} opens a profiling window, DELETE closes it and writes the report"""
+    if request.method == 'POST':
+        try:
+            seconds = float(request.data.get('seconds', 60))
+        except (TypeError, ValueError):
+            return Response({'error': 'seconds must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        profiler.enable(min(max(seconds, 0), 3600))
+    elif request.method == 'DELETE':
+        profiler.disable()
+    return Response(profiler.status())
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def health_view(request):
+    """Liveness check used by the serve_sharded supervisor"""
+    return Response({'status': 'ok', 'worker': os.environ.get(WORKER_ENV), 'pid': os.getpid()})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """In-process counters, e.g. WebSocket send queue depths and drops"""
+    return Response(metrics.snapshot())
+
+class FastReadMixin:
+    """list and retrieve rendered by a core.readers.Reader (same JSON as serializer_class,
+    built from values_list rows); ?fields=a,b limits the top-level fields"""
+    reader = None
+
+    def read(self, queryset):
+        fields = self.request.query_params.get('fields')
+        fields = [name.strip() for name in fields.split(',') if name.strip()] if fields else None
+        return self.reader.rows(queryset, fields)
+
+    def list(self, request, *args, **kwargs):
+        try:
+            return Response(self.read(self.filter_queryset(self.get_queryset())))
+        except UnknownFields as e:
+            return Response({'error': f'Unknown fields: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        try:
+            return Response(self.read(self.get_queryset().filter(pk=instance.pk))[0])
+        except UnknownFields as e:
+            return Response({'error': f'Unknown fields: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+class QuizViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = Quiz.objects.all()
     serializer_class = QuizSerializer
+    reader = quiz_reader
 
     @action(detail=True, methods=['get'])
     def export_data(self, request, pk=None):
         """Export Quiz and all related data to JSON"""
         quiz = self.get_object()
-        serializer = self.get_serializer(quiz)
-        data = serializer.data
+        data = quiz_reader.rows(Quiz.objects.filter(pk=quiz.pk))[0]
         
         # We start by initializing the response content
         import json
@@ -116,6 +354,14 @@ class QuizViewSet(viewsets.ModelViewSet):
         if not data:
             return Response({'error': 'No data provided'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Media URLs are later fetched into the public media store: web URLs only
+        try:
+            for rnd in data.get('rounds', []):
+                for q_item in rnd.get('questions', []):
+                    media.clean_media_url((q_item.get('question_details') or {}).get('media_url'))
+        except media.MediaError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Start manual import process
         try:
              # 1. Create Quiz
@@ -157,7 +403,7 @@ class QuizViewSet(viewsets.ModelViewSet):
                             'category': q_details.get('category', 'General'),
                             'tags': q_details.get('tags', []),
                             'difficulty': q_details.get('difficulty', 'MEDIUM'),
-                            'media_url': q_details.get('media_url')
+                            'media_url': media.clean_media_url(q_details.get('media_url'))
                         }
                      )
                      
@@ -178,28 +424,28 @@ class QuizViewSet(viewsets.ModelViewSet):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     @action(detail=True, methods=['post'])
-    def join(self, request, pk=None):
-        """Allow a team to join via access code"""
+    def clone(self, request, pk=None):
+        """Copy this quiz with its rounds and question links; `clone_questions` also copies the bank rows"""
         quiz = self.get_object()
-        code = request.data.get('access_code')
-        name = request.data.get('team_name')
-
-        if not name:
-            return Response({'error': 'Team Name is required'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if code != quiz.code:
-             return Response({'error': 'Invalid Access Code'}, status=status.HTTP_403_FORBIDDEN)
+        copy = cloning.clone_quiz(
+            quiz,
+            title=request.data.get('title'),
+            created_by=request.user if request.user.is_authenticated else None,
+            clone_questions=str(request.data.get('clone_questions', '')).lower() in ('1', 'true'),
+        )
+        return Response(self.get_serializer(copy).data, status=status.HTTP_201_CREATED)
 
-        # Check if team already exists/verify logic here
-        # For now, minimal logic
-        team, created = Team.objects.get_or_create(quiz=quiz, name=name)
-        return Response(TeamSerializer(team).data)
+    @action(detail=True, methods=['post'])
+    def join(self, request, pk=None):
+        """Allow a team to join via access code"""
+        return admit_team(request.data, quiz_pk=pk)
 
 from .ai import generate_questions_from_topic
 
-class QuestionBankViewSet(viewsets.ModelViewSet):
+class QuestionBankViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = QuestionBank.objects.all()
     serializer_class = QuestionBankSerializer
+    reader = question_bank_reader
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
@@ -228,6 +474,127 @@ class QuestionBankViewSet(viewsets.ModelViewSet):
 
         return Response(QuestionBankSerializer(created_questions, many=True).data)
 
-class TeamViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser],
+            parser_classes=[MultiPartParser, FormParser])
+    def ingest(self, request):
+        """Bulk-load questions from an uploaded CSV/JSONL `file`; duplicates are skipped.
+        After a failure, resend the file with `skip` set to the returned position."""
+        if 'file' not in request.data:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            skip = int(request.data.get('skip') or 0)
+        except ValueError:
+            return Response({'error': 'skip must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        result = ingestion.ingest(ingestion.read_rows(*ingestion.open_upload(request.data['file'])), skip=skip)
+        if result.error is not None:
+            return Response(
+                {**result.as_dict(), 'error': f'Ingestion failed: {result.error}'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(result.as_dict(), status=status.HTTP_201_CREATED if result.created else status.HTTP_200_OK)
+
+class IsScoreManager(BasePermission):
+    """Staff, or members of the Score Manager group"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        return user.is_staff or user.is_superuser or user.groups.filter(name='Score Manager').exists()
+
+class TeamViewSet(FastReadMixin, viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
+    reader = team_reader
+
+    @action(detail=True, methods=['post'], permission_classes=[IsScoreManager])
+    def adjust_score(self, request, pk=None):
+        """Manual score change; a reason is mandatory and recorded in the ledger"""
+        team = self.get_object()
+        try:
+            points = int(request.data.get('points'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Points must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        round_obj = None
+        if request.data.get('round'):
+            round_obj = Round.objects.filter(pk=request.data['round'], quiz_id=team.quiz_id).first()
+
+        try:
+            log = apply_score_change(
+                team.pk, points, request.data.get('reason'),
+                awarded_by=request.user, round=round_obj,
+            )
+        except ScoreChangeError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        broadcast(team.quiz_id, 'SCORE_DELTA', {
+            'team_id': team.pk, 'points': log.points, 'score': log.new_score,
+        })
+        return Response(ScoreLogSerializer(log).data, status=status.HTTP_201_CREATED)
+
+class RoundViewSet(viewsets.ModelViewSet):
+    queryset = Round.objects.all()
+    serializer_class = RoundSerializer
+
+    @action(detail=True, methods=['post'])
+    def activate(self, request, pk=None):
+        """Make this the live round; clients are told to prefetch its media"""
+        round_obj = self.get_object()
+        activate_round(round_obj)
+        return Response(self.get_serializer(round_obj).data)
+
+    @action(detail=True, methods=['post'])
+    def close(self, request, pk=None):
+        """End a round, auto-grade its MCQ submissions and send teams their summaries"""
+        round_obj = self.get_object()
+        if round_obj.is_active:
+            round_obj.is_active = False
+            round_obj.save(update_fields=['is_active'])
+
+        user = request.user if request.user.is_authenticated else None
+        summary = grade_mcq_round(round_obj, awarded_by=user)
+        if summary is None:
+            # Deleted while this request was running
+            raise Http404('Unknown round')
+        # Each team's device gets its post-round card
+        publish_summaries(round_obj.pk)
+        return Response(summary)
+
+    @action(detail=True, methods=['get'])
+    def standings(self, request, pk=None):
+        """Score-then-time ranking, per-question response-time percentiles and team cards"""
+        round_obj = self.get_object()
+        standings = round_standings(round_obj.pk)
+        if standings is None:
+            raise Http404('Unknown round')
+        return Response(standings)
+
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """Copy this round to the end of its quiz, or of `quiz`; `clone_questions` also copies the bank rows"""
+        round_obj = self.get_object()
+        quiz = None
+        if request.data.get('quiz'):
+            try:
+                quiz = Quiz.objects.filter(pk=int(request.data['quiz'])).first()
+            except (TypeError, ValueError):
+                quiz = None
+            if quiz is None:
+                return Response({'error': 'Quiz not found'}, status=status.HTTP_400_BAD_REQUEST)
+        copy = cloning.clone_round(
+            round_obj,
+            quiz=quiz,
+            name=request.data.get('name'),
+            clone_questions=str(request.data.get('clone_questions', '')).lower() in ('1', 'true'),
+        )
+        return Response(self.get_serializer(copy).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def suggestions(self, request, pk=None):
+        """Match / near / no-match suggestions for typed answers; ?all=1 includes graded ones"""
+        round_obj = self.get_object()
+        include_graded = request.query_params.get('all') in ('1', 'true')
+        suggestions = suggest_round(round_obj, include_graded=include_graded)
+        if suggestions is None:
+            raise Http404('Unknown round')
+        return Response(suggestions)
@@ -0,0 +1,112 @@
+import json
+
+# Subprotocol names offered in the WebSocket handshake. Clients that do not ask
+# for one keep getting the original JSON text frames.
+JSON_SUBPROTOCOL = 'qzman.json.v1'
+MSGPACK_SUBPROTOCOL = 'qzman.msgpack.v1'
+
+# Short integer codes for the message types we send most. Codes are part of the
+# wire format: only ever append new ones, never renumber.
+TYPE_CODES = {
+    'PHASE_CHANGE': 1,
+    'ANSWER_SUBMISSION': 2,
+    'ADMIN_ANSWER_REVEAL': 3,
+    'SUBMIT_ANSWER': 4,
+    'SCORE_UPDATE': 5,
+    'BUZZER_UPDATE': 6,
+    'BUZZER_STATE': 7,
+    'TIMER_UPDATE': 8,
+    'BATCH': 9,
+    'SCORE_DELTA': 10,
+    'MEDIA_PREFETCH': 11,
+    'ROUND_BUNDLE': 12,
+    'STATE_SNAPSHOT': 13,
+    'QM_COMMAND': 14,
+    'REJECTED': 15,
+    'ROUND_SUMMARY': 16,
+}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+
+class DecodeError(ValueError):
+    pass
+
+
+class JSONCodec:
+    """The original `{"type": ..., "data": ...}` text frames."""
+    subprotocol = None
+    binary = False
+
+    def encode(self, msg_type, data):
+        return json.dumps({'type': msg_type, 'data': data})
+
+    def decode(self, raw):
+        try:
+            message = json.loads(raw)
+        except (TypeError, ValueError) as e:
+            raise DecodeError(str(e))
+        if not isinstance(message, dict):
+            raise DecodeError('Frame must be an object')
+        return message.get('type'), message.get('data', {})
+
+
+class NamedJSONCodec(JSONCodec):
+    """JSON frames for clients that negotiate the subprotocol explicitly."""
+    subprotocol = JSON_SUBPROTOCOL
+
+
+class MsgPackCodec:
+    """Binary `[type_code, data]` frames.
+
+    Types without a code are sent by name, so new message types work before
+    they are given a code.
+    """
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    def __init__(self, msgpack):
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def encode(self, msg_type, data):
+        return self._packb([TYPE_CODES.get(msg_type, msg_type), data])
+
+    def decode(self, raw):
+        try:
+            message = self._unpackb(raw)
+        except Exception as e:
+            raise DecodeError(str(e))
+        if not isinstance(message, (list, tuple)) or not message:
+            raise DecodeError('Frame must be a [type, data] array')
+        msg_type = message[0]
+        data = message[1] if len(message) > 1 else {}
+        return TYPE_NAMES.get(msg_type, msg_type), data
+
+
+JSON = JSONCodec()
+NAMED_JSON = NamedJSONCodec()
+_msgpack_codec = None
+
+
+def msgpack_codec():
+    """Return the MessagePack codec, or None when msgpack is not installed."""
+    global _msgpack_codec
+    if _msgpack_codec is None:
+        try:
+            import msgpack
+        except ImportError:
+            return None
+        _msgpack_codec = MsgPackCodec(msgpack)
+    return _msgpack_codec
+
+
+def negotiate(subprotocols):
+    """Pick a codec from the client's offered subprotocols, in its order of preference."""
+    for name in subprotocols or ():
+        if name == MSGPACK_SUBPROTOCOL:
+            codec = msgpack_codec()
+            if codec is not None:
+                return codec
+        elif name == JSON_SUBPROTOCOL:
+            return NAMED_JSON
+    return JSON
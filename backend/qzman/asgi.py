@@ -1,16 +1,17 @@
 import os
-import django
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'qzman.settings')
-django.setup()
+# Sets Django up; must run before anything below imports models
+django_asgi_app = get_asgi_application()
 
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import core.routing
+from core.assets import StaticFilesApp
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": StaticFilesApp(django_asgi_app),
     "websocket": AuthMiddlewareStack(
         URLRouter(
             core.routing.websocket_urlpatterns
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -89,6 +90,30 @@ CHANNEL_LAYERS = {
     }
 }
 
+# WebSocket event coalescing. Clients declare their recipient class with
+# ?role=projector|qm|team; events of the listed types arriving within the
+# window (milliseconds, 0 disables) are sent as one BATCH frame per type.
+QZMAN_COALESCE_WINDOWS = {
+    'projector': 50,
+    'qm': 50,
+    'team': 0,
+}
+QZMAN_COALESCE_TYPES = ['ANSWER_SUBMISSION', 'ADMIN_ANSWER_REVEAL', 'SCORE_DELTA']
+
+# Per-connection outbound queue. Message types not listed in POLICIES are
+# 'reliable'. A client over capacity for OVERFLOW_SECONDS is disconnected.
+QZMAN_SEND_QUEUE = {
+    'MAXSIZE': 64,
+    'OVERFLOW_SECONDS': 5,
+    'POLICIES': {
+        'TIMER_UPDATE': 'drop_oldest',
+        'ANSWER_SUBMISSION': 'drop_oldest',
+        'SCORE_DELTA': 'drop_oldest',
+        'SCORE_UPDATE': 'latest',
+        'STATE_SNAPSHOT': 'latest',
+    },
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -96,10 +121,38 @@ CHANNEL_LAYERS = {
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('QZMAN_DB_NAME') or BASE_DIR / 'db.sqlite3',
+        # Keep connections open; consumer DB work runs on a small fixed pool
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # Take the write lock at BEGIN so transactions wait on busy_timeout
+        # instead of failing when they upgrade from read to write
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # A file rather than in-memory, so concurrency tests can use threads
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Applied to every new SQLite connection (see core.db.apply_sqlite_pragmas)
+QZMAN_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,  # ms
+    'synchronous': 'NORMAL',
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -16000,  # KiB
+}
+
+# Threads in the executor that runs WebSocket consumer database work
+QZMAN_DB_WORKERS = 4
+
+# Processes used to hash passwords during bulk provisioning (None: all CPUs)
+QZMAN_PROVISION_WORKERS = None
+
+# Team joins that queue up behind an insert are admitted together, up to MAX_SIZE per insert
+QZMAN_JOIN_BATCH = {
+    'MAX_SIZE': 100,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -136,6 +189,77 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Directories served by core.assets.StaticFilesApp ahead of Django;
+# run `manage.py compress_assets` after a build to precompress them
+QZMAN_STATIC_MOUNTS = [
+    {'PREFIX': '/static/', 'ROOT': STATIC_ROOT},
+    {'PREFIX': '/scholar/', 'ROOT': BASE_DIR.parent / 'scholar'},
+    {'PREFIX': '/', 'ROOT': BASE_DIR.parent / 'frontend' / 'dist', 'SPA': True},
+]
+# Paths that always go to Django, even when the SPA mount could answer
+QZMAN_STATIC_PASSTHROUGH = ['/api/', '/admin/', '/ws/']
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Sampling profiler (core.profiling): off until an admin opens a window via
+# /api/profiling/, or a request sends TOKEN in HEADER (?profile= for sockets)
+QZMAN_PROFILING = {
+    'DIR': BASE_DIR / 'profiles',
+    'INTERVAL_MS': 5,
+    'TOP_N': 10,
+    'HEADER': 'X-Qzman-Profile',
+    'TOKEN': os.getenv('QZMAN_PROFILE_TOKEN', ''),
+}
+
+# WebSocket traffic recording for replay (see core.recording and the
+# replay_traffic command). Off unless a directory is given; each worker
+# process writes its own file there.
+QZMAN_RECORDING = {
+    'DIR': os.getenv('QZMAN_RECORD_DIR') or None,
+    'FLUSH_SECONDS': 1.0,
+}
+
+# Seconds a quiz's game actor (core.game) is kept after its last socket
+# leaves; the next connection after that starts the game state from IDLE
+QZMAN_ACTOR_IDLE_SECONDS = 900
+
+# SSE and long-poll feed of a quiz's projector events (see core.feed).
+# BUFFER events are kept for clients resuming with Last-Event-ID; the tap
+# stops IDLE_SECONDS after the last client leaves. Times are in seconds.
+QZMAN_FEED = {
+    'BUFFER': 500,
+    'KEEPALIVE_SECONDS': 15.0,
+    'POLL_TIMEOUT': 25.0,
+    'IDLE_SECONDS': 60.0,
+}
+
+# serve_sharded: worker processes behind a proxy that routes each quiz's
+# sockets and REST calls to one worker (see core.supervisor). Workers
+# listen on 127.0.0.1:WORKER_PORT+n; intervals are in seconds.
+QZMAN_SHARDING = {
+    'WORKERS': os.cpu_count() or 1,
+    'WORKER_PORT': 9100,
+    'HEALTH_INTERVAL': 2.0,
+    'HEALTH_TIMEOUT': 2.0,
+    'HEALTH_FAILURES': 3,
+    # How long requests for a restarting worker's quizzes wait for it
+    'RESTART_WAIT': 10.0,
+    # How often workers check for content changed by another worker
+    'WATCH_INTERVAL': 0.2,
+}
+
+# Local content-addressed store for question media (see core.media)
+QZMAN_MEDIA_STORE = MEDIA_ROOT / 'store'
+QZMAN_MEDIA_MAX_BYTES = 200 * 1024 * 1024
+QZMAN_MEDIA_FETCH_TIMEOUT = 30  # seconds
+# Local directory that media may also be ingested from by path; None allows http(s) URLs only
+QZMAN_MEDIA_IMPORT_ROOT = None
+# Downscaled image variants for phones: name -> max width in pixels
+QZMAN_MEDIA_VARIANTS = {
+    'phone': 720,
+}
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -15,7 +15,7 @@ export async function fetchAPI(endpoint: string, options: RequestInit = {}) {
 
     if (!res.ok) {
         const error = await res.json().catch(() => ({}));
-        throw new Error(error.detail || 'API Request Failed');
+        throw new Error(error.detail || error.error || 'API Request Failed');
     }
 
     return res.json();
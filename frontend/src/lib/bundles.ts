@@ -0,0 +1,43 @@
+import { fetchAPI } from './api';
+
+export interface BundledQuestion {
+    id: number;
+    order: number;
+    points: number;
+    text: string;
+    type: string;
+    options: string[];
+    category: string;
+    difficulty: string;
+    media: string | null;
+}
+
+interface RoundBundle {
+    round: { id: number; quiz: number; name: string; type: string };
+    questions: BundledQuestion[];
+}
+
+// Live reveals only name a question; its text and options come from the round
+// bundle, fetched once per round (ROUND_BUNDLE announces it ahead of play)
+const bundles = new Map<number, Promise<RoundBundle>>();
+
+export function loadRoundBundle(roundId: number): Promise<RoundBundle> {
+    let bundle = bundles.get(roundId);
+    if (!bundle) {
+        bundle = fetchAPI(`/rounds/${roundId}/bundle/`);
+        // A failed download is retried on the next reveal
+        bundle.catch(() => bundles.delete(roundId));
+        bundles.set(roundId, bundle);
+    }
+    return bundle;
+}
+
+// After an edit the server announces a new ETag; the next lookup revalidates
+export function forgetRoundBundle(roundId: number) {
+    bundles.delete(roundId);
+}
+
+export async function bundledQuestion(roundId: number, questionId: number): Promise<BundledQuestion | null> {
+    const bundle = await loadRoundBundle(roundId);
+    return bundle.questions.find((question) => question.id === questionId) ?? null;
+}
@@ -0,0 +1,21 @@
+export type SocketRole = 'projector' | 'qm' | 'team';
+
+export interface QuizMessage {
+    type: string;
+    data: any;
+}
+
+// The role picks which events the server sends and whether bursts of them are
+// coalesced into BATCH frames (projector and quiz master screens)
+export function quizSocketUrl(quizId: string | number | undefined, role: SocketRole) {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    return `${protocol}//${window.location.hostname}:8000/ws/quiz/${quizId}/?role=${role}`;
+}
+
+// A BATCH frame carries several events of one kind as {kind, items}
+export function unbatch(msg: QuizMessage): QuizMessage[] {
+    if (msg.type !== 'BATCH') {
+        return [msg];
+    }
+    return msg.data.items.map((item: any) => ({ type: msg.data.kind, data: item }));
+}
@@ -5,6 +5,7 @@ import { Button } from '../../components/ui/Button';
 import { Card } from '../../components/ui/Card';
 import { Badge } from '../../components/ui/FormControls';
 import { fetchAPI } from '../../lib/api';
+import { quizSocketUrl, unbatch } from '../../lib/socket';
 import { SkipForward, Eye, Award, Users } from 'lucide-react';
 
 export default function GameControl() {
@@ -32,8 +33,7 @@ export default function GameControl() {
     };
 
     const connectWebSocket = () => {
-        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.hostname}:8000/ws/quiz/${id}/`;
+        const wsUrl = quizSocketUrl(id, 'qm');
 
         console.log('Connecting to', wsUrl);
         const ws = new WebSocket(wsUrl);
@@ -44,8 +44,7 @@ export default function GameControl() {
         };
 
         ws.onmessage = (event) => {
-            const msg = JSON.parse(event.data);
-            handleMessage(msg);
+            unbatch(JSON.parse(event.data)).forEach(handleMessage);
         };
 
         ws.onclose = () => {
@@ -58,11 +57,15 @@ export default function GameControl() {
     };
 
     const handleMessage = (msg: any) => {
-        if (msg.type === 'PHASE_CHANGE') {
+        // STATE_SNAPSHOT arrives on (re)connect with the same shape as PHASE_CHANGE
+        if (msg.type === 'PHASE_CHANGE' || msg.type === 'STATE_SNAPSHOT') {
             setCurrentPhase(msg.data.phase);
-            if (msg.data.questionIndex !== undefined) {
+            if (msg.data.questionIndex !== undefined && msg.data.questionIndex !== null) {
                 setCurrentQuestionIndex(msg.data.questionIndex);
             }
+        } else if (msg.type === 'REJECTED') {
+            // Commands need a staff login or the quiz's creator
+            alert(`Rejected: ${msg.data.reason}`);
         }
     };
 
@@ -2,6 +2,8 @@ import { motion, AnimatePresence } from 'framer-motion';
 import { useEffect, useState, useRef } from 'react';
 import { useParams } from 'react-router-dom';
 import { Trophy, Clock, Bell } from 'lucide-react';
+import { quizSocketUrl, unbatch } from '../../lib/socket';
+import { bundledQuestion, forgetRoundBundle, loadRoundBundle } from '../../lib/bundles';
 
 interface Team {
     name: string;
@@ -66,35 +68,51 @@ export default function ProjectorView() {
     const wsRef = useRef<WebSocket | null>(null);
 
     useEffect(() => {
-        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.hostname}:8000/ws/quiz/${quizId}/`;
-
-        const ws = new WebSocket(wsUrl);
+        const ws = new WebSocket(quizSocketUrl(quizId, 'projector'));
 
         ws.onmessage = (event) => {
-            const msg = JSON.parse(event.data);
-            if (msg.type === 'PHASE_CHANGE') {
-                setGameState((prev) => ({
-                    ...prev,
-                    phase: msg.data.phase,
-                    currentQuestion: msg.data.question || prev.currentQuestion
-                }));
-            } else if (msg.type === 'SCORE_UPDATE') {
-                setGameState((prev) => ({
-                    ...prev,
-                    teams: msg.data.teams || prev.teams
-                }));
-            } else if (msg.type === 'BUZZER_UPDATE') {
-                setGameState((prev) => ({
-                    ...prev,
-                    buzzer: msg.data
-                }));
-            } else if (msg.type === 'TIMER_UPDATE') {
-                setGameState((prev) => ({
-                    ...prev,
-                    timer: msg.data.remaining
-                }));
-            }
+            unbatch(JSON.parse(event.data)).forEach((msg) => {
+                if (msg.type === 'PHASE_CHANGE') {
+                    const state = msg.data;
+                    setGameState((prev) => ({ ...prev, phase: state.phase }));
+                    // The reveal names the question; its text comes from the round bundle
+                    if (state.question && state.round_id != null) {
+                        bundledQuestion(state.round_id, state.question.id).then((question) => {
+                            if (!question) {
+                                return;
+                            }
+                            setGameState((prev) => ({
+                                ...prev,
+                                currentQuestion: {
+                                    text: question.text,
+                                    category: question.category,
+                                    difficulty: question.difficulty,
+                                    number: (state.questionIndex ?? 0) + 1,
+                                    options: state.question.options_shown ? question.options : undefined,
+                                },
+                            }));
+                        }).catch(() => undefined);
+                    }
+                } else if (msg.type === 'ROUND_BUNDLE') {
+                    forgetRoundBundle(msg.data.round_id);
+                    loadRoundBundle(msg.data.round_id).catch(() => undefined);
+                } else if (msg.type === 'SCORE_UPDATE') {
+                    setGameState((prev) => ({
+                        ...prev,
+                        teams: msg.data.teams || prev.teams
+                    }));
+                } else if (msg.type === 'BUZZER_UPDATE') {
+                    setGameState((prev) => ({
+                        ...prev,
+                        buzzer: msg.data
+                    }));
+                } else if (msg.type === 'TIMER_UPDATE') {
+                    setGameState((prev) => ({
+                        ...prev,
+                        timer: msg.data.remaining
+                    }));
+                }
+            });
         };
 
         wsRef.current = ws;
@@ -40,7 +40,8 @@ export default function JoinQuiz() {
 
         } catch (error) {
             console.error(error);
-            alert('Failed to join. Check code or connection.');
+            // e.g. the team name is already taken
+            alert(error instanceof Error ? error.message : 'Failed to join. Check code or connection.');
         } finally {
             setLoading(false);
         }
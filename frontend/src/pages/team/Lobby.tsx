@@ -2,8 +2,11 @@ import { useEffect, useState, useRef } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { Loader2, Wifi, Send, CheckCircle, Clock, Eye, HelpCircle, Maximize } from 'lucide-react';
 import { Button } from '../../components/ui/Button';
+import { quizSocketUrl, unbatch, type QuizMessage } from '../../lib/socket';
+import { bundledQuestion, forgetRoundBundle, loadRoundBundle } from '../../lib/bundles';
 
 interface Question {
+    id: number;
     text: string;
     category: string;
     difficulty: string;
@@ -15,6 +18,9 @@ interface TeamData {
     id: number;
     name: string;
     score: number;
+    quiz: number;
+    // Issued on join; proves to the socket which team this device plays for
+    token: string;
 }
 
 interface Stats {
@@ -44,19 +50,22 @@ export default function Lobby() {
     });
 
     const wsRef = useRef<WebSocket | null>(null);
+    // The question the latest reveal named, while its bundle may still be loading
+    const shownRef = useRef<number | null>(null);
 
     useEffect(() => {
         const stored = localStorage.getItem('team');
-        if (stored) {
-            setTeam(JSON.parse(stored));
-        }
-        connectWebSocket();
+        const storedTeam: TeamData | null = stored ? JSON.parse(stored) : null;
+        setTeam(storedTeam);
+        connectWebSocket(storedTeam);
         return () => wsRef.current?.close();
     }, []);
 
-    const connectWebSocket = () => {
-        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.hostname}:8000/ws/quiz/1/`;
+    const connectWebSocket = (joined: TeamData | null) => {
+        let wsUrl = quizSocketUrl(joined?.quiz ?? 1, 'team');
+        if (joined?.token) {
+            wsUrl += `&team_token=${encodeURIComponent(joined.token)}`;
+        }
 
         const ws = new WebSocket(wsUrl);
 
@@ -65,45 +74,78 @@ export default function Lobby() {
         };
 
         ws.onmessage = (event) => {
-            const msg = JSON.parse(event.data);
-            if (msg.type === 'PHASE_CHANGE') {
-                setPhase(msg.data.phase);
-                if (msg.data.phase === 'QUESTION') {
-                    setCurrentQuestion(msg.data.question);
-                    setSubmitted(false);
-                    setAnswer('');
-                    setSelectedOption(null);
-                    setStatus('Question Active!');
-                } else if (msg.data.phase === 'ANSWER') {
-                    setStatus('Answer Revealed');
-                } else if (msg.data.phase === 'ENDED') {
-                    setStatus('Quiz Ended');
-                } else {
-                    setStatus('Waiting...');
-                }
-            } else if (msg.type === 'BUZZER_STATE') {
-                setBuzzerOpen(msg.data.active);
-                if (msg.data.active) {
-                    // Vibrate if supported
-                    if (navigator.vibrate) {
-                        navigator.vibrate([100, 50, 100]);
-                    }
-                }
-            } else if (msg.type === 'TIMER_UPDATE') {
-                setTimer(msg.data.remaining);
-            }
+            unbatch(JSON.parse(event.data)).forEach(handleMessage);
         };
 
         wsRef.current = ws;
     };
 
+    const handleMessage = (msg: QuizMessage) => {
+        // STATE_SNAPSHOT (sent on connect) catches late joiners up to the current phase
+        if (msg.type === 'PHASE_CHANGE' || msg.type === 'STATE_SNAPSHOT') {
+            setPhase(msg.data.phase);
+            if (msg.data.phase === 'QUESTION') {
+                showQuestion(msg.data);
+                setSubmitted(false);
+                setAnswer('');
+                setSelectedOption(null);
+                setStatus('Question Active!');
+            } else if (msg.data.phase === 'ANSWER') {
+                setStatus('Answer Revealed');
+            } else if (msg.data.phase === 'ENDED') {
+                setStatus('Quiz Ended');
+            } else {
+                setStatus('Waiting...');
+            }
+        } else if (msg.type === 'ROUND_BUNDLE') {
+            // Download the round's questions before the first reveal
+            forgetRoundBundle(msg.data.round_id);
+            loadRoundBundle(msg.data.round_id).catch(() => undefined);
+        } else if (msg.type === 'BUZZER_STATE') {
+            setBuzzerOpen(msg.data.active);
+            if (msg.data.active) {
+                // Vibrate if supported
+                if (navigator.vibrate) {
+                    navigator.vibrate([100, 50, 100]);
+                }
+            }
+        } else if (msg.type === 'TIMER_UPDATE') {
+            setTimer(msg.data.remaining);
+        } else if (msg.type === 'REJECTED' && msg.data.request === 'SUBMIT_ANSWER') {
+            setSubmitted(false);
+            setStatus(msg.data.reason);
+        }
+    };
+
+    // Reveals carry only the question id; text and options come from the round bundle
+    const showQuestion = (state: QuizMessage['data']) => {
+        const questionId: number | null = state.question?.id ?? null;
+        shownRef.current = questionId;
+        setCurrentQuestion(null);
+        if (questionId === null || state.round_id == null) {
+            return;
+        }
+        bundledQuestion(state.round_id, questionId)
+            .then((question) => {
+                if (question && shownRef.current === questionId) {
+                    setCurrentQuestion({ ...question, options: state.question.options_shown ? question.options : undefined });
+                }
+            })
+            .catch(() => setStatus('Could not load the question'));
+    };
+
     const submitAnswer = (val: string) => {
         setAnswer(val);
         setSubmitted(true);
         if (wsRef.current?.readyState === WebSocket.OPEN) {
             wsRef.current.send(JSON.stringify({
                 type: 'SUBMIT_ANSWER',
-                data: { answer: val, team_id: team?.id || 0, team_name: team?.name || 'Unknown' }
+                data: {
+                    answer: val,
+                    question_id: currentQuestion?.id,
+                    team_token: team?.token,
+                    team_name: team?.name || 'Unknown',
+                }
             }));
         }
     };